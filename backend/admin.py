@@ -0,0 +1,71 @@
+# backend/admin.py
+"""
+Admin-only endpoints under /api/admin.
+- Requests must send X-Admin-Token equal to ADMIN_TOKEN. Without ADMIN_TOKEN the
+  endpoints answer 403 and on-demand profiling is off.
+- GET /api/admin/profiles                 list captures, newest first (?limit=)
+- GET /api/admin/profiles/<id>/<fmt>      download one (collapsed, speedscope, pstats, txt)
+- GET /api/admin/memory                   tracemalloc report (?top=, ?group=lineno|filename|traceback)
+- POST /api/admin/memory/baseline         reset the snapshot growth is measured against
+"""
+
+import hmac
+import os
+
+from flask import Blueprint, current_app, jsonify, request, send_file
+
+import profiling
+
+admin_bp = Blueprint("admin", __name__)
+
+
+def is_admin(req) -> bool:
+    token = (os.environ.get("ADMIN_TOKEN") or "").strip()
+    if not token:
+        return False
+    return hmac.compare_digest((req.headers.get("X-Admin-Token") or "").strip(), token)
+
+
+@admin_bp.before_request
+def require_admin():
+    if not is_admin(request):
+        return jsonify({"error": "forbidden"}), 403
+
+
+@admin_bp.get("/profiles")
+def profiles_list():
+    try:
+        limit = max(1, min(1000, int(request.args.get("limit", 100))))
+    except ValueError:
+        limit = 100
+    return jsonify({"dir": profiling.profile_dir(), "items": profiling.list_captures(limit)})
+
+
+@admin_bp.get("/profiles/<capture_id>/<fmt>")
+def profiles_download(capture_id, fmt):
+    path = profiling.capture_path(capture_id, fmt)
+    if path is None:
+        return jsonify({"error": "not found"}), 404
+    ext, mimetype = profiling.FORMATS[fmt]
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=f"{capture_id}{ext}")
+
+
+@admin_bp.get("/memory")
+def memory_report():
+    watch = getattr(current_app, "memwatch", None)
+    if watch is None:
+        return jsonify({"enabled": False, "hint": "set MEMWATCH=1 to enable tracemalloc tracking"})
+    try:
+        top = max(1, min(200, int(request.args.get("top", 20))))
+    except ValueError:
+        top = 20
+    return jsonify(watch.report(top, request.args.get("group", "lineno")))
+
+
+@admin_bp.post("/memory/baseline")
+def memory_baseline():
+    watch = getattr(current_app, "memwatch", None)
+    if watch is None:
+        return jsonify({"error": "memwatch disabled"}), 409
+    watch.set_baseline()
+    return jsonify({"ok": True})
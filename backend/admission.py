@@ -0,0 +1,168 @@
+# backend/admission.py
+"""
+Admission control for the Whisper-bound endpoints (/api/assess, /api/assess/stream).
+- A request is admitted only if it can be expected to finish within ADMISSION_SLO_S
+  (default 30): the wait for a slot plus one service time, both from the transcribe
+  queue's moving average of slot hold times. Requests already admitted but still
+  uploading or decoding count as queued too, so a burst cannot all slip in before the
+  queue shows it.
+- Otherwise the answer is an immediate 503 with Retry-After (seconds until the backlog
+  should have drained to the SLO) before the upload is parsed or decoded.
+  CORS preflights (OPTIONS) are never shed, so the browser can read the 503 and its
+  Retry-After.
+  ADMISSION_MAX_QUEUE (default 0, off) additionally caps the requests waiting.
+- GET /api/health/capacity reports the load for a load balancer: in flight, slots,
+  estimated wait, load (estimated finish time / SLO; above 1 means shedding) and the
+  overload level. It answers 503 while new work would be rejected.
+- A request that joins an identical one in flight (coalesce.py) adds no Whisper work,
+  so detach() takes it back out of the in-flight count; attach() counts it again if it
+  has to run the view itself after all.
+ADMISSION=0 turns the rejection off; the capacity endpoint still reports.
+"""
+
+import math
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+import metrics
+
+ENDPOINTS = ("main.assess", "main.assess_stream")
+
+REJECTED = metrics.counter("admission_rejected_total", "Requests shed before any work was done.", ("endpoint",))
+ADMITTED = metrics.gauge("admission_in_flight", "Admitted Whisper-bound requests not yet finished.")
+ESTIMATED_WAIT = metrics.gauge("admission_estimated_wait_seconds", "Slot wait a request arriving now would see.")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class AdmissionController:
+    def __init__(self, queue, overload=None, enabled: bool = True):
+        self.queue = queue
+        self.overload = overload
+        self.enabled = enabled
+        self.slo_s = max(0.1, _env_float("ADMISSION_SLO_S", 30.0))
+        self.max_queue = max(0, _env_int("ADMISSION_MAX_QUEUE", 0))
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        ADMITTED.set_function(lambda: self.in_flight)
+        ESTIMATED_WAIT.set_function(lambda: self.estimate()[0])
+
+    def estimate(self) -> Tuple[float, float, int]:
+        """(wait for a slot, service time, requests ahead) for a request arriving now."""
+        slots = self.queue.slots
+        service = self.queue.service_s or 0.0
+        with self.lock:
+            ahead = max(0, self.in_flight - slots + 1)
+        wait = max(self.queue.estimated_wait(), ahead * service / slots)
+        return wait, service, ahead
+
+    def try_admit(self) -> Tuple[bool, Dict[str, Any]]:
+        wait, service, ahead = self.estimate()
+        finish = wait + service
+        over_slo = finish > self.slo_s
+        over_queue = self.max_queue and ahead > self.max_queue
+        if self.enabled and (over_slo or over_queue):
+            # the expected finish time falls by a second per second as the backlog drains
+            retry = max(1, math.ceil(finish - self.slo_s)) if over_slo else max(1, math.ceil(service))
+            return False, {"error": "overloaded", "estimatedWaitS": round(wait, 2), "sloS": self.slo_s,
+                           "retryAfterS": retry}
+        with self.lock:
+            self.in_flight += 1
+        return True, {}
+
+    def hold(self):
+        """Count a request without the SLO check (a coalesced duplicate that runs after all)."""
+        with self.lock:
+            self.in_flight += 1
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def capacity(self) -> Dict[str, Any]:
+        wait, service, ahead = self.estimate()
+        load = (wait + service) / self.slo_s
+        out = {
+            "accepting": not self.enabled or (load <= 1.0 and not (self.max_queue and ahead > self.max_queue)),
+            "load": round(load, 3),
+            "inFlight": self.in_flight,
+            "slots": self.queue.slots,
+            "waiting": self.queue.waiting,
+            "active": self.queue.active,
+            "serviceS": round(service, 3),
+            "estimatedWaitS": round(wait, 3),
+            "sloS": self.slo_s,
+        }
+        if self.overload is not None:
+            out["overloadLevel"] = self.overload.status()["level"]
+        return out
+
+
+def init_admission(app, queue, overload=None) -> AdmissionController:
+    from flask import g, jsonify, request
+
+    enabled = (os.environ.get("ADMISSION") or "1").strip().lower() not in ("0", "false", "no", "off")
+    ctl = AdmissionController(queue, overload, enabled)
+
+    @app.before_request
+    def _admit():
+        # a CORS preflight does no work, and a 503 to it hides Retry-After from the browser
+        if request.endpoint not in ENDPOINTS or request.method == "OPTIONS":
+            return None
+        ok, body = ctl.try_admit()
+        if not ok:
+            REJECTED.inc(endpoint=request.url_rule.rule)
+            resp = jsonify(body)
+            resp.status_code = 503
+            resp.headers["Retry-After"] = str(body["retryAfterS"])
+            return resp
+        g.admitted = True
+        return None
+
+    @app.after_request
+    def _hand_off(response):
+        if g.pop("admitted", False):
+            # streams finish after the view returns; release when the body is done
+            response.call_on_close(ctl.release)
+        return response
+
+    @app.teardown_request
+    def _release_on_error(exc):
+        # after_request did not run (unhandled exception)
+        if g.pop("admitted", False):
+            ctl.release()
+
+    return ctl
+
+
+def detach():
+    """The current request no longer counts as Whisper work."""
+    from flask import current_app, g
+
+    ctl = getattr(current_app, "admission", None)
+    if ctl is not None and g.pop("admitted", False):
+        ctl.release()
+        g.detached = True
+
+
+def attach():
+    """Undo detach(): the current request is going to do the work itself."""
+    from flask import current_app, g
+
+    ctl = getattr(current_app, "admission", None)
+    if ctl is not None and g.pop("detached", False):
+        ctl.hold()
+        g.admitted = True
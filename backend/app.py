@@ -5,6 +5,9 @@ import logging
 import json
 import shutil
 import time
+import hashlib
+import threading
+from collections import OrderedDict
 
 from flask import Flask, request, jsonify, Blueprint, current_app
 from flask_cors import CORS
@@ -17,10 +20,30 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
+# before anything imports numpy: BLAS reads its thread count once, at load
+import thread_budget
+thread_budget.apply_env()
+
 # local modules
-from assessment import process_assessment_from_whisper
-from lesson_builder import generate_lesson_plan
+from assessment import IncrementalScorer, process_assessment_from_whisper
+from lesson_builder import generate_lesson_plan, stream_lesson_plan
 from accent import AccentDetector
+from lesson_prefetch import init_prefetcher
+from compute import Cancelled, init_transcribe_queue
+from overload import init_overload
+from admission import init_admission
+from whisper_registry import init_registry, job_work
+import whisper_autotune
+import metrics
+import tracing
+import profiling
+import memwatch
+import streaming
+import audio
+import coalesce
+from admin import admin_bp, is_admin
+import resampling
+from resampling import clean, diff_test, mean_ci, parallel_map
 
 # optional voice blueprint
 try:
@@ -30,6 +53,13 @@ except Exception:
 
 # ---------- setup ----------
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
 def setup_logging():
     logging.basicConfig(
         level=logging.INFO,
@@ -69,19 +99,20 @@ def init_firebase():
         logging.error(f"firebase init failed: {e}")
         return None
 
-def init_whisper():
+def init_whisper(model_name=None):
     try:
         from faster_whisper import WhisperModel
     except ModuleNotFoundError:
         logging.warning("faster whisper not installed")
         return None
 
-    model_name = os.environ.get("WHISPER_MODEL", "small")
-    compute_type = os.environ.get("WHISPER_COMPUTE", "int8")
+    model_name = model_name or os.environ.get("WHISPER_MODEL", "small")
+    # tuning itself only happens at startup (whisper_registry.init_registry), never here
+    kwargs = whisper_autotune.settings(model_name)
 
     try:
-        model = WhisperModel(model_name, device="cpu", compute_type=compute_type)
-        logging.info(f"whisper loaded: {model_name}")
+        model = WhisperModel(model_name, device="cpu", **kwargs)
+        logging.info(f"whisper loaded: {model_name} {kwargs}")
         return model
     except Exception as e:
         logging.error(f"whisper load failed: {e}")
@@ -124,16 +155,35 @@ def health():
 
 @main_bp.get("/api/health/whisper")
 def health_whisper():
-    return jsonify({"loaded": current_app.whisper_model is not None})
+    models = current_app.whisper_models
+    return jsonify({"loaded": bool(models.loaded()), **models.status()})
+
+@main_bp.get("/api/health/capacity")
+def health_capacity():
+    # 503 while assess requests are being shed, so a load balancer can route around this pod
+    cap = current_app.admission.capacity()
+    return jsonify(cap), 200 if cap["accepting"] else 503
+
+@main_bp.get("/metrics")
+def metrics_endpoint():
+    # optional shared secret so the endpoint can stay on a public ingress
+    token = os.environ.get("METRICS_TOKEN", "").strip()
+    if token and request.headers.get("Authorization", "") != f"Bearer {token}":
+        return jsonify({"error": "unauthorized"}), 401
+    from flask import Response
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 @main_bp.post("/api/assess")
+@coalesce.single_flight
 def assess():
     t0 = time.perf_counter()
-    wm = current_app.whisper_model
-    if wm is None:
+    models = current_app.whisper_models
+    if not models.available():
         return jsonify({"error": "whisper model not available"}), 500
 
-    if "file" not in request.files:
+    with tracing.span("upload_read"):
+        has_file = "file" in request.files
+    if not has_file:
         return jsonify({"error": "no file"}), 400
 
     # read params from form first then query
@@ -157,9 +207,11 @@ def assess():
         except: return dv
 
     beam = as_int(arg("beam", 5), 5)
-    # keep VAD off to avoid onnxruntime requirement
-    vad_flag = 0
+    # built-in energy/ZCR trimming (audio.py); Whisper's own vad_filter needs onnxruntime
+    vad_flag = as_int(arg("vad", 1), 1) if audio.vad_enabled() else 0
     temperature = as_float(arg("temperature", 0.0), 0.0)
+    # re-scoring jobs send priority=batch and queue behind learners
+    priority = "batch" if (arg("priority", "") or "").strip().lower() == "batch" else "interactive"
 
     f = request.files["file"]
     logging.info("assess target=%s lang=%s beam=%s", target, lang, beam)
@@ -167,47 +219,83 @@ def assess():
     try:
         with tempfile.TemporaryDirectory() as td:
             path = os.path.join(td, secure_filename(f.filename or "audio.webm"))
-            f.save(path)
+            with tracing.span("save"):
+                f.save(path)
+            # probe, enforce the length limit and decode once, before taking a Whisper slot
+            try:
+                with tracing.span("decode"):
+                    samples, ingest_info = audio.ingest(path, "assess")
+            except audio.AudioRejected as e_rej:
+                logging.info("assess rejected: %s", e_rej.to_dict())
+                return jsonify(e_rej.to_dict()), e_rej.status
+            with tracing.span("vad"):
+                trimmed, offsets, vad_info = audio.trim_for_asr(samples, vad_flag == 1)
+            model_name, route_reason = models.route(samples.size / audio.SAMPLE_RATE, target, lang,
+                                                    arg("quality"))
+            # step quality down while the Whisper queue is backed up (overload.py)
+            degrade = current_app.overload.apply(beam, model_name, models, lang)
+            if degrade["model"] != model_name:
+                model_name, route_reason = degrade["model"], "overload"
+            # shortest job first in the transcribe queue (compute.py)
+            work = job_work((trimmed if vad_info is not None else samples).size / audio.SAMPLE_RATE,
+                            model_name, degrade["beam"])
 
             def transcribe(use_vad: bool):
-                return wm.transcribe(
-                    path,
-                    beam_size=beam,
-                    vad_filter=True if use_vad else False,
+                segments, info = wm.transcribe(
+                    trimmed if use_vad else samples,
+                    beam_size=degrade["beam"],
+                    vad_filter=False,
                     temperature=temperature,
                     language=None if lang == "multi" else lang,
                     word_timestamps=True,
                 )
+                # segments is lazy; decode here so transcribe_ms covers the actual work
+                if use_vad:
+                    return [offsets.remap_segment(s) for s in segments], info
+                return list(segments), info
 
             transcribe_attempts = 0
             used_vad = False
-            t_transcribe = time.perf_counter()
-            try:
-                # first try no VAD
-                transcribe_attempts += 1
-                segments, _ = transcribe(False)
-            except Exception as e1:
-                logging.warning("first transcribe failed: %s", e1)
+            with models.use(model_name, route_reason) as (wm, model_name, route_reason), \
+                    current_app.transcribe_queue.slot(work=work, priority=priority), tracing.span("transcribe"):
+                if wm is None:
+                    return jsonify({"error": "whisper model not available"}), 500
+                t_transcribe = time.perf_counter()
                 try:
-                    # try with VAD only if available
+                    # first try on the trimmed audio
                     transcribe_attempts += 1
-                    used_vad = (vad_flag == 1)
-                    segments, _ = transcribe(vad_flag == 1)
-                except Exception as e2:
-                    logging.exception("transcribe failed twice")
-                    return jsonify({"error": f"transcribe_failed: {e2}"}), 500
-            transcribe_ms = (time.perf_counter() - t_transcribe) * 1000.0
+                    used_vad = vad_info is not None
+                    segments, _ = transcribe(used_vad)
+                except Exception as e1:
+                    logging.warning("first transcribe failed: %s", e1)
+                    try:
+                        # then on the untrimmed audio
+                        transcribe_attempts += 1
+                        used_vad = False
+                        segments, _ = transcribe(False)
+                    except Exception as e2:
+                        logging.exception("transcribe failed twice")
+                        metrics.STAGE_ERRORS.inc(stage="transcribe")
+                        return jsonify({"error": f"transcribe_failed: {e2}"}), 500
+                transcribe_ms = (time.perf_counter() - t_transcribe) * 1000.0
 
             try:
-                t_score = time.perf_counter()
-                out = process_assessment_from_whisper(target, segments)
-                score_ms = (time.perf_counter() - t_score) * 1000.0
+                with tracing.span("score"):
+                    t_score = time.perf_counter()
+                    out = process_assessment_from_whisper(target, segments)
+                    score_ms = (time.perf_counter() - t_score) * 1000.0
                 total_ms = (time.perf_counter() - t0) * 1000.0
                 out["latency_ms"] = round(float(total_ms), 2)
                 out["transcribe_ms"] = round(float(transcribe_ms), 2)
                 out["score_ms"] = round(float(score_ms), 2)
                 out["transcribe_attempts"] = transcribe_attempts
                 out["vad_used"] = bool(used_vad)
+                if used_vad:
+                    out["vad"] = vad_info
+                out["ingest"] = ingest_info
+                out["model"] = model_name
+                out["model_reason"] = route_reason
+                out["degradation"] = current_app.overload.report(degrade, beam)
                 conf_vals = [
                     w.get("conf") for w in (out.get("words") or [])
                     if isinstance(w, dict) and isinstance(w.get("conf"), (int, float))
@@ -217,8 +305,9 @@ def assess():
                 # optional accent detection (best-effort, non-blocking)
                 try:
                     detector = getattr(current_app, "accent_detector", None)
-                    if detector:
-                        accent_lbl, accent_conf = detector.detect(path, lang=lang)
+                    if detector and degrade["accent"]:
+                        with tracing.span("accent"):
+                            accent_lbl, accent_conf = detector.detect(path, lang=lang)
                         out["accent"] = accent_lbl
                         if accent_conf is not None:
                             out["accent_confidence"] = round(float(accent_conf), 4)
@@ -235,15 +324,20 @@ def assess():
 
 
 @main_bp.post("/api/assess/stream")
+@coalesce.single_flight
 def assess_stream():
     """
     SSE streaming version: sends segment events while transcribing, then a final done event with full scoring.
+    Each segment event also carries provisional word statuses and a running accuracy from
+    an IncrementalScorer, so done only has to backtrace the alignment it already built.
     """
     t0 = time.perf_counter()
-    wm = current_app.whisper_model
-    if wm is None:
+    models = current_app.whisper_models
+    if not models.available():
         return jsonify({"error": "whisper model not available"}), 500
-    if "file" not in request.files:
+    with tracing.span("upload_read"):
+        has_file = "file" in request.files
+    if not has_file:
         return jsonify({"error": "no file"}), 400
 
     def arg(name, default=None):
@@ -270,62 +364,136 @@ def assess_stream():
             return dv
 
     beam = as_int(arg("beam", 5), 5)
+    vad_flag = as_int(arg("vad", 1), 1) if audio.vad_enabled() else 0
     temperature = as_float(arg("temperature", 0.0), 0.0)
+    # re-scoring jobs send priority=batch and queue behind learners
+    priority = "batch" if (arg("priority", "") or "").strip().lower() == "batch" else "interactive"
 
     f = request.files["file"]
     logging.info("assess_stream target=%s lang=%s beam=%s", target, lang, beam)
+    # the generator runs after the request context is gone
+    detector = getattr(current_app, "accent_detector", None)
+    transcribe_queue = current_app.transcribe_queue
+    trace = tracing.current()
+    cancel = streaming.cancel_token(("transcribe", "score", "accent") if detector else ("transcribe", "score"))
 
     tmp_dir = tempfile.mkdtemp()
     path = os.path.join(tmp_dir, secure_filename(f.filename or "audio.webm"))
     try:
-        f.save(path)
+        with tracing.span("save"):
+            f.save(path)
     except Exception as e_save:
         try:
             shutil.rmtree(tmp_dir, ignore_errors=True)
         except Exception:
             pass
         return jsonify({"error": f"save_failed: {e_save}"}), 500
+    # rejected here, before the stream opens, so the client gets a plain 413/422
+    try:
+        with tracing.span("decode"):
+            samples, ingest_info = audio.ingest(path, "assess_stream")
+    except audio.AudioRejected as e_rej:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        logging.info("assess_stream rejected: %s", e_rej.to_dict())
+        return jsonify(e_rej.to_dict()), e_rej.status
+    with tracing.span("vad"):
+        audio_in, offsets, vad_info = audio.trim_for_asr(samples, vad_flag == 1)
+    model_name, route_reason = models.route(samples.size / audio.SAMPLE_RATE, target, lang, arg("quality"))
+    overload = current_app.overload
+    degrade = overload.apply(beam, model_name, models, lang)
+    if degrade["model"] != model_name:
+        model_name, route_reason = degrade["model"], "overload"
+    work = job_work(audio_in.size / audio.SAMPLE_RATE, model_name, degrade["beam"])
+    streaming.mark_stream(transcribe_queue, trace, work, priority)
+
+    def remaining_transcribe(progress):
+        """Seconds of decoding left, from this request's own pace so far."""
+        done_s, total_s, elapsed = progress["audio_s"], progress["total_s"], progress["elapsed"]
+        if not total_s or done_s <= 0:
+            return None
+        return max(0.0, elapsed / done_s * (total_s - done_s))
 
     def generate():
+        stage = "queued"
+        progress = {"audio_s": 0.0, "total_s": None, "elapsed": 0.0}
         try:
-            segments_captured = []
-            t_transcribe = time.perf_counter()
-
-            try:
-                segments_gen, _ = wm.transcribe(
-                    path,
-                    beam_size=beam,
-                    vad_filter=False,
-                    temperature=temperature,
-                    language=None if lang == "multi" else lang,
-                    word_timestamps=True,
-                )
-
-                for seg in segments_gen:
-                    segments_captured.append(seg)
-                    payload = {
-                        "text": (getattr(seg, "text", "") or "").strip(),
-                        "start": getattr(seg, "start", None),
-                        "end": getattr(seg, "end", None),
-                        "avg_logprob": getattr(seg, "avg_logprob", None),
-                    }
-                    yield sse_event("segment", payload)
-            except Exception as e_trans:
-                logging.exception("stream transcribe failed")
-                yield sse_event("error", {"error": f"transcribe_failed: {e_trans}"})
-                return
-            transcribe_ms = (time.perf_counter() - t_transcribe) * 1000.0
+            scorer = IncrementalScorer(target)
+            incremental_s = 0.0
+
+            with models.use(model_name, route_reason) as (wm, used_model, used_reason), \
+                    transcribe_queue.slot(trace, cancel, work, priority), tracing.span("transcribe", trace):
+                if wm is None:
+                    yield sse_event("error", {"error": "whisper model not available"})
+                    return
+                if cancel.cancelled():
+                    cancel.record("queued")
+                    return
+                stage = "transcribe"
+                t_transcribe = time.perf_counter()
+                try:
+                    segments_gen, info = wm.transcribe(
+                        audio_in,
+                        beam_size=degrade["beam"],
+                        vad_filter=False,
+                        temperature=temperature,
+                        language=None if lang == "multi" else lang,
+                        word_timestamps=True,
+                    )
+                    progress["total_s"] = getattr(info, "duration", None)
+
+                    for seg in segments_gen:
+                        # progress is measured on the trimmed audio Whisper sees
+                        progress["audio_s"] = getattr(seg, "end", None) or progress["audio_s"]
+                        seg = offsets.remap_segment(seg)
+                        t_inc = time.perf_counter()
+                        provisional = scorer.add_segment(seg)
+                        incremental_s += time.perf_counter() - t_inc
+                        progress["elapsed"] = time.perf_counter() - t_transcribe
+                        payload = {
+                            "text": (getattr(seg, "text", "") or "").strip(),
+                            "start": getattr(seg, "start", None),
+                            "end": getattr(seg, "end", None),
+                            "avg_logprob": getattr(seg, "avg_logprob", None),
+                            "words": provisional["words"],
+                            "accuracy": provisional["accuracy"],
+                            "covered": provisional["covered"],
+                            "refWords": provisional["refWords"],
+                        }
+                        yield sse_event("segment", payload)
+                        # checked before pulling the next segment, which is where Whisper decodes
+                        if cancel.cancelled():
+                            cancel.record("transcribe", remaining_transcribe(progress))
+                            return
+                except Exception as e_trans:
+                    logging.exception("stream transcribe failed")
+                    metrics.STAGE_ERRORS.inc(stage="transcribe")
+                    yield sse_event("error", {"error": f"transcribe_failed: {e_trans}"})
+                    return
+                transcribe_ms = (time.perf_counter() - t_transcribe) * 1000.0
+            tracing.record("score_incremental", incremental_s, trace)
 
             try:
-                t_score = time.perf_counter()
-                out = process_assessment_from_whisper(target, segments_captured)
-                score_ms = (time.perf_counter() - t_score) * 1000.0
+                if cancel.cancelled():
+                    cancel.record("score")
+                    return
+                stage = "score"
+                with tracing.span("score", trace):
+                    t_score = time.perf_counter()
+                    out = scorer.finish()
+                    score_ms = (time.perf_counter() - t_score) * 1000.0
                 total_ms = (time.perf_counter() - t0) * 1000.0
                 out["latency_ms"] = round(float(total_ms), 2)
                 out["transcribe_ms"] = round(float(transcribe_ms), 2)
                 out["score_ms"] = round(float(score_ms), 2)
+                out["score_incremental_ms"] = round(incremental_s * 1000.0, 2)
                 out["transcribe_attempts"] = 1
-                out["vad_used"] = False
+                out["vad_used"] = vad_info is not None
+                if vad_info is not None:
+                    out["vad"] = vad_info
+                out["ingest"] = ingest_info
+                out["model"] = used_model
+                out["model_reason"] = used_reason
+                out["degradation"] = overload.report(degrade, beam)
                 conf_vals = [
                     w.get("conf") for w in (out.get("words") or [])
                     if isinstance(w, dict) and isinstance(w.get("conf"), (int, float))
@@ -334,29 +502,46 @@ def assess_stream():
                     out["avg_confidence"] = round(sum(conf_vals) / len(conf_vals), 4)
                 # optional accent detection
                 try:
-                    detector = getattr(current_app, "accent_detector", None)
-                    if detector:
-                        accent_lbl, accent_conf = detector.detect(path, lang=lang)
+                    if detector and degrade["accent"]:
+                        if cancel.cancelled():
+                            cancel.record("accent")
+                            return
+                        stage = "accent"
+                        with tracing.span("accent", trace):
+                            accent_lbl, accent_conf = detector.detect(path, lang=lang)
                         out["accent"] = accent_lbl
                         if accent_conf is not None:
                             out["accent_confidence"] = round(float(accent_conf), 4)
                 except Exception as e_acc:
                     logging.warning("accent detection skipped: %s", e_acc)
-                yield sse_event("done", out)
+                stage = "done"
+                if trace is not None and trace.debug:
+                    out["debug"] = trace.to_dict()
+                with tracing.span("serialize", trace):
+                    event = sse_event("done", out)
+                yield event
             except Exception as e_score:
                 logging.exception("stream scoring failed")
                 yield sse_event("error", {"error": f"scoring_failed: {e_score}"})
+        except Cancelled:
+            cancel.record("queued")
+        except GeneratorExit:
+            # the server closed the stream (failed write or the ASGI bridge gave up on it)
+            if stage == "transcribe":
+                progress["elapsed"] = time.perf_counter() - t_transcribe
+                cancel.record(stage, remaining_transcribe(progress))
+            elif stage != "done":
+                cancel.record(stage)
+            raise
         except Exception as e_outer:
             logging.exception("stream assess failed")
             yield sse_event("error", {"error": f"internal_error: {e_outer}"})
-        finally:
-            try:
-                shutil.rmtree(tmp_dir, ignore_errors=True)
-            except Exception:
-                pass
 
     from flask import Response
-    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    resp = Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # on close rather than in generate(): a generator closed before its first step never runs its finally
+    resp.call_on_close(lambda: shutil.rmtree(tmp_dir, ignore_errors=True))
+    return resp
 
 # attempts and summary are optional for your smoke test
 @main_bp.post("/api/attempts")
@@ -380,7 +565,11 @@ def attempts_create():
     if isinstance(data.get("sessionId"), str) and data.get("sessionId"):
         data["sessionId"] = data["sessionId"][:64]
     ref = db.collection("attempts").document()
-    ref.set(data)
+    with tracing.span("firestore_write"):
+        ref.set(data)
+    prefetcher = getattr(current_app, "lesson_prefetcher", None)
+    if prefetcher is not None:
+        prefetcher.schedule(uid)
     return jsonify({"ok": True, "id": ref.id}), 201
 
 @main_bp.post("/api/feedback")
@@ -472,7 +661,8 @@ def feedback_create():
         payload["sessionId"] = session_id.strip()[:64]
 
     ref = db.collection("feedback").document()
-    ref.set(payload)
+    with tracing.span("firestore_write"):
+        ref.set(payload)
     return jsonify({"ok": True, "id": ref.id}), 201
 
 @main_bp.get("/api/attempts/summary")
@@ -514,6 +704,30 @@ def attempts_summary():
         "items": rows,
     })
 
+class _StatsCache:
+    """Small LRU of study-summary statistics, keyed by the data they were computed from."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+
 @main_bp.get("/api/study/summary")
 def study_summary():
     db = current_app.db
@@ -589,6 +803,42 @@ def study_summary():
         if wer_first is not None and wer_second is not None:
             wer_delta = wer_second - wer_first
 
+    # bootstrap CIs and permutation p-values, one stat per pool task
+    resamples = max(0, as_int(os.environ.get("STUDY_BOOTSTRAP_RESAMPLES"), 10000))
+    stat_jobs = {
+        "accuracy": (acc_vals,),
+        "wer": (wer_vals,),
+        "latencyMs": (lat_vals,),
+    }
+    if half > 0:
+        stat_jobs["accuracyDelta"] = ([r.get("accuracy") for r in first], [r.get("accuracy") for r in second])
+        stat_jobs["werDelta"] = ([r.get("wer") for r in first], [r.get("wer") for r in second])
+
+    def run_stat(key):
+        vals = stat_jobs[key]
+        if len(vals) == 2:
+            return diff_test(clean(vals[0]), clean(vals[1]), resamples, parallel=False)
+        return mean_ci(clean(vals[0]), resamples, parallel=False)
+
+    stats = {}
+    if resamples > 0:
+        # seeded, so the same data always gives the same intervals
+        cache_key = hashlib.sha256(json.dumps(
+            [resamples, {k: [clean(v).tolist() for v in vals] for k, vals in stat_jobs.items()}],
+            sort_keys=True).encode("utf-8")).hexdigest()
+        stats = current_app.study_stats_cache.get(cache_key)
+        if stats is None:
+            stats = dict(zip(stat_jobs, parallel_map(run_stat, list(stat_jobs))))
+            current_app.study_stats_cache.put(cache_key, stats)
+
+    def ci(key, digits=4):
+        s = stats.get(key)
+        return [round(s["lo"], digits), round(s["hi"], digits)] if s else None
+
+    def p_value(key):
+        s = stats.get(key)
+        return round(s["p"], 4) if s else None
+
     # error type counts
     status_counts = {}
     for r in attempts_sorted:
@@ -649,14 +899,23 @@ def study_summary():
         "avgWer": round(float(mean(wer_vals)), 4) if mean(wer_vals) is not None else None,
         "avgLatencyMs": round(float(mean(lat_vals)), 2) if mean(lat_vals) is not None else None,
         "avgServerLatencyMs": round(float(mean(server_lat_vals)), 2) if mean(server_lat_vals) is not None else None,
+        "accuracyCI": ci("accuracy"),
+        "werCI": ci("wer"),
+        "latencyMsCI": ci("latencyMs", 2),
         "passThreshold": pass_threshold,
         "passCount": pass_count,
         "accuracyFirstHalf": round(float(acc_first), 4) if acc_first is not None else None,
         "accuracySecondHalf": round(float(acc_second), 4) if acc_second is not None else None,
         "accuracyDelta": round(float(acc_delta), 4) if acc_delta is not None else None,
+        "accuracyDeltaCI": ci("accuracyDelta"),
+        "accuracyDeltaPValue": p_value("accuracyDelta"),
         "werFirstHalf": round(float(wer_first), 4) if wer_first is not None else None,
         "werSecondHalf": round(float(wer_second), 4) if wer_second is not None else None,
         "werDelta": round(float(wer_delta), 4) if wer_delta is not None else None,
+        "werDeltaCI": ci("werDelta"),
+        "werDeltaPValue": p_value("werDelta"),
+        "bootstrapResamples": resamples,
+        "ciLevel": 0.95,
         "errorCounts": status_counts,
         "hardWordsTop": [{"word": w, "count": c} for w, c in hard_top],
         "feedback": {
@@ -673,6 +932,30 @@ def study_summary():
         "issues": issues,
     })
 
+def _clean_list(val):
+    if not val:
+        return []
+    if isinstance(val, list):
+        return val
+    if isinstance(val, str):
+        return [x.strip() for x in val.split(",") if x.strip()]
+    try:
+        return list(val)
+    except Exception:
+        return []
+
+def lesson_params(data: dict) -> dict:
+    """Normalise a lesson request body into generate_lesson_plan params."""
+    return {
+        "goal": (data.get("goal") or "").strip(),
+        "topic": (data.get("topic") or "").strip() or "daily conversation",
+        "level": (data.get("level") or "b1").strip().lower(),
+        "durationMinutes": int(data.get("durationMinutes") or 20),
+        "weakWords": _clean_list(data.get("weakWords")),
+        "weakPronunciation": _clean_list(data.get("weakPronunciation")),
+        "tone": (data.get("tone") or "coaching").strip().lower(),
+    }
+
 @main_bp.post("/api/lessons/generate")
 def lessons_generate():
     try:
@@ -681,62 +964,120 @@ def lessons_generate():
         return jsonify({"error": f"unauthorized: {e}"}), 401
 
     data = request.get_json(silent=True) or {}
-    goal = (data.get("goal") or "").strip()
-    if not goal:
+    params = lesson_params(data)
+    if not params["goal"]:
         return jsonify({"error": "missing goal"}), 400
 
-    def _clean_list(val):
-        if not val:
-            return []
-        if isinstance(val, list):
-            return val
-        if isinstance(val, str):
-            return [x.strip() for x in val.split(",") if x.strip()]
-        try:
-            return list(val)
-        except Exception:
-            return []
-
-    params = {
-        "goal": goal,
-        "topic": (data.get("topic") or "").strip() or "daily conversation",
-        "level": (data.get("level") or "b1").strip().lower(),
-        "durationMinutes": int(data.get("durationMinutes") or 20),
-        "weakWords": _clean_list(data.get("weakWords")),
-        "weakPronunciation": _clean_list(data.get("weakPronunciation")),
-        "tone": (data.get("tone") or "coaching").strip().lower(),
-    }
-
+    prefetcher = getattr(current_app, "lesson_prefetcher", None)
     try:
-        out = generate_lesson_plan(params)
+        out = None
+        if prefetcher is not None:
+            prefetcher.remember_request(uid, params)
+            out = prefetcher.take(uid, params)
+        if out is None:
+            with tracing.span("lesson"):
+                out = generate_lesson_plan(params)
         out["uid"] = uid
         return jsonify(out), 200
     except Exception as e:
         logging.exception("lesson generation failed")
         return jsonify({"error": f"lesson_generation_failed: {e}"}), 500
 
+@main_bp.post("/api/lessons/generate/stream")
+def lessons_generate_stream():
+    """
+    SSE version of lesson generation: a section event per parsed section, then done with the full plan.
+    """
+    try:
+        uid = auth_uid()
+    except Exception as e:
+        return jsonify({"error": f"unauthorized: {e}"}), 401
+
+    data = request.get_json(silent=True) or {}
+    params = lesson_params(data)
+    if not params["goal"]:
+        return jsonify({"error": "missing goal"}), 400
+
+    prefetcher = getattr(current_app, "lesson_prefetcher", None)
+    prefetched = None
+    if prefetcher is not None:
+        prefetcher.remember_request(uid, params)
+        prefetched = prefetcher.take(uid, params)
+    trace = tracing.current()
+
+    def events():
+        if prefetched is None:
+            with tracing.span("lesson", trace):
+                yield from stream_lesson_plan(params)
+            return
+        for idx, section in enumerate(prefetched["plan"].get("sections") or []):
+            yield "section", {"index": idx, "section": section}
+        yield "done", prefetched
+
+    def generate():
+        try:
+            for event, payload in events():
+                if event == "done":
+                    payload["uid"] = uid
+                    if trace is not None and trace.debug:
+                        payload["debug"] = trace.to_dict()
+                yield sse_event(event, payload)
+        except Exception as e:
+            logging.exception("lesson stream failed")
+            yield sse_event("error", {"error": f"lesson_generation_failed: {e}"})
+
+    from flask import Response
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # ---------- app factory ----------
 
-def create_app():
+def load_models():
+    """The read-only model weights; serve.py loads these once in the master before forking."""
+    # the lambda looks init_whisper up at load time, so later (lazy) loads see replacements
+    return {"whisper_models": init_registry(lambda name: init_whisper(name)), "accent_detector": AccentDetector()}
+
+def create_app(models=None):
     load_dotenv(os.path.join(BASE_DIR, ".env"))
     setup_logging()
+    if models is None:
+        models = load_models()
+    # request-time bootstraps share this worker's cores, not the whole host
+    resampling.set_threads(thread_budget.apply_runtime()["share"])
 
     app = Flask(__name__)
     app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024
+    # read here, after .env is loaded; STUDY_STATS_CACHE=0 turns the cache off
+    app.study_stats_cache = _StatsCache(max(0, _env_int("STUDY_STATS_CACHE", 256)))
 
     with app.app_context():
         app.db = init_firebase()
-        app.whisper_model = init_whisper()
-        app.accent_detector = AccentDetector()
+        app.whisper_models = models["whisper_models"]
+        app.accent_detector = models["accent_detector"]
+        app.lesson_prefetcher = init_prefetcher(app.db, generate_lesson_plan)
+        app.transcribe_queue = init_transcribe_queue()
+        app.overload = init_overload(app.transcribe_queue)
+
+    metrics.MODEL_LOADED.set_function(lambda: bool(app.whisper_models.loaded()), model="whisper")
+    metrics.MODEL_LOADED.set_function(lambda: getattr(app.accent_detector, "model", None) is not None,
+                                      model="accent")
+    metrics.init_metrics(app)
+    tracing.init_tracing(app)
+    profiling.init_profiling(app, is_admin)
+    app.memwatch = memwatch.init_memwatch(app)
+    app.admission = init_admission(app, app.transcribe_queue, app.overload)
 
     CORS(
         app,
         resources={r"/api/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
                                "methods": ["GET", "POST", "OPTIONS"],
-                               "allow_headers": ["Content-Type", "Authorization"]}}
+                               "allow_headers": ["Content-Type", "Authorization", "X-Trace-Id",
+                                                 "X-Debug-Timing", "X-Profile", "X-Admin-Token"],
+                               "expose_headers": ["Server-Timing", "X-Trace-Id", "X-Profile-Id", "Retry-After",
+                                                 "X-Coalesced"]}}
     )
 
     app.register_blueprint(main_bp)
+    app.register_blueprint(admin_bp, url_prefix="/api/admin")
     try:
         app.register_blueprint(voice_bp, url_prefix="/api/voice")
     except Exception as e:
@@ -745,6 +1086,7 @@ def create_app():
     return app
 
 if __name__ == "__main__":
+    # development server; use serve.py for multi-worker production serving
     app = create_app()
     port = int(os.environ.get("PORT", "5050"))
     app.run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,18 @@
+# backend/asgi.py
+"""
+ASGI entry point for servers that import an app object: `uvicorn asgi:app`.
+Every uvicorn worker loads its own models this way. `SERVER_MODE=asgi python serve.py`
+runs the same bridge with the models preloaded and shared.
+"""
+
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from app import create_app
+from streaming import ASGIBridge
+
+app = ASGIBridge(create_app())
@@ -18,97 +18,24 @@ def _build_ref_tokens(text: str):
             tokens.append({"orig": raw, "norm": norm})
     return tokens
 
-def _align_ops(reference_words, hypothesis_words):
-    """Dynamic program alignment with ops to label every word."""
-    n, m = len(reference_words), len(hypothesis_words)
-    dp = [[0] * (m + 1) for _ in range(n + 1)]
-    op = [[None] * (m + 1) for _ in range(n + 1)]
-
-    for i in range(1, n + 1):
-        dp[i][0], op[i][0] = i, "del"
-    for j in range(1, m + 1):
-        dp[0][j], op[0][j] = j, "ins"
-
-    for i in range(1, n + 1):
-        for j in range(1, m + 1):
-            cost = 0 if reference_words[i - 1]["norm"] == hypothesis_words[j - 1]["norm"] else 1
-            choices = [
-                (dp[i - 1][j] + 1, "del"),
-                (dp[i][j - 1] + 1, "ins"),
-                (dp[i - 1][j - 1] + cost, "ok" if cost == 0 else "sub"),
-            ]
-            dp[i][j], op[i][j] = min(choices, key=lambda x: x[0])
-
-    i, j = n, m
-    statuses = [None] * m
-    while i > 0 or j > 0:
-        cur = op[i][j]
-        if cur == "ok":
-            statuses[j - 1] = ("correct", reference_words[i - 1]["orig"]); i -= 1; j -= 1
-        elif cur == "sub":
-            statuses[j - 1] = ("substitution", reference_words[i - 1]["orig"]); i -= 1; j -= 1
-        elif cur == "ins":
-            statuses[j - 1] = ("insertion", None); j -= 1
-        else:
-            statuses.insert(j, ("deletion", reference_words[i - 1]["orig"])); i -= 1
-    return statuses
-
-def process_assessment_from_whisper(target: str, segments: List[Any]) -> Dict[str, Any]:
-    """
-    Build transcript from Whisper segments, align to target,
-    compute accuracy and tips, return json safe dict.
-    """
-    # collect parts and word timing
-    parts = []
+def _segment_words(seg):
+    """Word dicts (text, norm, start, end, probability) of one Whisper segment."""
     words = []
-    start = end = None
+    for w in getattr(seg, "words", []) or []:
+        wt = (getattr(w, "word", "") or "").strip()
+        ws = getattr(w, "start", None)
+        we = getattr(w, "end", None)
+        prob = float(getattr(w, "probability", 0.0) or 0.0)
+        words.append({
+            "text": wt,
+            "norm": _normalize_word_token(wt),
+            "start": float(ws) if ws is not None else None,
+            "end": float(we) if we is not None else None,
+            "probability": prob
+        })
+    return words
 
-    for seg in segments:
-        txt = (getattr(seg, "text", "") or "").strip()
-        if txt:
-            parts.append(txt)
-        seg_words = getattr(seg, "words", []) or []
-        for w in seg_words:
-            wt = (getattr(w, "word", "") or "").strip()
-            ws = getattr(w, "start", None)
-            we = getattr(w, "end", None)
-            prob = float(getattr(w, "probability", 0.0) or 0.0)
-            words.append({
-                "text": wt,
-                "norm": _normalize_word_token(wt),
-                "start": float(ws) if ws is not None else None,
-                "end": float(we) if we is not None else None,
-                "probability": prob
-            })
-        if seg_words:
-            if start is None and seg_words[0].start is not None:
-                start = seg_words[0].start
-            if seg_words[-1].end is not None:
-                end = seg_words[-1].end
-
-    raw_transcript = " ".join(parts).strip()
-    transcript = raw_transcript
-    ref_tokens = _build_ref_tokens(target)
-    hyp_tokens = [w["norm"] for w in words if w.get("norm")]
-
-    # simple WER
-    n, m = len(ref_tokens), len(hyp_tokens)
-    dp = [[0] * (m + 1) for _ in range(n + 1)]
-    for i in range(n + 1): dp[i][0] = i
-    for j in range(m + 1): dp[0][j] = j
-    for i in range(1, n + 1):
-        for j in range(1, m + 1):
-            cost = 0 if ref_tokens[i - 1]["norm"] == hyp_tokens[j - 1] else 1
-            dp[i][j] = min(
-                dp[i - 1][j] + 1,      # deletion
-                dp[i][j - 1] + 1,      # insertion
-                dp[i - 1][j - 1] + cost  # sub or ok
-            )
-    wer_val = dp[n][m] / max(1, n)
-    accuracy = max(0.0, min(1.0, 1.0 - wer_val))
-
-    # label each word with status
-    statuses = _align_ops(ref_tokens, words)
+def _enrich(statuses, words):
     enriched = []
     hyp_idx = 0
     for typ, expected in statuses:
@@ -124,24 +51,142 @@ def process_assessment_from_whisper(target: str, segments: List[Any]) -> Dict[st
                 "conf": float(w.get("probability", 0.0)), "status": typ, "expected": expected
             })
             hyp_idx += 1
+    return enriched
+
+_DEL, _INS, _OK, _SUB = 0, 1, 2, 3
+
+class IncrementalScorer:
+    """
+    The alignment of process_assessment_from_whisper, built one hypothesis word at a time.
+    The reference is fixed, so each arriving word adds one DP column (O(len(target))).
+    add_segment() returns provisional statuses against the best-matching reference
+    prefix; finish() only backtraces the finished table, with the same result the batch
+    scorer would give for the same segments.
+    """
+
+    def __init__(self, target: str):
+        self.ref_tokens = _build_ref_tokens(target)
+        n = len(self.ref_tokens)
+        self.col = list(range(n + 1))   # alignment DP, last column
+        self.wer_col = None             # WER DP over non-empty tokens, once they differ
+        self.ops = [[_DEL] * (n + 1)]
+        self.ops[0][0] = None
+        self.words = []
+        self.parts = []
+        self.start = self.end = None
+
+    def _advance(self, col, norm, ops=None):
+        ref = self.ref_tokens
+        out = [col[0] + 1]
+        for i in range(1, len(ref) + 1):
+            cost = 0 if ref[i - 1]["norm"] == norm else 1
+            best, o = out[i - 1] + 1, _DEL
+            if col[i] + 1 < best:
+                best, o = col[i] + 1, _INS
+            if col[i - 1] + cost < best:
+                best, o = col[i - 1] + cost, _OK if cost == 0 else _SUB
+            out.append(best)
+            if ops is not None:
+                ops.append(o)
+        return out
+
+    def _add_word(self, word):
+        ops = [_INS]
+        new_col = self._advance(self.col, word["norm"], ops)
+        if word["norm"]:
+            # the WER table skips empty tokens; it only needs its own column once one appeared
+            if self.wer_col is not None:
+                self.wer_col = self._advance(self.wer_col, word["norm"])
+        elif self.wer_col is None:
+            self.wer_col = self.col
+        self.col = new_col
+        self.ops.append(ops)
+        self.words.append(word)
 
-    hard = [w.get("expected") or w.get("text") for w in enriched if w.get("status") in ("substitution", "deletion")]
-    tips = []
-    if accuracy < 0.7:
-        tips.append("Slow down and articulate each word.")
-    if wer_val > 0.2:
-        tips.append("Listen first and match the rhythm.")
-    if hard:
-        uniq = ", ".join(sorted(set([h for h in hard if h]))[:5])
-        tips.append(f"Practice tricky words: {uniq}.")
-
-    duration = float(max(0.0, (end or 0.0) - (start or 0.0)))
-
-    return {
-        "accuracy": round(float(accuracy), 4),
-        "wer": round(float(wer_val), 4),
-        "transcript": transcript,
-        "duration": round(duration, 3),
-        "words": enriched,
-        "tips": tips,
-    }
+    def _backtrace(self, i):
+        ref = self.ref_tokens
+        j = len(self.words)
+        statuses = [None] * j
+        while i > 0 or j > 0:
+            cur = self.ops[j][i]
+            if cur == _OK:
+                statuses[j - 1] = ("correct", ref[i - 1]["orig"]); i -= 1; j -= 1
+            elif cur == _SUB:
+                statuses[j - 1] = ("substitution", ref[i - 1]["orig"]); i -= 1; j -= 1
+            elif cur == _INS:
+                statuses[j - 1] = ("insertion", None); j -= 1
+            else:
+                statuses.insert(j, ("deletion", ref[i - 1]["orig"])); i -= 1
+        return statuses
+
+    def _wer_col(self):
+        return self.wer_col if self.wer_col is not None else self.col
+
+    def feed(self, seg):
+        """Fold in one segment's text, words and timing."""
+        txt = (getattr(seg, "text", "") or "").strip()
+        if txt:
+            self.parts.append(txt)
+        seg_words = getattr(seg, "words", []) or []
+        for word in _segment_words(seg):
+            self._add_word(word)
+        if seg_words:
+            if self.start is None and seg_words[0].start is not None:
+                self.start = seg_words[0].start
+            if seg_words[-1].end is not None:
+                self.end = seg_words[-1].end
+
+    def provisional(self) -> Dict[str, Any]:
+        """Statuses and accuracy so far, against the reference prefix the words match best."""
+        # ties go to the longer prefix
+        col = self.col
+        covered = min(range(len(col)), key=lambda i: (col[i], -i))
+        errors = self._wer_col()[covered]
+        accuracy = max(0.0, min(1.0, 1.0 - errors / max(1, covered)))
+        return {
+            "words": _enrich(self._backtrace(covered), self.words),
+            "accuracy": round(float(accuracy), 4),
+            "covered": covered,
+            "refWords": len(self.ref_tokens),
+        }
+
+    def add_segment(self, seg) -> Dict[str, Any]:
+        self.feed(seg)
+        return self.provisional()
+
+    def finish(self) -> Dict[str, Any]:
+        n = len(self.ref_tokens)
+        wer_val = self._wer_col()[n] / max(1, n)
+        accuracy = max(0.0, min(1.0, 1.0 - wer_val))
+        enriched = _enrich(self._backtrace(n), self.words)
+
+        hard = [w.get("expected") or w.get("text") for w in enriched if w.get("status") in ("substitution", "deletion")]
+        tips = []
+        if accuracy < 0.7:
+            tips.append("Slow down and articulate each word.")
+        if wer_val > 0.2:
+            tips.append("Listen first and match the rhythm.")
+        if hard:
+            uniq = ", ".join(sorted(set([h for h in hard if h]))[:5])
+            tips.append(f"Practice tricky words: {uniq}.")
+
+        duration = float(max(0.0, (self.end or 0.0) - (self.start or 0.0)))
+
+        return {
+            "accuracy": round(float(accuracy), 4),
+            "wer": round(float(wer_val), 4),
+            "transcript": " ".join(self.parts).strip(),
+            "duration": round(duration, 3),
+            "words": enriched,
+            "tips": tips,
+        }
+
+def process_assessment_from_whisper(target: str, segments: List[Any]) -> Dict[str, Any]:
+    """
+    Build transcript from Whisper segments, align to target,
+    compute accuracy and tips, return json safe dict.
+    """
+    scorer = IncrementalScorer(target)
+    for seg in segments:
+        scorer.feed(seg)
+    return scorer.finish()
@@ -0,0 +1,423 @@
+# backend/audio.py
+"""
+Shared audio path: check uploads, decode them to 16 kHz mono float32 once, trim silence.
+- ingest(source, endpoint) is the front door. It probes the duration from the container
+  headers (WAV header, PyAV container/stream duration, or packet timestamps for
+  MediaRecorder webm that has none) before decoding anything. Over the endpoint's limit,
+  INGEST_POLICY=reject (default) raises AudioRejected (413 with the measured duration)
+  and truncate decodes only the first limit seconds. Undecodable, empty or too-short
+  audio is a 422. Decoding also stops at the limit, so a file whose headers lie cannot
+  make it decode more.
+- Limits: INGEST_MAX_S (default 60) for every endpoint, overridden per endpoint by
+  INGEST_MAX_S_ASSESS, INGEST_MAX_S_ASSESS_STREAM, INGEST_MAX_S_VOICE (default 30, an
+  embedding needs a few seconds); the same suffixes work for INGEST_POLICY_*. INGEST_MIN_S (default 0.2) is the shortest accepted clip.
+- decode(source) takes bytes or a file path. It tries PyAV (webm/ogg/mp4 from browsers),
+  then soundfile, then the stdlib wave reader for PCM WAV.
+- trim_silence(y, sr) is a NumPy energy / zero-crossing VAD. It drops leading and
+  trailing silence and shortens internal pauses longer than VAD_MAX_PAUSE_MS (default
+  500) to VAD_KEEP_PAUSE_MS (default 300), which is still enough for Whisper to break
+  sentences. Speech runs are padded by VAD_PAD_MS (default 150) on each side. A frame
+  is speech when its energy is VAD_MARGIN_DB (default 12) above the clip's noise floor
+  (10th percentile), or half that with a high zero-crossing rate, so quiet fricatives
+  like s and f count.
+- The returned OffsetMap maps times in the trimmed audio back to the original, so word
+  start/end values keep referring to what the learner recorded.
+- VAD=0 turns trimming off; when it would save less than VAD_MIN_SAVING_MS (default
+  200) the original audio is used as is.
+"""
+
+import io
+import os
+import wave
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+import metrics
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+# headers and decoders disagree by a frame or two; do not reject a clip for that
+LIMIT_SLACK_S = 0.25
+DEFAULT_MAX_S = {"voice": 30.0}
+
+INGEST_REJECTED = metrics.counter("ingest_rejected_total", "Uploads rejected before transcription.",
+                                  ("endpoint", "reason"))
+INGEST_TRUNCATED = metrics.counter("ingest_truncated_total", "Uploads cut to the endpoint's limit.",
+                                   ("endpoint",))
+INGEST_SECONDS = metrics.histogram("ingest_audio_seconds", "Duration of accepted uploads.", ("endpoint",),
+                                   buckets=(1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0))
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def vad_enabled() -> bool:
+    return (os.environ.get("VAD") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+class AudioRejected(ValueError):
+    """An upload refused at ingest; status is the HTTP status to answer with."""
+
+    def __init__(self, status: int, reason: str, endpoint: str, duration_s: Optional[float] = None,
+                 limit_s: Optional[float] = None, detail: Optional[str] = None):
+        super().__init__(detail or reason)
+        self.status = status
+        self.reason = reason
+        self.endpoint = endpoint
+        self.duration_s = duration_s
+        self.limit_s = limit_s
+        self.detail = detail
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"error": self.reason}
+        if self.duration_s is not None:
+            out["durationS"] = round(float(self.duration_s), 3)
+        if self.limit_s is not None:
+            out["limitS"] = self.limit_s
+        if self.detail:
+            out["detail"] = self.detail
+        return out
+
+
+def limits(endpoint: str) -> Tuple[float, str]:
+    """(max seconds, policy) for an endpoint name such as "assess" or "voice"."""
+    suffix = endpoint.upper()
+    base = _env_float("INGEST_MAX_S", 60.0)
+    max_s = _env_float(f"INGEST_MAX_S_{suffix}", min(base, DEFAULT_MAX_S.get(endpoint, base)))
+    policy = (os.environ.get(f"INGEST_POLICY_{suffix}") or os.environ.get("INGEST_POLICY") or "reject")
+    policy = policy.strip().lower()
+    return max_s, policy if policy in ("reject", "truncate") else "reject"
+
+
+# ---------- decode ----------
+
+def _decode_av(buf, target_sr, max_samples=None):
+    import av
+
+    try:
+        container = av.open(buf, format="webm")
+    except Exception:
+        buf.seek(0)
+        container = av.open(buf)
+    with container:
+        stream = next((s for s in container.streams if s.type == "audio"), None)
+        if stream is None:
+            raise ValueError("no_audio_stream")
+        resampler = av.audio.resampler.AudioResampler(format="s16", layout="mono", rate=target_sr)
+        frames = []
+        got = 0
+        for packet in container.demux(stream):
+            if packet.dts is None:
+                continue
+            for frame in packet.decode():
+                resampled = resampler.resample(frame)
+                for fr in resampled if isinstance(resampled, (list, tuple)) else [resampled]:
+                    frames.append(fr.to_ndarray())
+                    got += frames[-1].shape[-1]
+            if max_samples is not None and got > max_samples:
+                break
+    if not frames:
+        raise ValueError("no audio frames decoded")
+    audio_i16 = np.concatenate(frames, axis=1)[0]
+    if max_samples is not None:
+        audio_i16 = audio_i16[:max_samples + 1]
+    return audio_i16.astype(np.float32) / 32768.0
+
+
+def _decode_soundfile(buf, max_s=None):
+    import soundfile as sf
+
+    frames = -1
+    if max_s is not None:
+        frames = int(max_s * sf.info(buf).samplerate) + 1
+        buf.seek(0)
+    y, sr = sf.read(buf, frames=frames, dtype="float32", always_2d=False)
+    if y.ndim > 1:
+        y = y.mean(axis=1)
+    return y, sr
+
+
+def _decode_wave(buf, max_s=None):
+    with wave.open(buf, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError("only 16-bit PCM WAV is supported without PyAV/soundfile")
+        sr, channels = w.getframerate(), w.getnchannels()
+        n = w.getnframes() if max_s is None else min(w.getnframes(), int(max_s * sr) + 1)
+        pcm = np.frombuffer(w.readframes(n), dtype="<i2").astype(np.float32) / 32768.0
+    if channels > 1:
+        pcm = pcm.reshape(-1, channels).mean(axis=1)
+    return pcm, sr
+
+
+def resample(y: np.ndarray, sr: int, target_sr: int = SAMPLE_RATE) -> np.ndarray:
+    if sr == target_sr or y.size == 0:
+        return y
+    try:
+        import librosa
+        return librosa.resample(y, orig_sr=sr, target_sr=target_sr)
+    except Exception:
+        n = int(round(y.size * target_sr / float(sr)))
+        return np.interp(np.linspace(0, y.size - 1, n), np.arange(y.size), y).astype(np.float32)
+
+
+def _read(source: Union[bytes, str]) -> bytes:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    return source
+
+
+def decode(source: Union[bytes, str], target_sr: int = SAMPLE_RATE,
+           max_s: Optional[float] = None) -> Tuple[np.ndarray, int]:
+    """
+    Decode bytes or a path to mono float32 at target_sr. Raises ValueError.
+    With max_s, decoding stops just past max_s seconds; the result is then at most one
+    sample longer than max_s, which is how a caller tells "exactly" from "more".
+    """
+    raw = _read(source)
+    if not raw:
+        raise ValueError("empty_audio")
+    max_samples = int(max_s * target_sr) if max_s is not None else None
+    errors = []
+    try:
+        return _decode_av(io.BytesIO(raw), target_sr, max_samples), target_sr
+    except Exception as e:
+        errors.append(f"av: {e}")
+    for decoder in (_decode_soundfile, _decode_wave):
+        try:
+            y, sr = decoder(io.BytesIO(raw), max_s)
+            if y.size == 0:
+                raise ValueError("empty_audio_after_decode")
+            y = resample(y, sr, target_sr).astype(np.float32)
+            if max_samples is not None:
+                y = y[:max_samples + 1]
+            return y, target_sr
+        except Exception as e:
+            errors.append(f"{decoder.__name__.replace('_decode_', '')}: {e}")
+    raise ValueError(f"decode_failed: {'; '.join(errors)}")
+
+
+# ---------- ingest ----------
+
+def probe_duration(source: Union[bytes, str], stop_after: Optional[float] = None) -> Optional[float]:
+    """
+    Seconds of audio according to the container, without decoding; None when unknown.
+    Webm from MediaRecorder carries no duration, so its packet timestamps are walked
+    instead (demux only), stopping once stop_after is passed.
+    """
+    raw = _read(source)
+    try:
+        with wave.open(io.BytesIO(raw), "rb") as w:
+            return w.getnframes() / float(w.getframerate() or 1)
+    except Exception:
+        pass
+    try:
+        import av
+
+        with av.open(io.BytesIO(raw)) as container:
+            stream = next((s for s in container.streams if s.type == "audio"), None)
+            if stream is None:
+                return None
+            if stream.duration and stream.time_base:
+                return float(stream.duration * stream.time_base)
+            if container.duration:
+                return container.duration / float(av.time_base)
+            last = 0.0
+            for packet in container.demux(stream):
+                if packet.pts is None or packet.time_base is None:
+                    continue
+                last = max(last, float((packet.pts + (packet.duration or 0)) * packet.time_base))
+                if stop_after is not None and last > stop_after:
+                    break
+            return last or None
+    except Exception:
+        pass
+    try:
+        import soundfile as sf
+
+        return float(sf.info(io.BytesIO(raw)).duration)
+    except Exception:
+        return None
+
+
+def ingest(source: Union[bytes, str], endpoint: str) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Probe, enforce the endpoint's limits and decode to 16 kHz mono once.
+    Returns (samples, info) or raises AudioRejected.
+    """
+    max_s, policy = limits(endpoint)
+
+    def reject(status, reason, duration=None, detail=None):
+        INGEST_REJECTED.inc(endpoint=endpoint, reason=reason)
+        return AudioRejected(status, reason, endpoint, duration, max_s, detail)
+
+    raw = _read(source)
+    if not raw:
+        raise reject(422, "empty_audio")
+    probed = probe_duration(raw, stop_after=max_s + LIMIT_SLACK_S)
+    if probed is not None and probed > max_s + LIMIT_SLACK_S and policy == "reject":
+        raise reject(413, "audio_too_long", probed)
+
+    # reject allows the slack; truncate cuts exactly at the limit
+    cap_s = max_s + LIMIT_SLACK_S if policy == "reject" else max_s
+    try:
+        y, sr = decode(raw, max_s=cap_s)
+    except ValueError as e:
+        raise reject(422, "undecodable_audio", probed, str(e))
+    truncated = y.size > int(cap_s * sr)
+    if truncated and policy == "reject":
+        # the headers understated it (or had none); the decoder stopped at the limit
+        raise reject(413, "audio_too_long", max(probed or 0.0, y.size / float(sr)))
+    if truncated:
+        y = y[:int(cap_s * sr)]
+        INGEST_TRUNCATED.inc(endpoint=endpoint)
+    if y.size < _env_float("INGEST_MIN_S", 0.2) * sr:
+        raise reject(422, "audio_too_short", y.size / float(sr))
+    used_s = y.size / float(sr)
+    info = {"durationS": round(probed if probed is not None else used_s, 3), "truncated": truncated}
+    if truncated:
+        info["usedS"] = round(used_s, 3)
+    INGEST_SECONDS.observe(used_s, endpoint=endpoint)
+    return y, info
+
+
+# ---------- VAD ----------
+
+class OffsetMap:
+    """Piecewise mapping from trimmed-audio seconds to original-audio seconds."""
+
+    def __init__(self, chunks: List[Tuple[int, int]], sr: int):
+        # chunks are (start, end) sample ranges of the original that were kept, in order
+        self.sr = sr
+        self.orig_starts = np.array([s for s, _ in chunks], dtype=np.float64) / sr
+        lengths = np.array([e - s for s, e in chunks], dtype=np.float64) / sr
+        self.new_starts = np.concatenate(([0.0], np.cumsum(lengths)[:-1])) if len(chunks) else np.zeros(0)
+        self.lengths = lengths
+
+    @property
+    def identity(self) -> bool:
+        """True when times need no mapping (nothing cut, or only the tail)."""
+        return len(self.orig_starts) == 0 or (len(self.orig_starts) == 1 and self.orig_starts[0] == 0.0)
+
+    def to_original(self, t: Optional[float], side: str = "start") -> Optional[float]:
+        """
+        Map one timestamp. A time on a chunk boundary belongs to the next chunk when it
+        starts something (side="start") and to the previous one when it ends something.
+        """
+        if t is None or not len(self.orig_starts):
+            return t
+        idx = int(np.searchsorted(self.new_starts, t, side="right" if side == "start" else "left")) - 1
+        idx = min(max(idx, 0), len(self.orig_starts) - 1)
+        offset = min(max(t - self.new_starts[idx], 0.0), self.lengths[idx])
+        return round(float(self.orig_starts[idx] + offset), 3)
+
+    def _copy(self, obj, **changes):
+        attrs = dict(obj._asdict()) if hasattr(obj, "_asdict") else dict(vars(obj))
+        attrs.update(changes)
+        return SimpleNamespace(**attrs)
+
+    def remap_segment(self, seg):
+        """A copy of a Whisper segment (and its words) with original-audio timestamps."""
+        if self.identity:
+            return seg
+        words = [self._copy(w, start=self.to_original(getattr(w, "start", None), "start"),
+                            end=self.to_original(getattr(w, "end", None), "end"))
+                 for w in (getattr(seg, "words", None) or [])]
+        return self._copy(seg, start=self.to_original(getattr(seg, "start", None), "start"),
+                          end=self.to_original(getattr(seg, "end", None), "end"), words=words)
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """(start, end) index pairs of the True runs in a 1-D bool array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+def speech_frames(y: np.ndarray, sr: int) -> np.ndarray:
+    """Per-frame speech mask (FRAME_MS frames), before padding."""
+    frame = max(1, sr * FRAME_MS // 1000)
+    n = y.size // frame
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+    frames = y[:n * frame].reshape(n, frame)
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+    margin = float(_env_int("VAD_MARGIN_DB", 12))
+    # a clip with no silence in it has a "floor" made of speech; never set the bar more
+    # than 30 dB under the loudest frame in that case
+    threshold = min(np.percentile(energy_db, 10) + margin, energy_db.max() - 30.0)
+    loud = energy_db > threshold
+    fricative = (energy_db > threshold - margin / 2) & (zcr > 0.3)
+    # below -60 dBFS nothing counts, however quiet the floor
+    mask = (loud | fricative) & (energy_db > -60.0)
+    # drop isolated clicks shorter than two frames
+    for s, e in _runs(mask):
+        if e - s < 2:
+            mask[s:e] = False
+    return mask
+
+
+def trim_silence(y: np.ndarray, sr: int = SAMPLE_RATE) -> Tuple[np.ndarray, OffsetMap]:
+    """Trim edge silence and shorten long pauses; returns (audio, OffsetMap to the original)."""
+    whole = OffsetMap([(0, y.size)], sr)
+    mask = speech_frames(y, sr)
+    if not mask.any():
+        return y, whole
+    frame = max(1, sr * FRAME_MS // 1000)
+    pad = _env_int("VAD_PAD_MS", 150) * sr // 1000
+    max_pause = _env_int("VAD_MAX_PAUSE_MS", 500) * sr // 1000
+    keep_pause = min(_env_int("VAD_KEEP_PAUSE_MS", 300) * sr // 1000, max_pause)
+
+    regions = []
+    for s, e in _runs(mask):
+        start, end = max(0, s * frame - pad), min(y.size, e * frame + pad)
+        if regions and start - regions[-1][1] <= max_pause:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    chunks: List[Tuple[int, int]] = []
+    for i, (start, end) in enumerate(regions):
+        if i:
+            # keep a pause of keep_pause, half on each side of the gap
+            half = keep_pause // 2
+            chunks[-1] = (chunks[-1][0], chunks[-1][1] + half)
+            start -= keep_pause - half
+        chunks.append((start, end))
+
+    kept = sum(e - s for s, e in chunks)
+    if y.size - kept < _env_int("VAD_MIN_SAVING_MS", 200) * sr // 1000:
+        return y, whole
+    trimmed = np.concatenate([y[s:e] for s, e in chunks]).astype(np.float32, copy=False)
+    return trimmed, OffsetMap(chunks, sr)
+
+
+def trim_for_asr(y: np.ndarray, use_vad: bool = True, sr: int = SAMPLE_RATE) -> Tuple[np.ndarray, OffsetMap, Any]:
+    """
+    The samples to hand Whisper and their OffsetMap. The third value describes the trim
+    for responses, or None when VAD is off or found nothing to trim.
+    """
+    if not use_vad:
+        return y, OffsetMap([], sr), None
+    trimmed, offsets = trim_silence(y, sr)
+    if trimmed is y:
+        return y, offsets, None
+    info = {
+        "originalS": round(y.size / sr, 3),
+        "trimmedS": round(trimmed.size / sr, 3),
+        "chunks": len(offsets.orig_starts),
+    }
+    return trimmed, offsets, info
@@ -0,0 +1,174 @@
+"""
+In-memory stand-in for the parts of the Firestore client the backend uses.
+
+collection(...).document(id).set/get, where/order_by/limit/start_after/stream and
+SERVER_TIMESTAMP are supported; documents are deep-copied in and out like a real
+round trip. read_ms/write_ms add a fixed delay per call to model network latency.
+"""
+import copy
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+def _resolve(value):
+    """Replace SERVER_TIMESTAMP sentinels with the current time."""
+    if type(value).__name__ == "Sentinel":
+        return datetime.now(timezone.utc)
+    if isinstance(value, dict):
+        return {k: _resolve(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve(v) for v in value]
+    return copy.deepcopy(value)
+
+
+class Snapshot:
+    def __init__(self, doc_id, data, reference=None):
+        self.id = doc_id
+        self._data = data
+        self.reference = reference
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class DocumentRef:
+    def __init__(self, store, collection, doc_id):
+        self._store = store
+        self._collection = collection
+        self.id = doc_id
+
+    def set(self, data, merge=False):
+        self._store._delay(self._store.write_ms)
+        with self._store.lock:
+            docs = self._store.data.setdefault(self._collection, {})
+            if merge and self.id in docs:
+                docs[self.id].update(_resolve(data))
+            else:
+                docs[self.id] = _resolve(data)
+
+    def update(self, data):
+        self.set(data, merge=True)
+
+    def delete(self):
+        self._store._delay(self._store.write_ms)
+        with self._store.lock:
+            self._store.data.get(self._collection, {}).pop(self.id, None)
+
+    def get(self):
+        self._store._delay(self._store.read_ms)
+        with self._store.lock:
+            data = self._store.data.get(self._collection, {}).get(self.id)
+            return Snapshot(self.id, copy.deepcopy(data), self)
+
+
+class Query:
+    def __init__(self, store, collection, filters=(), orders=(), limit_n=None, after=None):
+        self._store = store
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_n
+        self._after = after
+
+    def _copy(self, **kw):
+        args = dict(filters=self._filters, orders=self._orders, limit_n=self._limit, after=self._after)
+        args.update(kw)
+        return Query(self._store, self._collection, **args)
+
+    def where(self, field, op, value):
+        if op not in _OPS:
+            raise ValueError(f"unsupported operator: {op}")
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        desc = str(direction).upper().startswith("DESC")
+        return self._copy(orders=self._orders + ((field, desc),))
+
+    def limit(self, n):
+        return self._copy(limit_n=int(n))
+
+    def start_after(self, cursor):
+        return self._copy(after=cursor)
+
+    @staticmethod
+    def _value(doc_id, data, field):
+        return doc_id if field == "__name__" else data.get(field)
+
+    def stream(self):
+        self._store._delay(self._store.read_ms)
+        with self._store.lock:
+            items = [(k, copy.deepcopy(v)) for k, v in self._store.data.get(self._collection, {}).items()]
+        rows = [(k, v) for k, v in items
+                if all(_OPS[op](self._value(k, v, f), val) for f, op, val in self._filters)]
+        for field, desc in reversed(self._orders):
+            rows = [r for r in rows if self._value(r[0], r[1], field) is not None]
+            rows.sort(key=lambda r, f=field: self._value(r[0], r[1], f), reverse=desc)
+        if self._after is not None:
+            if isinstance(self._after, Snapshot):
+                after_id, after_data = self._after.id, self._after._data or {}
+            else:
+                after_id, after_data = None, dict(self._after)
+            ids = [k for k, _ in rows]
+            if after_id in ids:
+                rows = rows[ids.index(after_id) + 1:]
+            elif self._orders:
+                field, desc = self._orders[0]
+                pivot = self._value(after_id, after_data, field)
+                rows = [r for r in rows if (self._value(r[0], r[1], field) < pivot if desc
+                                            else self._value(r[0], r[1], field) > pivot)]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        for k, v in rows:
+            yield Snapshot(k, v, DocumentRef(self._store, self._collection, k))
+
+    def get(self):
+        return list(self.stream())
+
+
+class CollectionRef(Query):
+    def __init__(self, store, name):
+        super().__init__(store, name)
+        self.id = name
+
+    def document(self, doc_id=None):
+        return DocumentRef(self._store, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+
+class FakeFirestore:
+    def __init__(self, read_ms=0.0, write_ms=0.0):
+        self.read_ms = float(read_ms)
+        self.write_ms = float(write_ms)
+        self.lock = threading.Lock()
+        self.data = {}
+
+    @staticmethod
+    def _delay(ms):
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    def collection(self, name):
+        return CollectionRef(self, name)
+
+    def count(self, name):
+        with self.lock:
+            return len(self.data.get(name, {}))
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the scoring and voice hot paths.
+
+    python bench/hotpaths.py                          # run, compare with bench/baseline.json
+    python bench/hotpaths.py --filter scorer --quick  # a subset, fewer repeats
+    python bench/hotpaths.py --update-baseline        # store this run as the new baseline
+
+Each case reports the median time per call, throughput in its own unit (tokens/s,
+words/s, audio seconds/s) and the tracemalloc peak of one call. Results are written as
+JSON; a case is a regression when its best-of-repeats time (or allocation peak) exceeds
+the baseline by more than --threshold (--alloc-threshold). The exit code is 1 on regression.
+
+Inputs come from bench/synthetic.py, so runs are offline and CPU-only. Cases whose
+optional dependencies (librosa, av/soundfile) are missing are reported as skipped.
+Baselines are machine-specific. The committed bench/baseline.json is only a reference
+for the machine named in its "environment" (a 1-CPU x86_64 sandbox). On any other host
+(CPU model, core count, Python or NumPy version differ) the comparison is printed but no
+regression is reported; record that host's own baseline with --update-baseline and
+point --baseline at it, or pass --force-compare.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+# CPU only, whatever the host has
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+for path in (BASE_DIR, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import numpy as np  # noqa: E402
+
+import synthetic  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_THRESHOLD = 0.15
+DEFAULT_ALLOC_THRESHOLD = 0.25
+# allocation deltas below this are noise (interned strings, small dict resizes)
+ALLOC_FLOOR_BYTES = 16 * 1024
+
+
+class Skip(Exception):
+    pass
+
+
+def _require(*modules):
+    import importlib
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            raise Skip(f"{name} not installed")
+
+
+# ---------- cases ----------
+# each factory returns (fn, items, unit); fn() runs one call of the hot function
+
+def case_normalize_word_token(n):
+    from assessment import _normalize_word_token
+    tokens = synthetic.hypothesis_words(synthetic.target_sentence(n, seed=n), error_rate=0.3, seed=n)
+
+    def run():
+        for t in tokens:
+            _normalize_word_token(t)
+    return run, len(tokens), "tokens"
+
+
+def case_incremental_scorer(n):
+    """The /api/assess/stream path: provisional statuses after every segment, then finish()."""
+    from assessment import IncrementalScorer
+    target = synthetic.target_sentence(n, seed=n)
+    segments = synthetic.whisper_segments(target, seed=n)
+
+    def run():
+        scorer = IncrementalScorer(target)
+        for seg in segments:
+            scorer.add_segment(seg)
+        scorer.finish()
+    return run, n, "words"
+
+
+def case_process_assessment(n):
+    from assessment import process_assessment_from_whisper
+    target = synthetic.target_sentence(n, seed=n)
+    segments = synthetic.whisper_segments(target, seed=n)
+    return (lambda: process_assessment_from_whisper(target, segments)), n, "words"
+
+
+def case_embed(seconds):
+    _require("librosa")
+    from voice_security import _embed
+    y = synthetic.speech_like(seconds, seed=int(seconds))
+    return (lambda: _embed(y, 16000)), seconds, "audio_s"
+
+
+def case_decode(seconds):
+    try:
+        _require("av")
+    except Skip:
+        _require("soundfile")
+    from voice_security import _decode_to_wav_float
+    # 44.1 kHz stereo so the resample/downmix path is exercised
+    data = synthetic.wav_bytes(synthetic.speech_like(seconds, sr=44100, seed=int(seconds)), sr=44100, channels=2)
+    return (lambda: _decode_to_wav_float(synthetic.Upload(data))), seconds, "audio_s"
+
+
+def case_trim_silence(seconds):
+    from audio import trim_silence
+    y = synthetic.speech_like(seconds, seed=int(seconds))
+    # a second of near-silence at each end, like a phone recording
+    pad = np.full(16000, 1e-4, dtype=np.float32)
+    y = np.concatenate([pad, y, pad])
+    return (lambda: trim_silence(y, 16000)), seconds, "audio_s"
+
+
+CASES = [
+    ("normalize_word_token[n=200]", case_normalize_word_token, 200),
+    ("normalize_word_token[n=2000]", case_normalize_word_token, 2000),
+    ("incremental_scorer[n=10]", case_incremental_scorer, 10),
+    ("incremental_scorer[n=40]", case_incremental_scorer, 40),
+    ("incremental_scorer[n=120]", case_incremental_scorer, 120),
+    ("process_assessment[n=10]", case_process_assessment, 10),
+    ("process_assessment[n=40]", case_process_assessment, 40),
+    ("process_assessment[n=120]", case_process_assessment, 120),
+    ("embed[1s]", case_embed, 1.0),
+    ("embed[5s]", case_embed, 5.0),
+    ("embed[15s]", case_embed, 15.0),
+    ("decode[1s]", case_decode, 1.0),
+    ("decode[5s]", case_decode, 5.0),
+    ("decode[15s]", case_decode, 15.0),
+    ("trim_silence[5s]", case_trim_silence, 5.0),
+    ("trim_silence[30s]", case_trim_silence, 30.0),
+]
+
+
+# ---------- measurement ----------
+
+def _timed(fn, number):
+    t0 = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return time.perf_counter() - t0
+
+
+def measure(fn, min_time=0.2, repeats=7):
+    """Median/min seconds per call over `repeats` rounds of an auto-sized loop, with GC off."""
+    fn()  # warm imports and caches
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        number = 1
+        while True:
+            elapsed = _timed(fn, number)
+            if elapsed >= min_time / repeats or number >= 1 << 20:
+                break
+            number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / repeats / elapsed) + 1))
+        per_call = [_timed(fn, number) / number for _ in range(repeats)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        fn()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "median_s": statistics.median(per_call),
+        "min_s": min(per_call),
+        "stdev_s": statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        "loops": number,
+        "repeats": repeats,
+        "alloc_peak_bytes": max(0, peak - before),
+        "alloc_retained_bytes": max(0, after - before),
+    }
+
+
+def run_cases(pattern=None, min_time=0.2, repeats=7):
+    results = {}
+    for name, factory, arg in CASES:
+        if pattern and pattern not in name:
+            continue
+        try:
+            fn, items, unit = factory(arg)
+        except Skip as e:
+            results[name] = {"skipped": str(e)}
+            print(f"{name:34s} skipped ({e})", flush=True)
+            continue
+        r = measure(fn, min_time, repeats)
+        r["items"] = items
+        r["unit"] = unit
+        r["throughput"] = items / r["median_s"] if r["median_s"] > 0 else None
+        results[name] = r
+        print(f"{name:34s} {r['median_s'] * 1e6:12.1f} us  {r['throughput']:14.1f} {unit}/s"
+              f"  peak {r['alloc_peak_bytes'] / 1024:9.1f} KiB", flush=True)
+    return results
+
+
+def cpu_model():
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu": cpu_model(),
+        "cpus": os.cpu_count(),
+    }
+
+
+# what has to match for times to be comparable; the kernel version does not
+HOST_KEYS = ("python", "numpy", "machine", "cpu", "cpus")
+
+
+def same_host(a, b):
+    return all(a.get(k) == b.get(k) for k in HOST_KEYS)
+
+
+# ---------- baseline ----------
+
+def compare(current, baseline, threshold, alloc_threshold):
+    """Return (rows, regressions) comparing shared, non-skipped cases."""
+    rows, regressions = [], []
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if not base or "skipped" in cur or "skipped" in base:
+            continue
+        # min over repeats is the least noisy estimate on a shared machine
+        ratio = cur["min_s"] / base["min_s"] if base["min_s"] else 1.0
+        b_alloc, c_alloc = base.get("alloc_peak_bytes", 0), cur.get("alloc_peak_bytes", 0)
+        alloc_ratio = c_alloc / b_alloc if b_alloc else 1.0
+        slow = ratio > 1.0 + threshold
+        fat = alloc_ratio > 1.0 + alloc_threshold and c_alloc - b_alloc > ALLOC_FLOOR_BYTES
+        rows.append({"case": name, "time_ratio": round(ratio, 3), "alloc_ratio": round(alloc_ratio, 3),
+                     "slower": slow, "more_alloc": fat})
+        if slow or fat:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scoring and voice hot paths.")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help="Shorter runs (min-time 0.05s, 3 repeats)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Target seconds of timing per case")
+    parser.add_argument("--repeats", type=int, default=7, help="Timing rounds per case")
+    parser.add_argument("--out", default="", help="Write results JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown of the best time, as a fraction (0.15 = 15%%)")
+    parser.add_argument("--alloc-threshold", type=float, default=DEFAULT_ALLOC_THRESHOLD,
+                        help="Allowed growth of the allocation peak, as a fraction")
+    parser.add_argument("--update-baseline", action="store_true", help="Save this run as the baseline")
+    parser.add_argument("--force-compare", action="store_true",
+                        help="Report regressions even against a baseline from another host")
+    args = parser.parse_args()
+
+    min_time, repeats = (0.05, 3) if args.quick else (args.min_time, max(1, args.repeats))
+    results = run_cases(args.filter or None, min_time, repeats)
+    report = {
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "results": results,
+    }
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        merged = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+            # results from another host cannot be mixed into this one's baseline
+            if same_host(previous.get("environment", {}), report["environment"]):
+                merged = previous.get("results", {})
+        # a filtered run only replaces the cases it measured
+        merged.update({k: v for k, v in results.items() if "skipped" not in v or k not in merged})
+        report["results"] = merged
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"baseline written: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows, regressions = compare(results, baseline.get("results", {}), args.threshold, args.alloc_threshold)
+    print()
+    for row in rows:
+        flag = "REGRESSION" if row["slower"] or row["more_alloc"] else "ok"
+        print(f"{row['case']:34s} time x{row['time_ratio']:<6} alloc x{row['alloc_ratio']:<6} {flag}")
+    if not same_host(baseline.get("environment", {}), report["environment"]):
+        differs = [k for k in HOST_KEYS if baseline.get("environment", {}).get(k) != report["environment"].get(k)]
+        print(f"baseline was recorded on another host ({', '.join(differs)} differ); times are not comparable.")
+        print("record this host's baseline with --update-baseline --baseline <file>")
+        if not args.force_compare:
+            return 0
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%} time / {args.alloc_threshold:.0%} alloc")
+        return 1
+    print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
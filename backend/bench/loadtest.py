@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for /api/assess, /api/assess/stream, /api/voice/verify and /api/attempts.
+
+By default the app is started in-process on an ephemeral port with:
+- StubWhisperModel (bench/stub_asr.py) in place of WhisperModel, with configurable latency
+- FakeFirestore (bench/fake_firestore.py) in place of Firestore
+- bearer tokens taken as the uid, and voice centroids in a temp dir
+
+    python bench/loadtest.py --concurrency 8 --duration 30
+    python bench/loadtest.py --rate 20 --duration 60 --mix assess=1,stream=1 --stub-base-ms 400
+    python bench/loadtest.py --clips recordings/ --requests 500 --out load.json
+    python bench/loadtest.py --serve --port 5051            # just run the stubbed app
+    python bench/loadtest.py --url http://127.0.0.1:5051 --token "$ID_TOKEN"
+
+--concurrency runs a closed loop (each worker sends its next request when the last one
+finishes). --rate runs an open loop with Poisson arrivals; latency is measured from the
+scheduled arrival time, so queueing inside the client counts too.
+
+The report lists count, error rate, throughput and p50/p95/p99 latency per endpoint,
+plus the server-side transcribe_ms/score_ms breakdown and, for SSE, time to first segment.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+for path in (BASE_DIR, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import numpy as np  # noqa: E402
+
+import synthetic  # noqa: E402
+
+ENDPOINTS = ("assess", "stream", "verify", "attempts")
+AUDIO_EXTS = (".wav", ".webm", ".ogg", ".mp3", ".m4a", ".flac")
+DEFAULT_TARGET = "The quick brown fox jumps over the lazy dog and practice makes perfect."
+
+
+# ---------- stubbed app ----------
+
+def build_stub_app(args, users):
+    """create_app() with the stub ASR, the Firestore stand-in and token-as-uid auth."""
+    import app as app_module
+    import voice_security
+    from fake_firestore import FakeFirestore
+    from stub_asr import StubWhisperModel
+
+    stub_text = args.target if not args.clips else None
+
+    def token_uid():
+        from flask import request
+        authz = request.headers.get("Authorization", "")
+        if not authz.startswith("Bearer "):
+            raise ValueError("missing bearer token")
+        return authz.split(" ", 1)[1].strip()
+
+    app_module.init_firebase = lambda: FakeFirestore(args.fs_read_ms, args.fs_write_ms)
+    app_module.init_whisper = lambda name=None: StubWhisperModel(
+        base_ms=args.stub_base_ms, rtf=args.stub_rtf, jitter=args.stub_jitter, mode=args.stub_mode,
+        text=stub_text, fail_rate=args.stub_fail_rate, seed=args.seed)
+    app_module.auth_uid = token_uid
+    voice_security._auth_uid = token_uid
+
+    voice_security.STORE_DIR = tempfile.mkdtemp(prefix="loadtest-voices-")
+    rng = np.random.default_rng(args.seed)
+    for uid in users:
+        centroid = rng.standard_normal(20).astype(np.float32)
+        voice_security._save_centroid(uid, centroid / np.linalg.norm(centroid))
+
+    app = app_module.create_app()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    return app
+
+
+def start_server(app, host, port):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *a, **kw):
+            pass
+
+    server = make_server(host, port, app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, name="loadtest-server", daemon=True)
+    thread.start()
+    return server
+
+
+# ---------- workload ----------
+
+def load_clips(args):
+    """[(filename, bytes, target)] from --clips, or synthetic WAV clips."""
+    clips = []
+    if args.clips:
+        for name in sorted(os.listdir(args.clips)):
+            if not name.lower().endswith(AUDIO_EXTS):
+                continue
+            path = os.path.join(args.clips, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            target = args.target
+            sidecar = os.path.splitext(path)[0] + ".txt"
+            if os.path.exists(sidecar):
+                with open(sidecar, "r", encoding="utf-8") as f:
+                    target = f.read().strip() or target
+            clips.append((name, data, target))
+        if not clips:
+            raise SystemExit(f"no audio clips in {args.clips}")
+        return clips
+    for i, seconds in enumerate(float(s) for s in args.synthetic_seconds.split(",") if s.strip()):
+        y = synthetic.speech_like(seconds, seed=args.seed + i)
+        clips.append((f"synthetic_{seconds:g}s.wav", synthetic.wav_bytes(y), args.target))
+    return clips
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"unknown endpoint in --mix: {name} (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise SystemExit("--mix selects no endpoints")
+    return mix
+
+
+def multipart(fields, file_field, filename, data):
+    boundary = uuid.uuid4().hex
+    out = []
+    for k, v in fields.items():
+        out.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode("utf-8"))
+    out.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+               f'filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n'.encode("utf-8"))
+    out.append(data)
+    out.append(f"\r\n--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(out), f"multipart/form-data; boundary={boundary}"
+
+
+class Client:
+    def __init__(self, base_url, token=None, timeout=120.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self.token = token
+        self.timeout = timeout
+
+    def _conn(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _headers(self, uid, content_type):
+        return {"Authorization": f"Bearer {self.token or uid}", "Content-Type": content_type}
+
+    def call(self, endpoint, uid, clip, t_start):
+        """Run one request; returns a result dict. t_start is when the request was due."""
+        name, data, target = clip
+        res = {"endpoint": endpoint, "ok": False, "status": None}
+        conn = self._conn()
+        try:
+            if endpoint == "attempts":
+                body = json.dumps({
+                    "target": target, "accuracy": 0.8, "wer": 0.2, "duration": 2.5,
+                    "transcript": target, "hardWords": ["through"], "studyTag": "loadtest",
+                }).encode("utf-8")
+                conn.request("POST", "/api/attempts", body, self._headers(uid, "application/json"))
+            else:
+                path = {"assess": "/api/assess", "stream": "/api/assess/stream",
+                        "verify": "/api/voice/verify"}[endpoint]
+                fields = {} if endpoint == "verify" else {"target": target, "lang": "en"}
+                body, ctype = multipart(fields, "file", name, data)
+                conn.request("POST", path, body, self._headers(uid, ctype))
+            resp = conn.getresponse()
+            res["status"] = resp.status
+            if endpoint == "stream" and resp.status == 200:
+                self._read_sse(resp, res, t_start)
+            else:
+                payload = resp.read()
+                res["ttfb_ms"] = (time.perf_counter() - t_start) * 1000.0
+                try:
+                    obj = json.loads(payload or b"{}")
+                except ValueError:
+                    obj = {}
+                res["ok"] = 200 <= resp.status < 300 and not obj.get("error")
+                if not res["ok"]:
+                    res["error"] = obj.get("error") or f"http {resp.status}"
+                self._stages(obj, res)
+        except Exception as e:
+            res["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            conn.close()
+        res["latency_ms"] = (time.perf_counter() - t_start) * 1000.0
+        return res
+
+    @staticmethod
+    def _stages(obj, res):
+        for src, dst in (("transcribe_ms", "transcribe_ms"), ("score_ms", "score_ms"),
+                         ("latency_ms", "server_ms")):
+            if isinstance(obj.get(src), (int, float)):
+                res[dst] = float(obj[src])
+
+    def _read_sse(self, resp, res, t_start):
+        event, data = None, []
+        segments = 0
+        while True:
+            raw = resp.readline()
+            if not raw:
+                break
+            line = raw.decode("utf-8").rstrip("\r\n")
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].strip())
+            elif line == "" and event:
+                obj = json.loads("\n".join(data) or "{}")
+                if event == "segment":
+                    segments += 1
+                    if segments == 1:
+                        res["ttfb_ms"] = (time.perf_counter() - t_start) * 1000.0
+                elif event == "done":
+                    res["ok"] = True
+                    self._stages(obj, res)
+                elif event == "error":
+                    res["error"] = obj.get("error") or "sse error"
+                event, data = None, []
+        res["segments"] = segments
+        if not res["ok"] and "error" not in res:
+            res["error"] = "stream ended without done"
+
+
+# ---------- drivers ----------
+
+class Workload:
+    def __init__(self, mix, clips, users, seed):
+        self.names = list(mix)
+        self.weights = [mix[n] for n in self.names]
+        self.clips = clips
+        self.users = users
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.issued = 0
+
+    def next(self):
+        with self.lock:
+            i = self.issued
+            self.issued += 1
+            endpoint = self.rng.choices(self.names, self.weights)[0]
+            clip = self.clips[self.rng.randrange(len(self.clips))]
+        return i, endpoint, self.users[i % len(self.users)], clip
+
+
+def run_closed(client, workload, concurrency, duration, max_requests):
+    results, lock = [], threading.Lock()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker():
+        while True:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            i, endpoint, uid, clip = workload.next()
+            if max_requests and i >= max_requests:
+                return
+            r = client.call(endpoint, uid, clip, time.perf_counter())
+            with lock:
+                results.append(r)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def run_open(client, workload, rate, duration, max_requests, max_inflight, seed):
+    results, lock = [], threading.Lock()
+    rng = random.Random(seed + 7)
+    t0 = time.perf_counter()
+    due = t0
+
+    def one(endpoint, uid, clip, scheduled):
+        r = client.call(endpoint, uid, clip, scheduled)
+        with lock:
+            results.append(r)
+
+    with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="load") as pool:
+        while True:
+            due += rng.expovariate(rate)
+            if duration and due - t0 >= duration:
+                break
+            i, endpoint, uid, clip = workload.next()
+            if max_requests and i >= max_requests:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, endpoint, uid, clip, due)
+    return results
+
+
+# ---------- report ----------
+
+def pct(values, qs=(50, 95, 99)):
+    if not values:
+        return None
+    arr = np.asarray(values, dtype=np.float64)
+    out = {f"p{q}": round(float(np.percentile(arr, q)), 2) for q in qs}
+    out["mean"] = round(float(arr.mean()), 2)
+    out["max"] = round(float(arr.max()), 2)
+    return out
+
+
+def summarize(results, elapsed):
+    def stats(rows):
+        errors = [r for r in rows if not r["ok"]]
+        statuses, messages = {}, {}
+        for r in rows:
+            statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+        for r in errors:
+            msg = str(r.get("error"))[:80]
+            messages[msg] = messages.get(msg, 0) + 1
+        out = {
+            "count": len(rows),
+            "errors": len(errors),
+            "error_rate": round(len(errors) / len(rows), 4) if rows else 0.0,
+            "throughput_rps": round(len(rows) / elapsed, 2) if elapsed > 0 else None,
+            "latency_ms": pct([r["latency_ms"] for r in rows]),
+            "status": statuses,
+        }
+        for key in ("ttfb_ms", "transcribe_ms", "score_ms", "server_ms"):
+            vals = [r[key] for r in rows if r["ok"] and key in r]
+            if vals:
+                out[key] = pct(vals)
+        if messages:
+            out["top_errors"] = dict(sorted(messages.items(), key=lambda x: -x[1])[:5])
+        return out
+
+    by_endpoint = {}
+    for r in results:
+        by_endpoint.setdefault(r["endpoint"], []).append(r)
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total": stats(results),
+        "endpoints": {name: stats(rows) for name, rows in sorted(by_endpoint.items())},
+    }
+
+
+def print_report(report):
+    def fmt(d, key):
+        return f"{d[key]:9.1f}" if d else f"{'-':>9}"
+
+    print(f"\n{'endpoint':10s} {'count':>7} {'err%':>6} {'rps':>7} {'p50':>9} {'p95':>9} {'p99':>9}"
+          f" {'trans p50':>9} {'trans p95':>9} {'score p50':>9} {'score p95':>9}")
+    rows = list(report["endpoints"].items()) + [("total", report["total"])]
+    for name, s in rows:
+        lat, tr, sc = s["latency_ms"], s.get("transcribe_ms"), s.get("score_ms")
+        print(f"{name:10s} {s['count']:7d} {s['error_rate'] * 100:6.1f} {s['throughput_rps'] or 0:7.2f}"
+              f" {fmt(lat, 'p50')} {fmt(lat, 'p95')} {fmt(lat, 'p99')}"
+              f" {fmt(tr, 'p50')} {fmt(tr, 'p95')} {fmt(sc, 'p50')} {fmt(sc, 'p95')}")
+    stream = report["endpoints"].get("stream", {})
+    if stream.get("ttfb_ms"):
+        t = stream["ttfb_ms"]
+        print(f"\nstream first segment ms: p50 {t['p50']:.1f}  p95 {t['p95']:.1f}  p99 {t['p99']:.1f}")
+    for name, s in rows:
+        if s.get("top_errors"):
+            print(f"{name} errors: {s['top_errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the assess/voice/attempts endpoints.")
+    load = parser.add_argument_group("load")
+    load.add_argument("--concurrency", type=int, default=4, help="Closed-loop workers")
+    load.add_argument("--rate", type=float, default=0.0, help="Open-loop arrivals per second (overrides --concurrency)")
+    load.add_argument("--max-inflight", type=int, default=256, help="Open-loop cap on outstanding requests")
+    load.add_argument("--duration", type=float, default=20.0, help="Seconds to run (0 = until --requests)")
+    load.add_argument("--requests", type=int, default=0, help="Stop after this many requests")
+    load.add_argument("--mix", default="assess=3,stream=3,verify=1,attempts=3",
+                      help="Endpoint weights, e.g. assess=1,stream=1")
+    load.add_argument("--users", type=int, default=20, help="Distinct uids to spread requests over")
+    load.add_argument("--clips", default="", help="Directory of recorded clips (optional <name>.txt holds the target)")
+    load.add_argument("--synthetic-seconds", default="2,4,8", help="Synthetic clip lengths when --clips is not set")
+    load.add_argument("--target", default=DEFAULT_TARGET, help="Target sentence sent with each clip")
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--out", default="", help="Write the JSON report here")
+    stub = parser.add_argument_group("in-process app")
+    stub.add_argument("--stub-base-ms", type=float, default=150.0, help="Fixed stub ASR latency per call")
+    stub.add_argument("--stub-rtf", type=float, default=0.3, help="Stub ASR milliseconds per audio millisecond")
+    stub.add_argument("--stub-jitter", type=float, default=0.1, help="Relative +/- latency jitter")
+    stub.add_argument("--stub-mode", choices=("sleep", "spin"), default="sleep",
+                      help="sleep releases the GIL like CTranslate2; spin holds it")
+    stub.add_argument("--stub-fail-rate", type=float, default=0.0, help="Fraction of transcriptions that raise")
+    stub.add_argument("--fs-read-ms", type=float, default=5.0, help="Firestore stand-in read latency")
+    stub.add_argument("--fs-write-ms", type=float, default=15.0, help="Firestore stand-in write latency")
+    stub.add_argument("--host", default="127.0.0.1")
+    stub.add_argument("--port", type=int, default=0, help="Port for the in-process app (0 = any free port)")
+    stub.add_argument("--serve", action="store_true", help="Only run the stubbed app until interrupted")
+    stub.add_argument("--verbose", action="store_true", help="Keep the app's INFO logging")
+    remote = parser.add_argument_group("remote")
+    remote.add_argument("--url", default="", help="Target an already running server instead")
+    remote.add_argument("--token", default="", help="Bearer token for --url (default: the uid itself)")
+    args = parser.parse_args()
+
+    users = [f"load-user-{i}" for i in range(max(1, args.users))]
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        app = build_stub_app(args, users)
+        server = start_server(app, args.host, args.port)
+        base_url = f"http://{args.host}:{server.port}"
+        if args.serve:
+            print(f"stubbed app listening on {base_url} (tokens are taken as uids)")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                return 0
+
+    mix = parse_mix(args.mix)
+    clips = load_clips(args)
+    workload = Workload(mix, clips, users, args.seed)
+    client = Client(base_url, token=args.token or None)
+    if not args.duration and not args.requests:
+        raise SystemExit("set --duration and/or --requests")
+
+    mode = f"open loop {args.rate}/s" if args.rate > 0 else f"closed loop x{args.concurrency}"
+    print(f"load: {mode}, mix {mix}, {len(clips)} clip(s), {base_url}", flush=True)
+    t0 = time.perf_counter()
+    if args.rate > 0:
+        results = run_open(client, workload, args.rate, args.duration, args.requests,
+                           max(1, args.max_inflight), args.seed)
+    else:
+        results = run_closed(client, workload, max(1, args.concurrency), args.duration, args.requests)
+    elapsed = time.perf_counter() - t0
+    if server is not None:
+        server.shutdown()
+
+    report = summarize(results, elapsed)
+    report["config"] = {k: v for k, v in vars(args).items() if k != "token"}
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nreport written: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Deterministic stand-in for faster_whisper.WhisperModel.
+
+transcribe() returns (segments generator, info) like the real model. The transcript is
+derived from a hash of the audio bytes, so the same clip always yields the same words,
+and the time spent is modelled as
+
+    latency = base_ms + rtf * audio_ms  (+/- jitter, also seeded by the clip)
+
+spread across the yielded segments, so /api/assess/stream sees segments arrive over time.
+mode="sleep" releases the GIL while "working" (like CTranslate2); mode="spin" burns
+CPU in Python instead, which shows GIL contention.
+"""
+import hashlib
+import random
+import threading
+import time
+import wave
+from types import SimpleNamespace
+
+import numpy as np
+
+import synthetic
+
+WORDS_PER_SECOND = 2.5
+
+
+def audio_duration(path):
+    """Seconds of audio; WAV headers are read, other formats are estimated from size (~32 kbps)."""
+    try:
+        with wave.open(path, "rb") as w:
+            return w.getnframes() / float(w.getframerate() or 1)
+    except Exception:
+        pass
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        return max(0.5, f.tell() / 4000.0)
+
+
+class StubWhisperModel:
+    def __init__(self, base_ms=150.0, rtf=0.3, jitter=0.1, mode="sleep", text=None,
+                 error_rate=0.15, words_per_segment=8, fail_rate=0.0, seed=0):
+        self.base_ms = float(base_ms)
+        self.rtf = float(rtf)
+        self.jitter = float(jitter)
+        self.mode = mode
+        self.text = text
+        self.error_rate = float(error_rate)
+        self.words_per_segment = max(1, int(words_per_segment))
+        self.fail_rate = float(fail_rate)
+        self.seed = int(seed)
+        self._fail_rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _work(self, seconds):
+        if seconds <= 0:
+            return
+        if self.mode == "spin":
+            end = time.perf_counter() + seconds
+            while time.perf_counter() < end:
+                pass
+        else:
+            time.sleep(seconds)
+
+    def transcribe(self, audio, beam_size=5, vad_filter=False, temperature=0.0, language=None,
+                   word_timestamps=True, **kwargs):
+        if isinstance(audio, str):
+            with open(audio, "rb") as f:
+                digest = hashlib.sha1(f.read()).digest()
+            duration = audio_duration(audio)
+        else:
+            # 16 kHz float32 samples, as faster-whisper accepts them
+            samples = np.asarray(audio, dtype=np.float32)
+            digest = hashlib.sha1(samples.tobytes()).digest()
+            duration = samples.size / 16000.0
+        clip_seed = int.from_bytes(digest[:4], "big") ^ self.seed
+        with self._lock:
+            self.calls += 1
+            fail = self._fail_rng.random() < self.fail_rate
+
+        rng = random.Random(clip_seed)
+        latency_s = (self.base_ms + self.rtf * duration * 1000.0) / 1000.0
+        latency_s *= 1.0 + self.jitter * (2 * rng.random() - 1)
+
+        if fail:
+            self._work(latency_s / 2)
+            raise RuntimeError("stub transcription failure")
+
+        text = self.text or synthetic.target_sentence(max(3, int(duration * WORDS_PER_SECOND)), seed=clip_seed)
+        segments = synthetic.whisper_segments(text, self.error_rate, self.words_per_segment, seed=clip_seed)
+        info = SimpleNamespace(language=language or "en", language_probability=1.0, duration=duration)
+
+        def generate():
+            step = latency_s / max(1, len(segments))
+            for seg in segments:
+                self._work(step)
+                seg.avg_logprob = -0.2
+                yield seg
+
+        return generate(), info
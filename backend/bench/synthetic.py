@@ -0,0 +1,111 @@
+"""
+Synthetic inputs for the benchmarks: Whisper-like segments and speech-like audio.
+
+Everything is generated from a seed, so a run is repeatable and needs no model,
+network or recorded audio.
+"""
+import io
+import random
+import wave
+from types import SimpleNamespace
+
+import numpy as np
+
+VOCAB = [
+    "the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "practice",
+    "makes", "perfect", "pronunciation", "clearly", "weather", "through", "thought",
+    "comfortable", "vegetable", "schedule", "library", "particularly", "world",
+    "rural", "sixth", "squirrel", "anemone", "February", "specific", "entrepreneur",
+]
+PUNCT = ["", "", "", ",", ".", "?", "!", "”", "'"]
+
+
+def target_sentence(n_words, seed=0):
+    rng = random.Random(seed)
+    words = [rng.choice(VOCAB) for _ in range(n_words)]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+
+def hypothesis_words(target, error_rate=0.2, seed=0):
+    """Target words with substitutions, deletions and insertions mixed in."""
+    rng = random.Random(seed + 1)
+    out = []
+    for w in target.split():
+        r = rng.random()
+        if r < error_rate / 3:
+            continue
+        if r < 2 * error_rate / 3:
+            out.append(rng.choice(VOCAB))
+        elif r < error_rate:
+            out.extend([w, rng.choice(VOCAB)])
+        else:
+            out.append(w)
+    return [w + rng.choice(PUNCT) for w in out] or ["uh"]
+
+
+def whisper_segments(target, error_rate=0.2, words_per_segment=12, seed=0):
+    """Objects shaped like faster-whisper Segment/Word (text, words[].word/start/end/probability)."""
+    rng = random.Random(seed + 2)
+    words = hypothesis_words(target, error_rate, seed)
+    segments, t = [], 0.0
+    for i in range(0, len(words), words_per_segment):
+        seg_words = []
+        for w in words[i:i + words_per_segment]:
+            dur = 0.18 + 0.05 * len(w) * rng.random()
+            seg_words.append(SimpleNamespace(word=" " + w, start=round(t, 2), end=round(t + dur, 2),
+                                             probability=0.5 + 0.5 * rng.random()))
+            t += dur + 0.05
+        segments.append(SimpleNamespace(text=" " + " ".join(w.word.strip() for w in seg_words),
+                                        start=seg_words[0].start, end=seg_words[-1].end, words=seg_words))
+    return segments
+
+
+def ref_tokens(words):
+    return [{"orig": w, "norm": w.strip(".,?!'”").lower()} for w in words]
+
+
+def speech_like(seconds, sr=16000, seed=0):
+    """Voiced bursts (harmonics under a syllable envelope) separated by low noise."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    t = np.arange(n, dtype=np.float64) / sr
+    f0 = 110 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * 3.0 * t), 0, None) ** 2
+    # leading/trailing silence so trimming has work to do
+    pad = int(0.3 * sr)
+    envelope[:pad] = 0
+    envelope[-pad:] = 0
+    y = 0.3 * envelope * voiced + 0.003 * rng.standard_normal(n)
+    return y.astype(np.float32)
+
+
+def wav_bytes(y, sr=16000, channels=1):
+    """Encode float audio as 16-bit PCM WAV; channels > 1 duplicates the signal."""
+    pcm = (np.clip(y, -1, 1) * 32767).astype("<i2")
+    if channels > 1:
+        pcm = np.repeat(pcm[:, None], channels, axis=1).reshape(-1)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+class Upload:
+    """Minimal stand-in for werkzeug's FileStorage: read() returns the payload."""
+
+    def __init__(self, data, filename="audio.wav"):
+        self.data = data
+        self.filename = filename
+
+    def read(self):
+        return self.data
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.data)
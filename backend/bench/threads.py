@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Throughput with and without the thread budget (thread_budget.py).
+
+    python bench/threads.py                              # workers/slots like production
+    python bench/threads.py --workers 4 --slots 2 --seconds 20
+    python bench/threads.py --workload blas --out threads.json
+
+Starts --workers processes, each running --slots concurrent jobs for --seconds, once per
+configuration:
+    default   every library at its own default (all cores per process)
+    budget    the per-worker budget from thread_budget.budget()
+and reports completed jobs per second and the p50/p95 job time.
+
+The job is a real faster-whisper transcription of a synthetic clip (--model, default
+tiny) when faster_whisper is installed (--workload whisper), otherwise a BLAS-bound
+stand-in (--workload blas: float32 matmuls sized like an encoder layer). Each process
+sets its thread variables before importing numpy, as app.py does. Expect no difference
+on a machine with one or two cores; the gain grows with cores x workers x slots.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+for path in (BASE_DIR, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import thread_budget  # noqa: E402
+
+CONFIGS = ("default", "budget")
+
+
+def _has_whisper() -> bool:
+    try:
+        import faster_whisper  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# ---------- one worker process ----------
+
+def child(args) -> dict:
+    """Run --slots job loops for --seconds; print per-job durations as JSON."""
+    import numpy as np
+
+    cfg = json.loads(args.child)
+    if cfg["workload"] == "whisper":
+        import synthetic
+        from faster_whisper import WhisperModel
+
+        kwargs = {}
+        if cfg["whisperThreads"]:
+            kwargs = {"cpu_threads": cfg["whisperThreads"], "num_workers": cfg["whisperWorkers"]}
+        model = WhisperModel(args.model, device="cpu", compute_type="int8", **kwargs)
+        clip = synthetic.speech_like(args.clip_seconds, seed=1)
+
+        def job():
+            segments, _ = model.transcribe(clip, beam_size=5, vad_filter=False, language="en")
+            list(segments)
+    else:
+        rng = np.random.default_rng(0)
+        a = rng.standard_normal((512, 512), dtype=np.float32)
+        b = rng.standard_normal((512, 2048), dtype=np.float32)
+
+        def job():
+            x = a
+            for _ in range(6):
+                x = np.tanh(x @ b)[:, :512]
+
+    job()  # warm-up: model load, BLAS thread pool start
+    times = []
+    lock = threading.Lock()
+    stop = time.perf_counter() + args.seconds
+
+    def loop():
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            job()
+            with lock:
+                times.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=loop) for _ in range(cfg["whisperWorkers"])]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {"times": times}
+
+
+# ---------- driver ----------
+
+def run_config(name: str, args, workload: str) -> dict:
+    b = thread_budget.budget(workers=args.workers, slots=args.slots)
+    env = dict(os.environ)
+    for var in thread_budget.BLAS_ENV:
+        env.pop(var, None)
+    cfg = {"workload": workload, "whisperWorkers": args.slots, "whisperThreads": 0}
+    if name == "budget":
+        for var in thread_budget.BLAS_ENV:
+            env[var] = str(b["blasThreads"] if workload == "whisper" else b["whisperThreads"])
+        cfg["whisperThreads"] = b["whisperThreads"]
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", json.dumps(cfg), "--seconds", str(args.seconds),
+           "--model", args.model, "--clip-seconds", str(args.clip_seconds)]
+    t0 = time.perf_counter()
+    procs = [subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, text=True) for _ in range(args.workers)]
+    times = []
+    for p in procs:
+        out, _ = p.communicate()
+        times.extend(json.loads(out.strip().splitlines()[-1])["times"])
+    wall = time.perf_counter() - t0
+    times.sort()
+    return {
+        "jobs": len(times),
+        "jobsPerS": round(len(times) / args.seconds, 3),
+        "p50S": round(statistics.median(times), 4) if times else None,
+        "p95S": round(times[int(0.95 * (len(times) - 1))], 4) if times else None,
+        "wallS": round(wall, 2),
+        "budget": b if name == "budget" else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare throughput with and without the thread budget.")
+    parser.add_argument("--workers", type=int, default=thread_budget.budget()["workers"],
+                        help="Worker processes (default: WEB_CONCURRENCY or 1)")
+    parser.add_argument("--slots", type=int, default=thread_budget.budget()["whisperWorkers"],
+                        help="Concurrent jobs per worker (default: WHISPER_CONCURRENCY or 1)")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Measured seconds per configuration")
+    parser.add_argument("--workload", choices=("auto", "whisper", "blas"), default="auto")
+    parser.add_argument("--model", default="tiny", help="faster-whisper model for --workload whisper")
+    parser.add_argument("--clip-seconds", type=float, default=4.0, help="Clip length for --workload whisper")
+    parser.add_argument("--out", default="", help="Write results JSON here")
+    parser.add_argument("--child", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args)))
+        return 0
+
+    workload = args.workload
+    if workload == "auto":
+        workload = "whisper" if _has_whisper() else "blas"
+    print(f"workload={workload} workers={args.workers} slots={args.slots} cores={thread_budget.usable_cores()}")
+    results = {}
+    for name in CONFIGS:
+        results[name] = r = run_config(name, args, workload)
+        print(f"{name:8s} {r['jobsPerS']:8.2f} jobs/s   p50 {r['p50S']}s   p95 {r['p95S']}s")
+    base = results["default"]["jobsPerS"]
+    if base:
+        print(f"throughput x{results['budget']['jobsPerS'] / base:.2f} with the budget")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"workload": workload, "workers": args.workers, "slots": args.slots,
+                       "cores": thread_budget.usable_cores(), "results": results}, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+# backend/coalesce.py
+"""
+Single-flight for upload endpoints: identical requests in flight share one run.
+- The key is the endpoint, a SHA-256 of the uploaded file, every form and query field
+  and the Authorization header, so only the same user's retry of the same clip with the
+  same settings matches.
+- The first request (leader) runs the view. Duplicates that arrive while it runs
+  (followers) wait for its result instead of starting inference:
+    JSON     the leader's body and status, once it has finished
+    SSE      the events the leader has sent so far, then the rest as they come
+  Followers get an X-Coalesced: 1 header. Nothing is cached: once the leader has
+  finished, the next identical request runs again.
+- Followers do not count as Whisper work for admission control (admission.detach).
+- If the leader's client goes away, the work is not cancelled while a stream follower is
+  still connected: the leader's request keeps running it and publishing to the
+  followers. A stream counts as complete only once a done or error event went out;
+  followers of a stream that ended without one get an error event with "retry": true.
+- If the leader raises before answering, followers run the view themselves.
+- A JSON follower holds a request thread while it waits, so the wait is capped at
+  COALESCE_WAIT_S (default 30) and at half of WEB_TIMEOUT (default 120); then it runs
+  the view itself. At most COALESCE_MAX_WAITING (default half of WEB_THREADS, at least
+  1) JSON followers wait at a time; further duplicates get 429 with Retry-After.
+COALESCE=0 turns coalescing off.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import admission
+import metrics
+import streaming
+
+_TERMINAL_EVENTS = ("event: done", "event: error")
+
+COALESCED = metrics.counter("coalesced_requests_total", "Duplicate requests served from an in-flight run.",
+                            ("endpoint",))
+ABANDONED = metrics.counter("coalesce_leader_aborted_total", "Runs that ended before followers got a result.",
+                            ("endpoint",))
+IN_FLIGHT = metrics.gauge("coalesce_flights", "Coalescible runs in flight.")
+TOO_MANY = metrics.counter("coalesce_followers_rejected_total", "Duplicates turned away while too many waited.",
+                           ("endpoint",))
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def wait_limit_s() -> float:
+    """How long a JSON follower may hold its request thread: well inside the worker timeout."""
+    return max(0.0, min(_env_float("COALESCE_WAIT_S", 30.0), _env_float("WEB_TIMEOUT", 120.0) / 2))
+
+
+def _terminal(chunk) -> bool:
+    text = chunk.decode("utf-8", "replace") if isinstance(chunk, (bytes, bytearray)) else str(chunk)
+    return text.lstrip().startswith(_TERMINAL_EVENTS)
+
+
+class Flight:
+    def __init__(self, key: str):
+        self.key = key
+        self.cond = threading.Condition()
+        self.kind: Optional[str] = None  # "json" | "stream" | "failed"
+        self.body: Optional[bytes] = None
+        self.status = 200
+        self.mimetype = "application/json"
+        self.chunks: List[Any] = []
+        self.done = False
+        self.complete = False
+        self.followers = 0
+        self.attached = 0  # stream followers still connected
+
+    def answer(self, body: bytes, status: int, mimetype: str):
+        with self.cond:
+            self.kind, self.body, self.status, self.mimetype = "json", body, status, mimetype
+            self.done = self.complete = True
+            self.cond.notify_all()
+
+    def fail(self):
+        with self.cond:
+            self.kind = "failed"
+            self.done = True
+            self.cond.notify_all()
+
+    def start_stream(self, mimetype: str):
+        with self.cond:
+            self.kind, self.mimetype = "stream", mimetype
+            self.cond.notify_all()
+
+    def publish(self, chunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def end_stream(self, complete: bool):
+        with self.cond:
+            if self.done:
+                return
+            self.done = True
+            self.complete = complete
+            self.cond.notify_all()
+
+    def attach(self) -> Callable[[], None]:
+        """Register a stream follower; returns its (idempotent) detach callback."""
+        with self.cond:
+            self.attached += 1
+        state = {"on": True}
+
+        def detach():
+            with self.cond:
+                if state["on"]:
+                    state["on"] = False
+                    self.attached -= 1
+
+        return detach
+
+    def live(self) -> bool:
+        """Someone other than the leader still waits for this stream."""
+        with self.cond:
+            return self.attached > 0
+
+    def replay(self, detach: Callable[[], None], token=None):
+        """Generator for a follower's SSE body: what was sent so far, then live events."""
+        sent = 0
+        try:
+            while True:
+                with self.cond:
+                    while not self.cond.wait_for(lambda: len(self.chunks) > sent or self.done,
+                                                 timeout=streaming.SOCKET_POLL_S):
+                        # the follower's client left: stop keeping the leader's work alive
+                        if token is not None and token.cancelled():
+                            return
+                    fresh = self.chunks[sent:]
+                    finished = self.done and sent + len(fresh) == len(self.chunks)
+                    complete = self.complete
+                for chunk in fresh:
+                    yield chunk
+                sent += len(fresh)
+                if finished:
+                    break
+            if not complete:
+                yield "event: error\ndata: " + json.dumps({"error": "coalesced_request_aborted", "retry": True}) + "\n\n"
+        finally:
+            detach()
+
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights: Dict[str, Flight] = {}
+        self.waiting = 0  # JSON followers holding a request thread
+        IN_FLIGHT.set_function(lambda: len(self.flights))
+
+    def join(self, key: str) -> Tuple[Flight, bool]:
+        """(flight, True) for the leader, (flight, False) for a duplicate."""
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                return flight, False
+            flight = self.flights[key] = Flight(key)
+            return flight, True
+
+    def forget(self, flight: Flight):
+        with self.lock:
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+
+
+FLIGHTS = SingleFlight()
+
+
+def request_key(req) -> Optional[str]:
+    f = req.files.get("file")
+    if f is None:
+        return None
+    h = hashlib.sha256()
+    stream = f.stream
+    pos = stream.tell()
+    for block in iter(lambda: stream.read(1 << 16), b""):
+        h.update(block)
+    stream.seek(pos)
+    params = {
+        "path": req.path,
+        "form": sorted((k, v) for k, v in req.form.items(multi=True)),
+        "args": sorted((k, v) for k, v in req.args.items(multi=True)),
+        "auth": hashlib.sha256(req.headers.get("Authorization", "").encode("utf-8")).hexdigest(),
+    }
+    h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _tee(flight: Flight, inner, endpoint: str):
+    """The leader's SSE body: each chunk goes to the client and to the followers."""
+    terminal = False
+    try:
+        for chunk in inner:
+            terminal = terminal or _terminal(chunk)
+            flight.publish(chunk)
+            yield chunk
+    finally:
+        try:
+            # the leader's client went away: finish the work for the followers still connected
+            while not terminal and flight.live():
+                try:
+                    chunk = next(inner)
+                except StopIteration:
+                    break
+                terminal = _terminal(chunk)
+                flight.publish(chunk)
+        except Exception:
+            logging.exception("coalesced stream failed after its leader left")
+        finally:
+            FLIGHTS.forget(flight)
+            if not terminal and flight.followers:
+                ABANDONED.inc(endpoint=endpoint)
+            # a stream that stopped without done or error (cancelled, say) is not complete
+            flight.end_stream(terminal)
+            close = getattr(inner, "close", None)
+            if close is not None:
+                close()
+
+
+def single_flight(view: Callable) -> Callable:
+    """Decorate an upload view (below the route decorator) to coalesce duplicates."""
+    from flask import Response, current_app, request
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if (os.environ.get("COALESCE") or "1").strip().lower() in ("0", "false", "no", "off"):
+            return view(*args, **kwargs)
+        key = request_key(request)
+        if key is None:
+            return view(*args, **kwargs)
+        endpoint = request.url_rule.rule if request.url_rule is not None else request.path
+        flight, leader = FLIGHTS.join(key)
+
+        if not leader:
+            # no Whisper work of its own unless it has to run the view below
+            admission.detach()
+            with flight.cond:
+                started = flight.done or flight.kind == "stream"
+            if not started:
+                limit = max(1, _env_int("COALESCE_MAX_WAITING", _env_int("WEB_THREADS", 4) // 2))
+                with FLIGHTS.lock:
+                    admitted = FLIGHTS.waiting < limit
+                    if admitted:
+                        FLIGHTS.waiting += 1
+                if not admitted:
+                    TOO_MANY.inc(endpoint=endpoint)
+                    retry = max(1, math.ceil(wait_limit_s() / 4))
+                    resp = Response(json.dumps({"error": "duplicate_in_flight", "retryAfterS": retry}), status=429,
+                                    mimetype="application/json")
+                    resp.headers["Retry-After"] = str(retry)
+                    return resp
+                try:
+                    # a stream can be joined as soon as it starts; a JSON answer once it is done
+                    with flight.cond:
+                        flight.cond.wait_for(lambda: flight.done or flight.kind == "stream", timeout=wait_limit_s())
+                finally:
+                    with FLIGHTS.lock:
+                        FLIGHTS.waiting -= 1
+            with flight.cond:
+                ready = flight.done or flight.kind == "stream"
+                kind = flight.kind
+            if not ready or kind == "failed":
+                admission.attach()
+                return view(*args, **kwargs)
+            COALESCED.inc(endpoint=endpoint)
+            if kind == "json":
+                resp = Response(flight.body, status=flight.status, mimetype=flight.mimetype)
+            else:
+                detach = flight.attach()
+                resp = Response(flight.replay(detach, streaming.cancel_token()), mimetype=flight.mimetype,
+                                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+                # a body closed before its first chunk never runs replay's finally
+                resp.call_on_close(detach)
+            resp.headers["X-Coalesced"] = "1"
+            return resp
+
+        try:
+            resp = current_app.make_response(view(*args, **kwargs))
+        except BaseException:
+            FLIGHTS.forget(flight)
+            flight.fail()
+            raise
+        if resp.is_streamed:
+            token = request.environ.get(streaming.CANCEL_KEY)
+            if token is not None:
+                # the leader's client leaving must not cancel work its followers wait for
+                token.keepalive = flight.live
+            flight.start_stream(resp.mimetype)
+            resp.response = _tee(flight, resp.response, endpoint)
+            # a body closed before its first chunk never runs _tee's finally
+            resp.call_on_close(lambda: (FLIGHTS.forget(flight), flight.end_stream(False)))
+        else:
+            FLIGHTS.forget(flight)
+            flight.answer(resp.get_data(), resp.status_code, resp.mimetype)
+        return resp
+
+    return wrapper
@@ -0,0 +1,255 @@
+# backend/compute.py
+"""
+Slots for the shared Whisper model.
+- A worker's WhisperModel decodes as many requests at once as it has CTranslate2 workers
+  (num_workers = slots, see thread_budget.py); requests beyond that used to queue
+  invisibly inside CTranslate2. They now wait for a slot here, which makes the queue
+  measurable: queue_depth / queue_active / queue_wait_seconds with queue="transcribe"
+  on /metrics.
+- WHISPER_CONCURRENCY sets the number of slots (default 1).
+- slot(trace, cancel) gives up waiting with Cancelled once cancel.cancelled() is true
+  (a streaming client that went away), checked every CANCEL_POLL_S.
+- Each queue keeps a moving average of how long a job holds a slot (service_s) and
+  estimates the wait a new job would see from it (estimated_wait); overload.py reads both.
+- submit() is the async server's way in (see streaming.py): the job runs on a pool, so
+  streams queued behind a busy model do not hold a thread. A submitted job that enters
+  slot() gives its slot back when that block ends, as under WSGI, so scoring and accent
+  detection after transcription neither hold up the next job nor count in service_s.
+  The pool has two threads per slot for those tails.
+- Waiting jobs are not served in arrival order but shortest first. A job's cost is its
+  work (audio seconds scaled for model size and beam, see whisper_registry.job_work)
+  times the seconds per unit of work measured on finished jobs. Each second a job waits
+  takes SJF_AGING (default 1.0) seconds off its cost, so a long recording is passed by
+  short drills for at most about its own length. priority="batch" jobs (re-scoring)
+  start SJF_BATCH_PENALTY_S (default 30) behind interactive ones. SJF=0 restores FIFO.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional
+
+import metrics
+import tracing
+
+CANCEL_POLL_S = 0.25
+# weight of the newest job in the service-time average
+SERVICE_EWMA_ALPHA = 0.2
+
+
+QUEUE_WAIT_BY_PRIORITY = metrics.histogram("queue_wait_by_priority_seconds",
+                                           "Time spent waiting for a slot, by job priority.", ("queue", "priority"))
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class Cancelled(Exception):
+    """The work was abandoned while waiting for a slot."""
+
+
+class _Waiter:
+    __slots__ = ("work", "cost", "priority", "seq", "t0", "started", "granted", "on_grant", "released")
+
+    def __init__(self, work: Optional[float], cost: float, priority: str, seq: int,
+                 on_grant: Optional[Callable[["_Waiter"], Any]] = None):
+        self.work = work
+        self.cost = cost
+        self.priority = priority
+        self.seq = seq
+        self.t0 = time.perf_counter()
+        self.started = self.t0
+        self.granted = threading.Event()
+        self.on_grant = on_grant
+        self.released = False
+
+
+class SlotQueue:
+    def __init__(self, name: str, slots: int):
+        self.name = name
+        self.slots = max(1, int(slots))
+        self.free = self.slots
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.jobs: List[_Waiter] = []
+        self.seq = 0
+        self.waiting = 0
+        self.active = 0
+        self.service_s: Optional[float] = None
+        self.rate: Optional[float] = None  # seconds per unit of work
+        self.sjf = (os.environ.get("SJF") or "1").strip().lower() not in ("0", "false", "no", "off")
+        self.aging = max(0.0, _env_float("SJF_AGING", 1.0))
+        self.batch_penalty_s = max(0.0, _env_float("SJF_BATCH_PENALTY_S", 30.0))
+        self.pool: Optional[ThreadPoolExecutor] = None
+        metrics.QUEUE_DEPTH.set_function(lambda: self.waiting, queue=name)
+        metrics.QUEUE_ACTIVE.set_function(lambda: self.active, queue=name)
+
+    # ---------- scheduling ----------
+
+    def cost_s(self, work: Optional[float]) -> float:
+        """Expected seconds in a slot for a job of `work` units; the average job when unknown."""
+        if work is None:
+            return self.service_s or 0.0
+        return work * (self.rate if self.rate is not None else 1.0)
+
+    def _key(self, w: _Waiter, now: float):
+        if not self.sjf:
+            return (0.0, w.seq)
+        penalty = self.batch_penalty_s if w.priority == "batch" else 0.0
+        return (w.cost + penalty - self.aging * (now - w.t0), w.seq)
+
+    def _enqueue(self, work: Optional[float], priority: str, on_grant=None) -> _Waiter:
+        with self.lock:
+            self.seq += 1
+            w = _Waiter(None if work is None else float(work), self.cost_s(work), priority, self.seq, on_grant)
+            self.jobs.append(w)
+            self.waiting = len(self.jobs)
+            granted = self._dispatch()
+        self._notify(granted)
+        return w
+
+    def _dispatch(self) -> List[_Waiter]:
+        """Hand free slots to the cheapest waiting jobs. Caller holds self.lock."""
+        granted = []
+        now = time.perf_counter()
+        while self.free > 0 and self.jobs:
+            best = min(self.jobs, key=lambda w: self._key(w, now))
+            self.jobs.remove(best)
+            self.free -= 1
+            self.active += 1
+            granted.append(best)
+        self.waiting = len(self.jobs)
+        return granted
+
+    def _notify(self, granted: List[_Waiter]):
+        for w in granted:
+            waited = time.perf_counter() - w.t0
+            metrics.QUEUE_WAIT.observe(waited, queue=self.name)
+            QUEUE_WAIT_BY_PRIORITY.observe(waited, queue=self.name, priority=w.priority)
+            w.granted.set()
+            if w.on_grant is not None:
+                w.on_grant(w)
+
+    def _withdraw(self, w: _Waiter) -> bool:
+        """Take a job that gave up out of the queue; False when it already got a slot."""
+        with self.lock:
+            if w in self.jobs:
+                self.jobs.remove(w)
+                self.waiting = len(self.jobs)
+                return True
+        return False
+
+    def _acquire(self, trace=None, cancel=None, work=None, priority="interactive"):
+        w = self._enqueue(work, priority)
+        if cancel is None:
+            w.granted.wait()
+        else:
+            while not w.granted.wait(timeout=CANCEL_POLL_S):
+                if cancel.cancelled():
+                    if self._withdraw(w):
+                        raise Cancelled()
+                    # granted meanwhile: give the slot straight back
+                    w.granted.wait()
+                    self._release(w, count=False)
+                    raise Cancelled()
+        tracing.record(f"{self.name}_wait", time.perf_counter() - w.t0, trace)
+        return w
+
+    def _release(self, w: _Waiter, count: bool = True):
+        with self.lock:
+            w.released = True
+            self.active -= 1
+            self.free += 1
+            if count:
+                held = time.perf_counter() - w.started
+                prev = self.service_s
+                self.service_s = held if prev is None else prev + SERVICE_EWMA_ALPHA * (held - prev)
+                if w.work:
+                    per_unit = held / w.work
+                    prev = self.rate
+                    self.rate = per_unit if prev is None else prev + SERVICE_EWMA_ALPHA * (per_unit - prev)
+            granted = self._dispatch()
+        self._notify(granted)
+
+    def estimated_wait(self) -> float:
+        """Seconds a job arriving now would wait for a slot, from the service-time average."""
+        with self.lock:
+            ahead = self.waiting + self.active - self.slots + 1
+            service = self.service_s or 0.0
+        return max(0, ahead) * service / self.slots
+
+    @contextmanager
+    def slot(self, trace=None, cancel=None, work: Optional[float] = None, priority: str = "interactive"):
+        """
+        Wait for a free slot and hold it for the duration of the block. work is the job's
+        size for shortest-first ordering (None: an average job).
+        """
+        if getattr(self.local, "held", False):
+            # already inside submit(): the job holds this thread's slot until the block ends
+            job = getattr(self.local, "job", None)
+            try:
+                yield
+            finally:
+                if job is not None and not job.released:
+                    self.local.held = False
+                    self.local.job = None
+                    self._release(job)
+            return
+        w = self._acquire(trace, cancel, work, priority)
+        w.started = time.perf_counter()
+        self.local.held = True
+        try:
+            yield
+        finally:
+            self.local.held = False
+            self._release(w)
+
+    def submit(self, fn: Callable[[], Any], trace=None, work: Optional[float] = None,
+               priority: str = "interactive") -> Future:
+        """
+        Run fn() on this queue's pool (two threads per slot) while holding a slot.
+        Jobs waiting for a slot sit in the scheduler rather than on a thread of their own;
+        cancelling the returned future before it starts takes the job out of the queue.
+        """
+        with self.lock:
+            if self.pool is None:
+                # jobs leave their slot before they finish (see slot()), so the tails need threads too
+                self.pool = ThreadPoolExecutor(max_workers=2 * self.slots, thread_name_prefix=f"{self.name}-pool")
+        future: Future = Future()
+
+        def run(w: _Waiter):
+            w.started = time.perf_counter()
+            if not future.set_running_or_notify_cancel():
+                self._release(w, count=False)
+                return
+            tracing.record(f"{self.name}_wait", w.started - w.t0, trace)
+            self.local.held = True
+            self.local.job = w
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                self.local.held = False
+                self.local.job = None
+                if not w.released:
+                    self._release(w)
+
+        w = self._enqueue(work, priority, on_grant=lambda granted: self.pool.submit(run, granted))
+        # a job cancelled while still queued leaves the queue; after its grant, run() hands the slot back
+        future.add_done_callback(lambda f: f.cancelled() and self._withdraw(w))
+        return future
+
+
+def init_transcribe_queue() -> SlotQueue:
+    try:
+        slots = int(os.environ.get("WHISPER_CONCURRENCY", "1"))
+    except ValueError:
+        slots = 1
+    return SlotQueue("transcribe", slots)
@@ -2,12 +2,17 @@
 import json
 import logging
 import os
+import threading
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 DEFAULT_LEVEL = "b1"
 DEFAULT_MODEL = "gpt-4o-mini"
 
+# one client per process so keep-alive connections are reused across requests
+_client = None
+_client_lock = threading.Lock()
+
 
 def _safe_list(val: Any) -> List[Any]:
     if not val:
@@ -105,26 +110,69 @@ def _build_mock_plan(params: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def _call_openai(params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    """Call OpenAI if configured; return parsed JSON plan or None on failure."""
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not api_key:
-        return None
+def _env_float(name: str, default: float) -> float:
     try:
-        from openai import OpenAI
-    except Exception as e:
-        logging.warning("openai import failed: %s", e)
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _get_client():
+    """
+    Return the process-wide OpenAI client, creating it on first use.
+    Pool size and timeouts come from OPENAI_MAX_CONNECTIONS, OPENAI_TIMEOUT and
+    OPENAI_CONNECT_TIMEOUT. OPENAI_BASE_URL is honoured by the SDK (used by the stub server).
+    """
+    global _client
+    if not os.environ.get("OPENAI_API_KEY"):
         return None
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is not None:
+            return _client
+        try:
+            import httpx
+            from openai import OpenAI
+        except Exception as e:
+            logging.warning("openai import failed: %s", e)
+            return None
+
+        timeout = httpx.Timeout(
+            _env_float("OPENAI_TIMEOUT", 30.0),
+            connect=_env_float("OPENAI_CONNECT_TIMEOUT", 5.0),
+        )
+        max_conn = _env_int("OPENAI_MAX_CONNECTIONS", 20)
+        limits = httpx.Limits(
+            max_connections=max_conn,
+            max_keepalive_connections=max(1, max_conn // 2),
+            keepalive_expiry=_env_float("OPENAI_KEEPALIVE_S", 60.0),
+        )
+        _client = OpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            timeout=timeout,
+            max_retries=_env_int("OPENAI_MAX_RETRIES", 1),
+            http_client=httpx.Client(timeout=timeout, limits=limits),
+        )
+        logging.info("openai client ready (max_connections=%s)", max_conn)
+        return _client
 
-    client = OpenAI(api_key=api_key)
-    model = os.environ.get("LESSON_MODEL", DEFAULT_MODEL)
 
-    messages = [
+def _build_messages(params: Dict[str, Any]) -> List[Dict[str, str]]:
+    return [
         {
             "role": "system",
             "content": (
                 "You are a concise ESL pronunciation coach. "
                 "Return strict JSON with a lesson plan for one focused session. "
+                "Put the sections array first, starting with the warm-up. "
                 "Keep text short and actionable; avoid markdown and line breaks in values."
             ),
         },
@@ -143,26 +191,139 @@ def _call_openai(params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         },
     ]
 
+
+def _finish_llm_plan(data: Dict[str, Any], model: str) -> Dict[str, Any]:
+    data["source"] = "openai"
+    data["model"] = model
+    if "generatedAt" not in data:
+        data["generatedAt"] = datetime.utcnow().isoformat() + "Z"
+    return data
+
+
+def _call_openai(params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Call OpenAI if configured; return parsed JSON plan or None on failure."""
+    client = _get_client()
+    if client is None:
+        return None
+    model = os.environ.get("LESSON_MODEL", DEFAULT_MODEL)
+
     try:
         resp = client.chat.completions.create(
             model=model,
-            messages=messages,
+            messages=_build_messages(params),
             response_format={"type": "json_object"},
             max_tokens=900,
             temperature=0.6,
         )
         content = resp.choices[0].message.content
-        data = json.loads(content)
-        data["source"] = "openai"
-        data["model"] = model
-        if "generatedAt" not in data:
-            data["generatedAt"] = datetime.utcnow().isoformat() + "Z"
-        return data
+        return _finish_llm_plan(json.loads(content), model)
     except Exception as e:
         logging.warning("openai lesson generation failed: %s", e)
         return None
 
 
+class _SectionScanner:
+    """
+    Incremental scanner over a streamed JSON plan.
+    Returns each object of the top-level "sections" array as soon as its closing brace arrives.
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_str = False
+        self.escape = False
+        self.str_start = 0
+        self.last_str = None
+        self.want_array = False
+        self.array_depth = None
+        self.item_start = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.buf += chunk or ""
+        found = []
+        while self.pos < len(self.buf):
+            i = self.pos
+            ch = self.buf[i]
+            self.pos += 1
+            if self.in_str:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_str = False
+                    self.last_str = self.buf[self.str_start + 1:i]
+                continue
+            if ch == '"':
+                self.in_str = True
+                self.str_start = i
+            elif ch == ":":
+                self.want_array = self.depth == 1 and self.last_str == "sections"
+            elif ch == "[":
+                self.depth += 1
+                if self.want_array:
+                    self.array_depth = self.depth
+                    self.want_array = False
+            elif ch == "{":
+                self.depth += 1
+                if self.array_depth is not None and self.depth == self.array_depth + 1:
+                    self.item_start = i
+            elif ch == "}":
+                if self.item_start is not None and self.depth == self.array_depth + 1:
+                    try:
+                        item = json.loads(self.buf[self.item_start:i + 1])
+                        if isinstance(item, dict):
+                            found.append(item)
+                    except ValueError:
+                        pass
+                    self.item_start = None
+                self.depth -= 1
+            elif ch == "]":
+                if self.array_depth is not None and self.depth == self.array_depth:
+                    self.array_depth = None
+                self.depth -= 1
+            elif not ch.isspace():
+                self.want_array = False
+        return found
+
+
+def _stream_openai(params: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream a plan from OpenAI. Yields ("section", section) while tokens arrive and
+    finally ("plan", plan). Raises on transport or parse failure.
+    """
+    client = _get_client()
+    if client is None:
+        raise RuntimeError("openai not configured")
+    model = os.environ.get("LESSON_MODEL", DEFAULT_MODEL)
+
+    stream = client.chat.completions.create(
+        model=model,
+        messages=_build_messages(params),
+        response_format={"type": "json_object"},
+        max_tokens=900,
+        temperature=0.6,
+        stream=True,
+    )
+    scanner = _SectionScanner()
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            for section in scanner.feed(delta):
+                yield "section", section
+    finally:
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+    yield "plan", _finish_llm_plan(json.loads(scanner.buf), model)
+
+
 def _normalize_plan(plan: Dict[str, Any], params: Dict[str, Any], used_llm: bool) -> Dict[str, Any]:
     """Ensure required fields exist and types are sane for the frontend."""
     out = dict(plan or {})
@@ -198,3 +359,38 @@ def generate_lesson_plan(params: Dict[str, Any]) -> Dict[str, Any]:
         plan = _build_mock_plan(params)
     normalized = _normalize_plan(plan, params, used_llm)
     return {"ok": True, "plan": normalized, "using_llm": used_llm}
+
+
+def stream_lesson_plan(params: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of generate_lesson_plan.
+    Yields ("section", {"index", "section"}) as each section parses, then ("done", result)
+    where result has the same shape as generate_lesson_plan's return value.
+    A ("reset", ...) event means sections sent so far should be discarded.
+    """
+    sent = 0
+    plan = None
+    if _get_client() is not None:
+        try:
+            for kind, data in _stream_openai(params):
+                if kind == "section":
+                    yield "section", {"index": sent, "section": data}
+                    sent += 1
+                else:
+                    plan = data
+        except Exception as e:
+            logging.warning("openai lesson stream failed: %s", e)
+            plan = None
+
+    used_llm = plan is not None
+    if plan is None:
+        plan = _build_mock_plan(params)
+        if sent:
+            # partial LLM sections are superseded by the fallback plan
+            yield "reset", {"reason": "llm_failed"}
+            sent = 0
+    normalized = _normalize_plan(plan, params, used_llm)
+    # mock plans (or an LLM reply without a parsable sections array) still go out section by section
+    for idx in range(sent, len(normalized["sections"])):
+        yield "section", {"index": idx, "section": normalized["sections"][idx]}
+    yield "done", {"ok": True, "plan": normalized, "using_llm": used_llm}
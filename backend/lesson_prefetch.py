@@ -0,0 +1,242 @@
+# backend/lesson_prefetch.py
+"""
+Background lesson prefetch.
+- /api/attempts calls schedule(uid); bursts of attempts are debounced into one job.
+- The job rebuilds the user's next lesson from their latest hardWords, reusing the
+  goal/topic/level/tone of their last lesson request, and stores it.
+- /api/lessons/generate calls take(uid, params) and serves the stored plan when the
+  params still match.
+Enable with LESSON_PREFETCH=1; LESSON_PREFETCH_DEBOUNCE_S sets the quiet period.
+Plans are kept in memory and, when Firestore is configured, in lessonPrefetch/{uid}.
+Firestore writes go through the prefetch pool, so a lesson request never waits for one.
+take() only reads Firestore on a memory miss for a uid this process has scheduled a
+prefetch for. With several workers and no sticky routing, LESSON_PREFETCH_SHARED=1
+makes every miss read it, so any worker can serve a plan another one built.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+import tracing
+
+COLLECTION = "lessonPrefetch"
+RECENT_ATTEMPTS = 50
+MAX_WEAK_WORDS = 6
+
+
+def params_key(params: Dict[str, Any]) -> str:
+    """Stable hash of the lesson params that affect the generated plan."""
+    words = sorted({str(w).strip().lower() for w in params.get("weakWords") or [] if str(w).strip()})
+    pron = [str(p).strip() for p in params.get("weakPronunciation") or [] if str(p).strip()]
+    body = {
+        "goal": (params.get("goal") or "").strip().lower(),
+        "topic": (params.get("topic") or "").strip().lower(),
+        "level": (params.get("level") or "").strip().lower(),
+        "durationMinutes": int(params.get("durationMinutes") or 0),
+        "tone": (params.get("tone") or "").strip().lower(),
+        "weakWords": words,
+        "weakPronunciation": pron,
+    }
+    raw = json.dumps(body, sort_keys=True, ensure_ascii=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def weak_words_from_attempts(rows: List[Dict[str, Any]]) -> List[str]:
+    """Same selection as the Learn page: most frequent hard words, then recent ones."""
+    counts: Dict[str, int] = {}
+    for r in rows:
+        for w in r.get("hardWords") or []:
+            if w:
+                counts[w] = counts.get(w, 0) + 1
+    hardest = [w for w, _ in sorted(counts.items(), key=lambda x: x[1], reverse=True)[:10]]
+    merged = hardest + [w for r in rows for w in (r.get("hardWords") or [])]
+    out = []
+    for w in merged:
+        w = str(w or "").strip()
+        if w and w not in out:
+            out.append(w)
+    return out[:MAX_WEAK_WORDS]
+
+
+def pronunciation_targets(words: List[str]) -> List[str]:
+    """Mirror of the Learn page's generated pronunciation targets."""
+    if len(words) < 2:
+        return []
+    return [
+        f"I need to practise the words {' and '.join(words[:2])} today.",
+        f"Please repeat after me: {', '.join(words[:3])}.",
+    ]
+
+
+class LessonPrefetcher:
+    def __init__(self, db, generate: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 debounce_s: Optional[float] = None, workers: int = 2):
+        self.db = db
+        self.generate = generate
+        if debounce_s is None:
+            debounce_s = float(os.environ.get("LESSON_PREFETCH_DEBOUNCE_S", "20"))
+        self.debounce_s = max(0.0, debounce_s)
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="lesson-prefetch")
+        self.lock = threading.Lock()
+        self.timers: Dict[str, threading.Timer] = {}
+        self.running: set = set()
+        self.rerun: set = set()
+        self.requests: Dict[str, Dict[str, Any]] = {}
+        self.plans: Dict[str, Dict[str, Any]] = {}
+        # uids with a prefetch scheduled here that take() has not consumed yet
+        self.known: set = set()
+        self.shared = (os.environ.get("LESSON_PREFETCH_SHARED") or "").strip().lower() in ("1", "true", "yes", "on")
+
+    # ---------- request side ----------
+
+    def remember_request(self, uid: str, params: Dict[str, Any]):
+        """Keep the user's latest lesson params as the template for future prefetches."""
+        base = {k: v for k, v in params.items() if k not in ("weakWords", "weakPronunciation")}
+        base["withPronunciation"] = bool(params.get("weakPronunciation"))
+        with self.lock:
+            self.requests[uid] = base
+        self._write_later(uid, {"request": base})
+
+    def take(self, uid: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return and consume the prefetched result if it was built for these params."""
+        key = params_key(params)
+        with self.lock:
+            entry = self.plans.get(uid)
+            if entry and entry.get("key") == key:
+                self.plans.pop(uid, None)
+                hit = entry
+            else:
+                hit = None
+            # a plan in memory for other params is the latest one; Firestore has nothing newer
+            look_up = hit is None and entry is None and (self.shared or uid in self.known)
+            self.known.discard(uid)
+        if hit is None:
+            doc = self._read(uid) if look_up else None
+            entry = (doc or {}).get("prefetched")
+            if not entry or entry.get("key") != key:
+                metrics.cache_lookup("lesson_prefetch", False)
+                return None
+            hit = entry
+        metrics.cache_lookup("lesson_prefetch", True)
+        self._write_later(uid, {"prefetched": None})
+        result = dict(hit.get("result") or {})
+        result["prefetched"] = True
+        return result
+
+    # ---------- attempt side ----------
+
+    def schedule(self, uid: str):
+        """Debounce: (re)start the uid's timer so a burst of attempts yields one job."""
+        with self.lock:
+            old = self.timers.pop(uid, None)
+            if old is not None:
+                old.cancel()
+            t = threading.Timer(self.debounce_s, self._fire, args=(uid,))
+            t.daemon = True
+            self.timers[uid] = t
+            self.known.add(uid)
+        t.start()
+
+    def _fire(self, uid: str):
+        with self.lock:
+            self.timers.pop(uid, None)
+            if uid in self.running:
+                # a job is mid-flight; run once more after it so newer attempts are included
+                self.rerun.add(uid)
+                return
+            self.running.add(uid)
+        self.pool.submit(self._run, uid)
+
+    def _run(self, uid: str):
+        try:
+            self._prefetch(uid)
+        except Exception:
+            logging.exception("lesson prefetch failed uid=%s", uid)
+        finally:
+            with self.lock:
+                self.running.discard(uid)
+                again = uid in self.rerun
+                self.rerun.discard(uid)
+            if again:
+                self.schedule(uid)
+
+    def _prefetch(self, uid: str):
+        with self.lock:
+            base = self.requests.get(uid)
+        if base is None:
+            base = (self._read(uid) or {}).get("request")
+        if not base or not base.get("goal"):
+            logging.info("lesson prefetch skipped uid=%s: no previous lesson request", uid)
+            return
+
+        words = weak_words_from_attempts(self._recent_attempts(uid))
+        params = {k: v for k, v in base.items() if k != "withPronunciation"}
+        params["weakWords"] = words
+        params["weakPronunciation"] = pronunciation_targets(words) if base.get("withPronunciation") else []
+
+        t0 = time.perf_counter()
+        with tracing.span("lesson"):
+            result = self.generate(params)
+        entry = {
+            "key": params_key(params),
+            "params": params,
+            "result": result,
+            "builtAt": time.time(),
+        }
+        with self.lock:
+            self.plans[uid] = entry
+        self._write(uid, {"prefetched": entry})
+        logging.info("lesson prefetched uid=%s words=%s ms=%.1f", uid, words,
+                     (time.perf_counter() - t0) * 1000.0)
+
+    # ---------- storage ----------
+
+    def _recent_attempts(self, uid: str) -> List[Dict[str, Any]]:
+        if self.db is None:
+            return []
+        from firebase_admin import firestore
+        q = (self.db.collection("attempts")
+             .where("uid", "==", uid)
+             .order_by("createdAt", direction=firestore.Query.DESCENDING)
+             .limit(RECENT_ATTEMPTS))
+        return [d.to_dict() or {} for d in q.stream()]
+
+    def _read(self, uid: str) -> Optional[Dict[str, Any]]:
+        if self.db is None:
+            return None
+        try:
+            with tracing.span("firestore_read"):
+                snap = self.db.collection(COLLECTION).document(uid).get()
+            return snap.to_dict() if snap.exists else None
+        except Exception as e:
+            logging.warning("lesson prefetch read failed: %s", e)
+            return None
+
+    def _write_later(self, uid: str, fields: Dict[str, Any]):
+        """Queue a write on the prefetch pool; the request goes on without it."""
+        if self.db is None:
+            return
+        self.pool.submit(self._write, uid, fields)
+
+    def _write(self, uid: str, fields: Dict[str, Any]):
+        if self.db is None:
+            return
+        try:
+            with tracing.span("firestore_write"):
+                self.db.collection(COLLECTION).document(uid).set(fields, merge=True)
+        except Exception as e:
+            logging.warning("lesson prefetch write failed: %s", e)
+
+
+def init_prefetcher(db, generate) -> Optional[LessonPrefetcher]:
+    if (os.environ.get("LESSON_PREFETCH") or "").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    logging.info("lesson prefetch enabled")
+    return LessonPrefetcher(db, generate)
@@ -0,0 +1,241 @@
+# backend/memwatch.py
+"""
+Optional tracemalloc instrumentation (MEMWATCH=1).
+- Per endpoint: peak traced allocation above the level at request start, and the bytes
+  still held when the request finished. tracemalloc's peak is process-wide, so a request
+  only counts when no other request overlapped it ("exclusive"); the rest are counted.
+- Top allocation sites and growth since a baseline snapshot are served on
+  GET /api/admin/memory (see admin.py).
+- Leak check: after every MEMWATCH_WINDOW requests (default 200) the traced total is
+  sampled at the next quiet moment (no request in flight). When it grew across
+  MEMWATCH_WINDOWS consecutive samples (default 3) by more than MEMWATCH_GROWTH_MB in
+  total (default 20), a warning with the fastest-growing sites is logged and
+  memory_growth_warnings_total is incremented.
+MEMWATCH_FRAMES (default 10) sets the traceback depth tracemalloc keeps; tracing costs
+CPU and memory, so leave it off unless you are looking for something.
+"""
+
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+import metrics
+
+MB = 1024 * 1024
+
+TRACED_BYTES = metrics.gauge("process_traced_memory_bytes", "Bytes currently traced by tracemalloc.")
+RSS_BYTES = metrics.gauge("process_resident_memory_bytes", "Resident set size of this process.")
+REQUEST_PEAK = metrics.histogram("request_memory_peak_bytes", "Peak traced allocation per exclusive request.",
+                                 ("endpoint",), buckets=tuple(float(2 ** i * 64 * 1024) for i in range(14)))
+GROWTH_WARNINGS = metrics.counter("memory_growth_warnings_total", "Steady-state memory growth warnings.")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+    except Exception:
+        return None
+
+
+def _site(stat) -> Dict[str, Any]:
+    frame = stat.traceback[0]
+    return {
+        "file": frame.filename,
+        "line": frame.lineno,
+        "sizeBytes": stat.size,
+        "count": stat.count,
+        "traceback": [f"{f.filename}:{f.lineno}" for f in stat.traceback],
+    }
+
+
+def _growth(stat) -> Dict[str, Any]:
+    out = _site(stat)
+    out["sizeDiffBytes"] = stat.size_diff
+    out["countDiff"] = stat.count_diff
+    return out
+
+
+_IGNORE = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_IGNORE)
+
+
+class MemWatch:
+    def __init__(self):
+        self.window = max(1, _env_int("MEMWATCH_WINDOW", 200))
+        self.windows = max(2, _env_int("MEMWATCH_WINDOWS", 3))
+        self.growth_bytes = max(1, _env_int("MEMWATCH_GROWTH_MB", 20)) * MB
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.generation = 0
+        self.requests = 0
+        self.due = False
+        self.samples: List[Dict[str, Any]] = []  # quiet-point levels, oldest first
+        self.baseline = None
+        self.baseline_at = None
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, _env_int("MEMWATCH_FRAMES", 10)))
+        TRACED_BYTES.set_function(lambda: tracemalloc.get_traced_memory()[0])
+
+    # ---------- per request ----------
+
+    def begin(self) -> Dict[str, Any]:
+        with self.lock:
+            self.in_flight += 1
+            self.generation += 1
+            alone = self.in_flight == 1
+            if alone:
+                tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            return {"generation": self.generation, "alone": alone, "start": current}
+
+    def end(self, endpoint: str, token: Dict[str, Any]):
+        check = None
+        with self.lock:
+            self.in_flight -= 1
+            current, peak = tracemalloc.get_traced_memory()
+            exclusive = token["alone"] and self.generation == token["generation"]
+            st = self.endpoints.setdefault(endpoint, {
+                "requests": 0, "exclusive": 0, "peakMaxBytes": 0, "peakSumBytes": 0,
+                "peakLastBytes": None, "retainedSumBytes": 0,
+            })
+            st["requests"] += 1
+            if exclusive:
+                req_peak = max(0, peak - token["start"])
+                st["exclusive"] += 1
+                st["peakMaxBytes"] = max(st["peakMaxBytes"], req_peak)
+                st["peakSumBytes"] += req_peak
+                st["peakLastBytes"] = req_peak
+                st["retainedSumBytes"] += current - token["start"]
+                REQUEST_PEAK.observe(req_peak, endpoint=endpoint)
+
+            self.requests += 1
+            if self.requests % self.window == 0:
+                self.due = True
+            if self.due and self.in_flight == 0:
+                self.due = False
+                check = current
+        if check is not None:
+            self._sample(check)
+
+    # ---------- leak check ----------
+
+    def _sample(self, traced: int):
+        snap = snapshot()
+        rss = rss_bytes()
+        with self.lock:
+            self.samples.append({"at": time.time(), "requests": self.requests, "tracedBytes": traced,
+                                 "rssBytes": rss, "snapshot": snap})
+            self.samples = self.samples[-self.windows:]
+            samples = list(self.samples)
+        if len(samples) < self.windows:
+            return
+        levels = [s["tracedBytes"] for s in samples]
+        rising = all(b > a for a, b in zip(levels, levels[1:]))
+        grown = levels[-1] - levels[0]
+        if rising and grown >= self.growth_bytes:
+            top = snap.compare_to(samples[0]["snapshot"], "lineno")[:5] if samples[0]["snapshot"] else []
+            GROWTH_WARNINGS.inc()
+            logging.warning(
+                "memory grew %.1f MB over %d requests (traced %s MB, rss %s MB); top growth: %s",
+                grown / MB, samples[-1]["requests"] - samples[0]["requests"],
+                " -> ".join(f"{v / MB:.1f}" for v in levels),
+                f"{rss / MB:.1f}" if rss else "?",
+                "; ".join(f"{s.traceback[0].filename}:{s.traceback[0].lineno} +{s.size_diff / 1024:.0f} KiB"
+                          for s in top),
+            )
+
+    # ---------- admin view ----------
+
+    def set_baseline(self):
+        snap = snapshot()
+        with self.lock:
+            self.baseline = snap
+            self.baseline_at = time.time()
+
+    def report(self, top: int = 20, group: str = "lineno") -> Dict[str, Any]:
+        group = group if group in ("lineno", "filename", "traceback") else "lineno"
+        current, peak = tracemalloc.get_traced_memory()
+        snap = snapshot()
+        with self.lock:
+            endpoints = {}
+            for name, st in self.endpoints.items():
+                row = {k: v for k, v in st.items() if k not in ("peakSumBytes", "retainedSumBytes")}
+                n = st["exclusive"]
+                row["peakMeanBytes"] = round(st["peakSumBytes"] / n) if n else None
+                row["retainedMeanBytes"] = round(st["retainedSumBytes"] / n) if n else None
+                endpoints[name] = row
+            baseline, baseline_at = self.baseline, self.baseline_at
+            samples = [{k: v for k, v in s.items() if k != "snapshot"} for s in self.samples]
+            requests = self.requests
+        out = {
+            "enabled": True,
+            "tracedBytes": current,
+            "tracedPeakBytes": peak,
+            "rssBytes": rss_bytes(),
+            "requests": requests,
+            "endpoints": endpoints,
+            "topSites": [_site(s) for s in snap.statistics(group)[:top]],
+            "steadyState": samples,
+        }
+        if baseline is not None:
+            out["baselineAt"] = baseline_at
+            out["growthSinceBaseline"] = [_growth(s) for s in snap.compare_to(baseline, group)[:top]]
+        return out
+
+
+def init_memwatch(app) -> Optional[MemWatch]:
+    RSS_BYTES.set_function(lambda: rss_bytes() or 0)
+    if (os.environ.get("MEMWATCH") or "").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    from flask import g, request
+
+    watch = MemWatch()
+    watch.set_baseline()
+    logging.info("memwatch enabled: window=%d windows=%d growth=%d MB", watch.window, watch.windows,
+                 watch.growth_bytes // MB)
+
+    @app.before_request
+    def _mem_start():
+        if request.path.startswith("/api/admin") or request.path == "/metrics":
+            return
+        g.mem_token = watch.begin()
+
+    @app.after_request
+    def _mem_finish(response):
+        token = g.pop("mem_token", None)
+        if token is None:
+            return response
+        rule = request.url_rule
+        endpoint = rule.rule if rule is not None else "unmatched"
+        # after the body is sent, so SSE generators and their buffers are included
+        response.call_on_close(lambda: watch.end(endpoint, token))
+        return response
+
+    return watch
@@ -0,0 +1,288 @@
+# backend/metrics.py
+"""
+In-process metrics in the Prometheus text format, served by GET /metrics.
+- Counter, Gauge and Histogram keep their samples in memory behind one lock each;
+  no collector or client library is needed.
+- stage(name) times a block into stage_duration_seconds{stage=...} and counts failures
+  in stage_errors_total; see STAGES for the names used across the app.
+- Gauges can be bound to a function that is read at scrape time (queue depth, model loaded).
+- cache_lookup(cache, hit) feeds cache_lookups_total and the derived cache_hit_ratio.
+Each worker process keeps its own registry; scrape every pod/worker separately.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGES = (
+    "save", "decode", "vad", "transcribe", "score", "accent", "firestore_write",
+    "voice_embed", "voice_verify", "lesson",
+)
+
+
+def _escape(val) -> str:
+    return str(val).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(val: float) -> str:
+    if math.isnan(val):
+        return "NaN"
+    if math.isinf(val):
+        return "+Inf" if val > 0 else "-Inf"
+    if float(val).is_integer():
+        return str(int(val))
+    return repr(float(val))
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, doc, labelnames=()):
+        super().__init__(name, doc, labelnames)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        with self.lock:
+            return self.values.get(self._key(labels), 0.0)
+
+    def collect(self) -> List[str]:
+        with self.lock:
+            items = sorted(self.values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, doc, labelnames=()):
+        super().__init__(name, doc, labelnames)
+        self.values: Dict[Tuple, float] = {}
+        self.functions: Dict[Tuple, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels):
+        """Read fn() at scrape time instead of a stored value."""
+        key = self._key(labels)
+        with self.lock:
+            self.functions[key] = fn
+
+    def collect(self) -> List[str]:
+        with self.lock:
+            values = dict(self.values)
+            functions = dict(self.functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = float(fn())
+            except Exception:
+                values[key] = float("nan")
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}"
+                                for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[Tuple, List[float]] = {}  # per-bucket counts, then sum, then count
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        n = len(self.buckets)
+        with self.lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = [0.0] * (n + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    s[i] += 1
+                    break
+            s[n] += value
+            s[n + 1] += 1
+
+    def mean(self, **labels) -> Optional[float]:
+        with self.lock:
+            s = self.series.get(self._key(labels))
+            if not s or not s[-1]:
+                return None
+            return s[-2] / s[-1]
+
+    def collect(self) -> List[str]:
+        with self.lock:
+            items = sorted((k, list(v)) for k, v in self.series.items())
+        n = len(self.buckets)
+        lines = self.header()
+        for key, s in items:
+            cumulative = 0.0
+            for i, bound in enumerate(self.buckets):
+                cumulative += s[i]
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_fmt(cumulative)}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, inf)} {_fmt(s[n + 1])}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(s[n])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {_fmt(s[n + 1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if any(m.name == metric.name for m in self.metrics):
+                raise ValueError(f"duplicate metric: {metric.name}")
+            self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics)
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, doc, labelnames=()) -> Counter:
+    return REGISTRY.register(Counter(name, doc, labelnames))
+
+
+def gauge(name, doc, labelnames=()) -> Gauge:
+    return REGISTRY.register(Gauge(name, doc, labelnames))
+
+
+def histogram(name, doc, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, doc, labelnames, buckets))
+
+
+# ---------- app metrics ----------
+
+HTTP_REQUESTS = counter("http_requests_total", "HTTP requests by endpoint and status.", ("endpoint", "status"))
+HTTP_DURATION = histogram("http_request_duration_seconds",
+                          "Time until the response body was fully sent.", ("endpoint",))
+HTTP_IN_FLIGHT = gauge("http_requests_in_flight", "Requests currently being handled.", ("endpoint",))
+STAGE_DURATION = histogram("stage_duration_seconds", "Time spent per processing stage.", ("stage",))
+STAGE_ERRORS = counter("stage_errors_total", "Stages that raised.", ("stage",))
+QUEUE_DEPTH = gauge("queue_depth", "Work items waiting for a slot.", ("queue",))
+QUEUE_ACTIVE = gauge("queue_active", "Work items holding a slot.", ("queue",))
+QUEUE_WAIT = histogram("queue_wait_seconds", "Time spent waiting for a slot.", ("queue",))
+MODEL_LOADED = gauge("model_loaded", "1 when the model is loaded in this process.", ("model",))
+CACHE_LOOKUPS = counter("cache_lookups_total", "Cache lookups by result.", ("cache", "result"))
+CACHE_HIT_RATIO = gauge("cache_hit_ratio", "Hits / lookups since process start.", ("cache",))
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_DURATION.observe(seconds, stage=stage)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block into stage_duration_seconds; exceptions are counted and re-raised."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - t0, stage=name)
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+    if (cache,) not in CACHE_HIT_RATIO.functions:
+        def ratio():
+            hits = CACHE_LOOKUPS.get(cache=cache, result="hit")
+            total = hits + CACHE_LOOKUPS.get(cache=cache, result="miss")
+            return hits / total if total else 0.0
+        CACHE_HIT_RATIO.set_function(ratio, cache=cache)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def init_metrics(app):
+    """Request counters, durations and in-flight gauges via Flask hooks."""
+    from flask import g, request
+
+    def endpoint_name() -> str:
+        rule = request.url_rule
+        return rule.rule if rule is not None else "unmatched"
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_t0 = time.perf_counter()
+        g._metrics_endpoint = endpoint_name()
+        HTTP_IN_FLIGHT.inc(endpoint=g._metrics_endpoint)
+
+    @app.after_request
+    def _metrics_finish(response):
+        t0 = g.pop("_metrics_t0", None)
+        endpoint = g.pop("_metrics_endpoint", None)
+        if t0 is None:
+            return response
+        status = str(response.status_code)
+
+        # runs when the body is done, so SSE streams are timed to their last event
+        def done():
+            HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+            HTTP_DURATION.observe(time.perf_counter() - t0, endpoint=endpoint)
+            HTTP_REQUESTS.inc(endpoint=endpoint, status=status)
+
+        response.call_on_close(done)
+        return response
@@ -0,0 +1,126 @@
+# backend/overload.py
+"""
+Quality steps for when the transcription queue backs up.
+- The pressure signal is the wait a new request would see for a Whisper slot: jobs
+  queued and running times the moving average of recent service times (see
+  compute.SlotQueue.estimated_wait).
+- Each level keeps the ones below it:
+    1 beam          beam capped at OVERLOAD_BEAM (default 2)
+    2 greedy        beam 1
+    3 smaller_model the next smaller Whisper size (only with WHISPER_MODELS)
+    4 no_accent     accent detection skipped
+- A level is entered as soon as the estimated wait reaches OVERLOAD_STEP_S (default 3)
+  times that level. It is left one step at a time, once the wait is below OVERLOAD_RECOVER
+  (default 0.5) of the level's threshold and OVERLOAD_COOLDOWN_S (default 10) have passed
+  since the last change, so the level does not flap at a boundary.
+- The level is evaluated as requests arrive, so it recovers with the next request.
+- Responses carry {"degradation": {"level", "name", "beam", ...}}; /metrics has
+  overload_level and overload_degraded_requests_total{level}. OVERLOAD=0 turns it off.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+import metrics
+
+LEVELS = ("none", "beam", "greedy", "smaller_model", "no_accent")
+
+LEVEL = metrics.gauge("overload_level", "Current quality degradation level (0 = none).")
+DEGRADED = metrics.counter("overload_degraded_requests_total", "Requests served at a degraded level.",
+                           ("level",))
+CHANGES = metrics.counter("overload_level_changes_total", "Degradation level changes.", ("direction",))
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class OverloadController:
+    def __init__(self, queue, enabled: bool = True):
+        self.queue = queue
+        self.enabled = enabled
+        self.step_s = max(0.1, _env_float("OVERLOAD_STEP_S", 3.0))
+        self.recover = min(1.0, max(0.0, _env_float("OVERLOAD_RECOVER", 0.5)))
+        self.cooldown_s = max(0.0, _env_float("OVERLOAD_COOLDOWN_S", 10.0))
+        self.beam_cap = max(1, _env_int("OVERLOAD_BEAM", 2))
+        self.lock = threading.Lock()
+        self.current = 0
+        self.changed_at = time.monotonic()
+        self.last_wait = 0.0
+        LEVEL.set_function(lambda: self.current)
+
+    def level(self) -> int:
+        return self.evaluate()[0]
+
+    def evaluate(self) -> Tuple[int, float]:
+        """(level, estimated wait) after taking the current queue into account."""
+        if not self.enabled:
+            return 0, 0.0
+        now = time.monotonic()
+        with self.lock:
+            wait = self.last_wait = self.queue.estimated_wait()
+            wanted = min(len(LEVELS) - 1, int(wait // self.step_s))
+            if wanted > self.current:
+                self._change(wanted, now, wait)
+            elif (self.current > 0 and wait < self.current * self.step_s * self.recover
+                  and now - self.changed_at >= self.cooldown_s):
+                self._change(self.current - 1, now, wait)
+            return self.current, wait
+
+    def _change(self, level: int, now: float, wait: float):
+        CHANGES.inc(direction="up" if level > self.current else "down")
+        logging.warning("overload level %d -> %d (%s), estimated wait %.1fs", self.current, level,
+                        LEVELS[level], wait)
+        self.current = level
+        self.changed_at = now
+
+    def apply(self, beam: int, model_name: str, registry=None, lang: str = "en") -> Dict[str, Any]:
+        """The settings a request should run with now, plus what to report about them."""
+        level, wait = self.evaluate()
+        out: Dict[str, Any] = {"level": level, "name": LEVELS[level], "beam": beam, "model": model_name,
+                               "accent": True, "wait": wait}
+        if level >= 1:
+            out["beam"] = min(beam, self.beam_cap)
+        if level >= 2:
+            out["beam"] = 1
+        if level >= 3 and registry is not None:
+            out["model"] = registry.smaller(model_name, lang)
+        if level >= 4:
+            out["accent"] = False
+        if level:
+            DEGRADED.inc(level=LEVELS[level])
+        return out
+
+    def report(self, applied: Dict[str, Any], requested_beam: int) -> Dict[str, Any]:
+        """The response block: level and name, and the settings that were changed."""
+        out = {"level": applied["level"], "name": applied["name"]}
+        if applied["beam"] != requested_beam:
+            out["beam"] = applied["beam"]
+        if not applied["accent"]:
+            out["accent"] = False
+        if applied["level"]:
+            out["estimatedWaitS"] = round(applied["wait"], 2)
+        return out
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"level": self.current, "name": LEVELS[self.current], "estimatedWaitS": round(self.last_wait, 3),
+                    "sinceChangeS": round(time.monotonic() - self.changed_at, 1), "enabled": self.enabled}
+
+
+def init_overload(queue) -> OverloadController:
+    enabled = (os.environ.get("OVERLOAD") or "1").strip().lower() not in ("0", "false", "no", "off")
+    return OverloadController(queue, enabled)
@@ -0,0 +1,348 @@
+# backend/profiling.py
+"""
+On-demand and sampled profiling of live requests.
+- An admin request (see admin.py) with X-Profile: 1 or ?profile=1 is profiled.
+- PROFILE_SAMPLE_N=N also profiles every Nth /api/ request, admin or not.
+- PROFILE_MODE picks the profiler:
+  sample (default)  a background thread snapshots the request thread's Python stack every
+                    PROFILE_INTERVAL_MS (default 5). Native work (CTranslate2, PyAV,
+                    librosa's C paths) shows up at the Python frame that called it.
+                    Writes <id>.collapsed (flamegraph.pl / speedscope) and
+                    <id>.speedscope.json.
+  cprofile          deterministic cProfile of the request thread. Writes <id>.pstats
+                    (snakeviz, pstats) and a <id>.txt top-functions summary.
+- Captures go to PROFILE_DIR (default storage/profiles) with a <id>.json sidecar; the
+  newest PROFILE_KEEP (default 200) are kept. The capture id is the trace id and is
+  returned in the X-Profile-Id header. SSE responses are profiled until the stream ends;
+  a streamed body is profiled on the thread that iterates it, which under the ASGI bridge
+  (streaming.py) is a compute or I/O pool thread rather than the request thread.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DIR = os.path.join(BASE_DIR, "storage", "profiles")
+FORMATS = {
+    "collapsed": (".collapsed", "text/plain"),
+    "speedscope": (".speedscope.json", "application/json"),
+    "pstats": (".pstats", "application/octet-stream"),
+    "txt": (".txt", "text/plain"),
+}
+_SAFE_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def profile_dir() -> str:
+    return os.environ.get("PROFILE_DIR") or DEFAULT_DIR
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """One daemon thread sampling the stacks of every thread with an active capture."""
+
+    def __init__(self, interval_s: float):
+        self.interval_s = max(0.001, interval_s)
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.targets: Dict[int, Counter] = {}
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self, thread_id: int, counts: Optional[Counter] = None) -> Counter:
+        counts = Counter() if counts is None else counts
+        with self.lock:
+            self.targets[thread_id] = counts
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self.thread.start()
+            self.wake.notify()
+        return counts
+
+    def stop(self, thread_id: int):
+        with self.lock:
+            self.targets.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self.targets:
+                    self.wake.wait()
+                targets = dict(self.targets)
+            frames = sys._current_frames()
+            for tid, counts in targets.items():
+                frame = frames.get(tid)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    counts[tuple(reversed(stack))] += 1
+            del frames
+            time.sleep(self.interval_s)
+
+
+class Capture:
+    def __init__(self, capture_id: str, endpoint: str, reason: str, mode: str, sampler: Optional[StackSampler]):
+        self.id = capture_id
+        self.endpoint = endpoint
+        self.reason = reason
+        self.mode = mode
+        self.sampler = sampler
+        self.thread_id = threading.get_ident()
+        self.started_at = datetime.now(timezone.utc)
+        self.t0 = time.perf_counter()
+        self.profile: Optional[cProfile.Profile] = None
+        self.counts: Optional[Counter] = None
+        self.active = False
+        self.stopped = False
+
+    def start(self):
+        self.active = True
+        if self.mode == "cprofile":
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+                return
+            except ValueError:
+                # another profiler owns this interpreter/thread; sample instead
+                self.profile = None
+                self.mode = "sample"
+        self.counts = self.sampler.start(self.thread_id)
+
+    def pause(self):
+        """Stop collecting on the calling thread (cProfile only unhooks the thread it runs on)."""
+        if not self.active:
+            return
+        self.active = False
+        if self.profile is not None:
+            self.profile.disable()
+        elif self.sampler is not None:
+            self.sampler.stop(self.thread_id)
+
+    def resume(self):
+        """Carry on collecting into the same capture on the calling thread."""
+        if self.active or self.stopped:
+            return
+        self.thread_id = threading.get_ident()
+        if self.profile is not None:
+            try:
+                self.profile.enable()
+            except ValueError:
+                return  # another profiler owns this thread; keep what the view recorded
+        elif self.sampler is not None:
+            self.counts = self.sampler.start(self.thread_id, self.counts)
+        self.active = True
+
+    def stop(self, status: Optional[int]):
+        if self.stopped:
+            return
+        self.stopped = True
+        duration_ms = (time.perf_counter() - self.t0) * 1000.0
+        self.pause()
+        try:
+            self._write(status, duration_ms)
+        except Exception:
+            logging.exception("profile write failed id=%s", self.id)
+
+    def _write(self, status, duration_ms):
+        out_dir = profile_dir()
+        os.makedirs(out_dir, exist_ok=True)
+        base = os.path.join(out_dir, self.id)
+        files = []
+        extra: Dict[str, Any] = {}
+        if self.profile is not None:
+            self.profile.dump_stats(base + ".pstats")
+            buf = io.StringIO()
+            pstats.Stats(self.profile, stream=buf).sort_stats("cumulative").print_stats(40)
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write(buf.getvalue())
+            files = ["pstats", "txt"]
+        else:
+            counts = self.counts or Counter()
+            interval_ms = self.sampler.interval_s * 1000.0
+            with open(base + ".collapsed", "w", encoding="utf-8") as f:
+                for stack, n in counts.most_common():
+                    f.write(";".join(stack) + f" {n}\n")
+            with open(base + ".speedscope.json", "w", encoding="utf-8") as f:
+                json.dump(speedscope(counts, interval_ms, f"{self.endpoint} {self.id}"), f)
+            files = ["collapsed", "speedscope"]
+            extra = {"samples": sum(counts.values()), "intervalMs": interval_ms}
+        meta = {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "reason": self.reason,
+            "mode": self.mode,
+            "status": status,
+            "durationMs": round(duration_ms, 2),
+            "createdAt": self.started_at.isoformat(),
+            "files": files,
+            **extra,
+        }
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        logging.info("profile written id=%s endpoint=%s mode=%s ms=%.1f", self.id, self.endpoint,
+                     self.mode, duration_ms)
+        prune(out_dir, max(1, _env_int("PROFILE_KEEP", 200)))
+
+
+def speedscope(counts: Counter, interval_ms: float, name: str) -> Dict[str, Any]:
+    """A speedscope 'sampled' profile with one weighted sample per distinct stack."""
+    index: Dict[str, int] = {}
+    frames: List[Dict[str, Any]] = []
+    samples, weights = [], []
+    for stack, n in counts.most_common():
+        ids = []
+        for label in stack:
+            if label not in index:
+                index[label] = len(frames)
+                fn, _, loc = label.partition(" (")
+                file, _, line = loc.rstrip(")").rpartition(":")
+                frames.append({"name": fn, "file": file, "line": int(line) if line.isdigit() else None})
+            ids.append(index[label])
+        samples.append(ids)
+        weights.append(round(n * interval_ms, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": round(sum(weights), 3),
+            "samples": samples,
+            "weights": weights,
+        }],
+        "name": name,
+        "exporter": "pronunciation-backend",
+    }
+
+
+def prune(out_dir: str, keep: int):
+    metas = sorted((f for f in os.listdir(out_dir) if f.endswith(".json") and not f.endswith(".speedscope.json")),
+                   key=lambda f: os.path.getmtime(os.path.join(out_dir, f)), reverse=True)
+    for meta in metas[keep:]:
+        cid = meta[:-len(".json")]
+        for ext in [".json"] + [e for e, _ in FORMATS.values()]:
+            try:
+                os.remove(os.path.join(out_dir, cid + ext))
+            except FileNotFoundError:
+                pass
+
+
+def list_captures(limit: int = 100) -> List[Dict[str, Any]]:
+    out_dir = profile_dir()
+    if not os.path.isdir(out_dir):
+        return []
+    rows = []
+    for name in os.listdir(out_dir):
+        if not name.endswith(".json") or name.endswith(".speedscope.json"):
+            continue
+        try:
+            with open(os.path.join(out_dir, name), "r", encoding="utf-8") as f:
+                rows.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    rows.sort(key=lambda r: r.get("createdAt") or "", reverse=True)
+    return rows[:limit]
+
+
+def capture_path(capture_id: str, fmt: str) -> Optional[str]:
+    if fmt not in FORMATS or _SAFE_RE.sub("", capture_id) != capture_id:
+        return None
+    path = os.path.join(profile_dir(), capture_id + FORMATS[fmt][0])
+    return path if os.path.exists(path) else None
+
+
+class Profiler:
+    def __init__(self):
+        self.mode = (os.environ.get("PROFILE_MODE") or "sample").strip().lower()
+        if self.mode not in ("sample", "cprofile"):
+            self.mode = "sample"
+        self.sample_n = max(0, _env_int("PROFILE_SAMPLE_N", 0))
+        self.sampler = StackSampler(_env_int("PROFILE_INTERVAL_MS", 5) / 1000.0)
+        self.lock = threading.Lock()
+        self.seen = 0
+
+    def reason(self, request, is_admin) -> Optional[str]:
+        path = request.path
+        if not path.startswith("/api/") or path.startswith("/api/admin"):
+            return None
+        flag = (request.headers.get("X-Profile") or request.args.get("profile") or "").strip().lower()
+        if flag in ("1", "true", "yes", "on") and is_admin(request):
+            return "on_demand"
+        if self.sample_n:
+            with self.lock:
+                self.seen += 1
+                if self.seen % self.sample_n == 0:
+                    return "sampled"
+        return None
+
+    def begin(self, capture_id: str, endpoint: str, reason: str) -> Capture:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        cid = _SAFE_RE.sub("-", f"{stamp}_{capture_id}")[:96]
+        cap = Capture(cid, endpoint, reason, self.mode, self.sampler)
+        cap.start()
+        return cap
+
+
+def _follow(cap: Capture, body, status: Optional[int]):
+    """Profile a streamed body on whichever thread iterates it, from first chunk to close."""
+    cap.resume()
+    try:
+        yield from body
+    finally:
+        cap.stop(status)
+
+
+def init_profiling(app, is_admin):
+    """Register the per-request hooks; is_admin(request) gates the on-demand switch."""
+    from flask import g, request
+
+    profiler = Profiler()
+    app.profiler = profiler
+
+    @app.before_request
+    def _profile_start():
+        reason = profiler.reason(request, is_admin)
+        if reason is None:
+            return
+        trace = getattr(g, "trace", None)
+        rule = request.url_rule
+        g.profile_capture = profiler.begin(trace.trace_id if trace is not None else os.urandom(8).hex(),
+                                           rule.rule if rule is not None else request.path, reason)
+
+    @app.after_request
+    def _profile_finish(response):
+        cap = g.pop("profile_capture", None)
+        if cap is None:
+            return response
+        response.headers["X-Profile-Id"] = cap.id
+        status = response.status_code
+        if response.is_streamed:
+            # after_request runs on the request thread; the body may not (ASGI bridge)
+            cap.pause()
+            response.response = _follow(cap, response.response, status)
+        # also covers a stream closed before its first chunk, e.g. dropped while queued
+        response.call_on_close(lambda: cap.stop(status))
+        return response
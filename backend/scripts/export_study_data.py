@@ -1,13 +1,54 @@
 #!/usr/bin/env python3
+"""
+Export Firestore study data as NDJSON and CSV.
+
+Reads are cursor-paginated (ordered by createdAt, then document id) and every page is
+appended straight to the output files, so memory stays flat for any study size. After
+each page the byte offsets and the last (createdAt, id) are written to a checkpoint; a
+rerun truncates the outputs back to those offsets and continues after the cursor, which
+makes interrupted and nightly runs incremental. Use --full to start over.
+
+Firestore leaves documents without the ordered field out of an order_by query, so older
+records that have no createdAt are collected by a separate pass ordered by document id
+alone. It runs once per export, before the dated pass, and is skipped with --start/--end
+(those filters exclude undated records anyway).
+
+attempts and feedback export in parallel. The attempts NDJSON is then turned into the
+columnar cache read by generate_chapter6_graphs.py (see study_columns.py).
+"""
 import argparse
 import csv
+import gzip
+import io
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 import firebase_admin
 from firebase_admin import credentials, firestore
 
+from study_columns import build_cache
+
+ATTEMPT_FIELDS = [
+    "_id", "createdAt", "uid", "studyTag", "sessionId", "target", "lang",
+    "accuracy", "wer", "duration", "transcript", "hardWords", "words",
+    "latencyMs", "serverLatencyMs", "transcribeMs", "scoreMs", "transcribeAttempts",
+    "avgConfidence", "accent", "accentConfidence", "settings", "errorTags",
+]
+FEEDBACK_FIELDS = [
+    "_id", "createdAt", "uid", "studyTag", "sessionId",
+    "usability", "feedback", "speed", "satisfaction", "personalization", "clarity",
+    "comment", "issues", "attemptsCount", "lastTarget", "exampleMistake", "source",
+]
+# fields outside the fixed schema go into one JSON column so the header never changes
+EXTRA_FIELD = "extra"
+
+COLLECTIONS = {"attempts": ATTEMPT_FIELDS, "feedback": FEEDBACK_FIELDS}
+
+_print_lock = threading.Lock()
+
 
 def parse_dt(val: str):
     if not val:
@@ -39,50 +80,206 @@ def to_iso(val):
         return val
 
 
-def fetch_collection(db, name, study_tag=None, start_dt=None, end_dt=None):
+def log(*args):
+    with _print_lock:
+        print(*args, flush=True)
+
+
+# ---------- reading ----------
+
+def base_query(db, name, study_tag=None, start_dt=None, end_dt=None, undated=False):
     q = db.collection(name)
     if study_tag:
         q = q.where("studyTag", "==", study_tag)
+    if undated:
+        # every document has an id, so this order drops nothing
+        return q.order_by("__name__", direction=firestore.Query.ASCENDING)
     if start_dt:
         q = q.where("createdAt", ">=", start_dt)
     if end_dt:
         q = q.where("createdAt", "<=", end_dt)
-    rows = []
-    for doc in q.stream():
-        obj = doc.to_dict() or {}
-        obj["_id"] = doc.id
-        if "createdAt" in obj:
-            obj["createdAt"] = to_iso(obj.get("createdAt"))
-        rows.append(obj)
-    return rows
+    # "__name__" is the document id, the tie-breaker for equal timestamps
+    return (q.order_by("createdAt", direction=firestore.Query.ASCENDING)
+             .order_by("__name__", direction=firestore.Query.ASCENDING))
 
 
-def write_json(path, rows):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(rows, f, ensure_ascii=True, default=str)
+def resume_cursor(db, name, cursor):
+    """Turn a checkpoint cursor into something start_after accepts."""
+    if not cursor:
+        return None
+    snap = db.collection(name).document(cursor["id"]).get()
+    if snap.exists:
+        return snap
+    # the cursor document was deleted; resume from its (createdAt, id) position, or the
+    # other documents sharing that timestamp would be skipped
+    dt = parse_dt(cursor.get("createdAt"))
+    return {"createdAt": dt, "__name__": cursor["id"]} if dt else None
 
 
-def write_csv(path, rows):
-    if not rows:
-        with open(path, "w", newline="", encoding="utf-8") as f:
-            f.write("")
-        return
-    keys = set()
+def resume_undated(db, name, doc_id):
+    if not doc_id:
+        return None
+    ref = db.collection(name).document(doc_id)
+    snap = ref.get()
+    return snap if snap.exists else {"__name__": ref}
+
+
+def iter_pages(db, name, page_size, after=None, undated=False, **filters):
+    """Yield lists of (snapshot, row) one page at a time."""
+    q = base_query(db, name, undated=undated, **filters)
+    while True:
+        page_q = q.limit(page_size)
+        if after is not None:
+            page_q = page_q.start_after(after)
+        snaps = list(page_q.stream())
+        if not snaps:
+            return
+        page = []
+        for doc in snaps:
+            obj = doc.to_dict() or {}
+            obj["_id"] = doc.id
+            if "createdAt" in obj:
+                obj["createdAt"] = to_iso(obj.get("createdAt"))
+            page.append((doc, obj))
+        yield page
+        if len(snaps) < page_size:
+            return
+        after = snaps[-1]
+
+
+# ---------- writing ----------
+
+def ndjson_lines(rows):
+    out = io.StringIO()
+    for r in rows:
+        out.write(json.dumps(r, ensure_ascii=True, default=str))
+        out.write("\n")
+    return out.getvalue()
+
+
+def csv_lines(rows, fields, header=False):
+    out = io.StringIO()
+    w = csv.writer(out)
+    if header:
+        w.writerow(fields + [EXTRA_FIELD])
+    known = set(fields)
     for r in rows:
-        keys.update(r.keys())
-    fieldnames = sorted(keys)
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        for r in rows:
-            row = {}
-            for k in fieldnames:
-                v = r.get(k)
-                if isinstance(v, (list, dict)):
-                    row[k] = json.dumps(v, ensure_ascii=True, default=str)
-                else:
-                    row[k] = v
-            w.writerow(row)
+        row = []
+        for k in fields:
+            v = r.get(k)
+            if isinstance(v, (list, dict)):
+                v = json.dumps(v, ensure_ascii=True, default=str)
+            row.append(v)
+        extra = {k: v for k, v in r.items() if k not in known}
+        row.append(json.dumps(extra, ensure_ascii=True, default=str) if extra else "")
+        w.writerow(row)
+    return out.getvalue()
+
+
+def append_chunk(path, text, compress):
+    """Append text and return the new file size. Gzip output gets one member per chunk."""
+    data = text.encode("utf-8")
+    with open(path, "ab") as f:
+        if compress:
+            with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                gz.write(data)
+        else:
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def truncate_to(path, size):
+    if not os.path.exists(path):
+        return
+    if os.path.getsize(path) > size:
+        with open(path, "r+b") as f:
+            f.truncate(size)
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=True, indent=2)
+    os.replace(tmp, path)
+
+
+def export_collection(db, name, out_dir, formats, compress, page_size, full, filters):
+    fields = COLLECTIONS[name]
+    ext = ".gz" if compress else ""
+    paths = {}
+    if "ndjson" in formats:
+        paths["ndjson"] = os.path.join(out_dir, f"{name}_export.ndjson{ext}")
+    if "csv" in formats:
+        paths["csv"] = os.path.join(out_dir, f"{name}_export.csv{ext}")
+    ckpt_path = os.path.join(out_dir, f"{name}_export.checkpoint.json")
+    scope = {
+        "studyTag": filters.get("study_tag"),
+        "start": to_iso(filters.get("start_dt")) if filters.get("start_dt") else None,
+        "end": to_iso(filters.get("end_dt")) if filters.get("end_dt") else None,
+        "compress": bool(compress),
+        "formats": sorted(paths),
+    }
+
+    state = None if full else load_checkpoint(ckpt_path)
+    if state and state.get("scope") != scope:
+        raise SystemExit(f"{name}: checkpoint was written with different options; rerun with --full")
+    if state is None:
+        for p in paths.values():
+            if os.path.exists(p):
+                os.remove(p)
+        state = {"scope": scope, "cursor": None, "undatedCursor": None, "undatedDone": False, "rows": 0,
+                 "offsets": {k: 0 for k in paths}}
+    else:
+        # drop anything written after the last committed page
+        for k, p in paths.items():
+            truncate_to(p, state["offsets"].get(k, 0))
+        log(f"{name}: resuming after {state['cursor']} ({state['rows']} rows already exported)")
+
+    new_rows = 0
+
+    def commit(rows):
+        nonlocal new_rows
+        if rows:
+            if "ndjson" in paths:
+                state["offsets"]["ndjson"] = append_chunk(paths["ndjson"], ndjson_lines(rows), compress)
+            if "csv" in paths:
+                header = state["offsets"].get("csv", 0) == 0
+                state["offsets"]["csv"] = append_chunk(paths["csv"], csv_lines(rows, fields, header), compress)
+            state["rows"] += len(rows)
+            new_rows += len(rows)
+        state["updatedAt"] = datetime.now(timezone.utc).isoformat()
+        save_checkpoint(ckpt_path, state)
+
+    # records without createdAt: a full scan by id, once; new records always have the field
+    if not (filters.get("start_dt") or filters.get("end_dt")) and not state.get("undatedDone"):
+        after = resume_undated(db, name, state.get("undatedCursor"))
+        for page in iter_pages(db, name, page_size, after=after, undated=True, study_tag=filters.get("study_tag")):
+            rows = [r for _, r in page if "createdAt" not in r]
+            state["undatedCursor"] = page[-1][1]["_id"]
+            commit(rows)
+            if rows:
+                log(f"{name}: +{len(rows)} rows without createdAt (total {state['rows']})")
+        state["undatedDone"] = True
+        commit([])
+
+    after = resume_cursor(db, name, state["cursor"])
+    for page in iter_pages(db, name, page_size, after=after, **filters):
+        rows = [r for _, r in page]
+        last = rows[-1]
+        state["cursor"] = {"createdAt": last.get("createdAt"), "id": last["_id"]}
+        commit(rows)
+        log(f"{name}: +{len(rows)} rows (total {state['rows']})")
+
+    return {"collection": name, "new": new_rows, "total": state["rows"], "files": paths}
 
 
 def main():
@@ -92,38 +289,56 @@ def main():
     parser.add_argument("--start", default="", help="Start date/time ISO (e.g. 2024-12-01)")
     parser.add_argument("--end", default="", help="End date/time ISO (e.g. 2024-12-31)")
     parser.add_argument("--service-account", default="", help="Path to service account JSON")
+    parser.add_argument("--formats", default="ndjson,csv", help="Comma-separated: ndjson,csv")
+    parser.add_argument("--compress", action="store_true", help="Write gzip-compressed outputs")
+    parser.add_argument("--page-size", type=int, default=500, help="Documents per Firestore read")
+    parser.add_argument("--full", action="store_true", help="Ignore checkpoints and export from scratch")
+    parser.add_argument("--no-columns", action="store_true", help="Skip building the columnar attempts cache")
     args = parser.parse_args()
 
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
     sa = args.service_account or os.environ.get("GOOGLE_APPLICATION_CREDENTIALS") or os.path.join(base_dir, "firebase-service-account.json")
-    start_dt = parse_dt(args.start)
-    end_dt = parse_dt(args.end)
+    formats = {f.strip().lower() for f in args.formats.split(",") if f.strip()}
+    if not formats or not formats <= {"ndjson", "csv"}:
+        raise SystemExit(f"unsupported formats: {args.formats}")
+    filters = {
+        "study_tag": args.study_tag or None,
+        "start_dt": parse_dt(args.start),
+        "end_dt": parse_dt(args.end),
+    }
 
     db = init_db(sa)
     os.makedirs(args.out_dir, exist_ok=True)
 
-    attempts = fetch_collection(db, "attempts", args.study_tag or None, start_dt, end_dt)
-    feedback = fetch_collection(db, "feedback", args.study_tag or None, start_dt, end_dt)
-
-    attempts_json = os.path.join(args.out_dir, "attempts_export.json")
-    attempts_csv = os.path.join(args.out_dir, "attempts_export.csv")
-    feedback_json = os.path.join(args.out_dir, "feedback_export.json")
-    feedback_csv = os.path.join(args.out_dir, "feedback_export.csv")
+    with ThreadPoolExecutor(max_workers=len(COLLECTIONS)) as pool:
+        futures = {
+            name: pool.submit(export_collection, db, name, args.out_dir, formats,
+                              args.compress, max(1, args.page_size), args.full, filters)
+            for name in COLLECTIONS
+        }
+        results = {name: fut.result() for name, fut in futures.items()}
 
-    write_json(attempts_json, attempts)
-    write_csv(attempts_csv, attempts)
-    write_json(feedback_json, feedback)
-    write_csv(feedback_csv, feedback)
+    columns_dir = None
+    attempts_ndjson = results["attempts"]["files"].get("ndjson")
+    if attempts_ndjson and not args.no_columns:
+        columns_dir = os.path.join(args.out_dir, "attempts_columns")
+        build_cache(attempts_ndjson, columns_dir)
 
     summary = {
-        "attempts": len(attempts),
-        "feedback": len(feedback),
+        "attempts": results["attempts"]["total"],
+        "feedback": results["feedback"]["total"],
+        "newAttempts": results["attempts"]["new"],
+        "newFeedback": results["feedback"]["new"],
+        "files": {name: r["files"] for name, r in results.items()},
+        "columns": columns_dir,
         "studyTag": args.study_tag or None,
         "start": args.start or None,
         "end": args.end or None,
+        "exportedAt": datetime.now(timezone.utc).isoformat(),
     }
     summary_path = os.path.join(args.out_dir, "export_summary.json")
-    write_json(summary_path, summary)
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=True, indent=2, default=str)
 
     print("exported", summary)
 
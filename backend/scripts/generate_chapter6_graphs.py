@@ -1,10 +1,31 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
+import inspect
 import json
 import os
 import statistics
+import sys
+import time
 from collections import Counter
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from resampling import diff_test, mean_ci, parallel_map  # noqa: E402
+from study_columns import (  # noqa: E402
+    ensure_cache,
+    group_count,
+    group_nanmean,
+    first_seen,
+    iter_rows,
+    load_columns,
+    order_by_tag_time,
+)
 
 
 def mean(vals):
@@ -12,30 +33,44 @@ def mean(vals):
     return statistics.mean(vals) if vals else None
 
 
+def nanmean(vals):
+    """Mean of a float column slice ignoring NaN; None when nothing is left."""
+    vals = np.asarray(vals, dtype=np.float64)
+    vals = vals[~np.isnan(vals)]
+    return float(vals.mean()) if vals.size else None
+
+
+def or_zero(val):
+    if val is None or np.isnan(val):
+        return 0.0
+    return float(val)
+
+
 def norm_tag(val):
     return str(val or "").strip().lower()
 
 
-def load_json(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
 
-def parse_dt(s):
-    if not s:
-        return None
-    try:
-        return datetime.fromisoformat(s)
-    except Exception:
-        return None
+def error_bar_lines(x, lo, hi, cap, y_scale):
+    """SVG whisker for a (lo, hi) interval centred on x."""
+    y_lo, y_hi = y_scale(lo), y_scale(hi)
+    return [
+        f"<line x1='{x:.2f}' y1='{y_lo:.2f}' x2='{x:.2f}' y2='{y_hi:.2f}' stroke='#111' stroke-width='1.2'/>",
+        f"<line x1='{x - cap:.2f}' y1='{y_lo:.2f}' x2='{x + cap:.2f}' y2='{y_lo:.2f}' stroke='#111' stroke-width='1.2'/>",
+        f"<line x1='{x - cap:.2f}' y1='{y_hi:.2f}' x2='{x + cap:.2f}' y2='{y_hi:.2f}' stroke='#111' stroke-width='1.2'/>",
+    ]
 
 
-def bar_chart_svg(title, labels, values, y_label, out_path, value_fmt="{:.2f}"):
+def bar_chart_svg(title, labels, values, y_label, out_path, value_fmt="{:.2f}", errors=None):
+    """errors: optional list of (lo, hi) confidence intervals (or None) per bar."""
     width, height = 900, 500
     margin = {"l": 70, "r": 30, "t": 50, "b": 90}
     chart_w = width - margin["l"] - margin["r"]
     chart_h = height - margin["t"] - margin["b"]
 
     max_val = max(values) if values else 1.0
+    if errors:
+        max_val = max([max_val] + [e[1] for e in errors if e])
     if max_val <= 0:
         max_val = 1.0
     y_max = max_val * 1.1
@@ -81,6 +116,10 @@ def bar_chart_svg(title, labels, values, y_label, out_path, value_fmt="{:.2f}"):
         y = y_scale(val)
         h = y0 - y
         lines.append(f"<rect x='{x}' y='{y}' width='{bar_w}' height='{h}' fill='#4f46e5'/>")
+        err = errors[i] if errors and i < len(errors) else None
+        if err:
+            lines.extend(error_bar_lines(x + bar_w / 2, err[0], err[1], min(8, bar_w / 4), y_scale))
+            y = min(y, y_scale(err[1]))
         lines.append(f"<text x='{x + bar_w/2}' y='{y - 6}' text-anchor='middle' "
                      "font-family='Arial' font-size='11' fill='#111'>{}</text>".format(value_fmt.format(val)))
         lines.append(f"<text x='{x + bar_w/2}' y='{y0 + 18}' text-anchor='middle' "
@@ -92,6 +131,7 @@ def bar_chart_svg(title, labels, values, y_label, out_path, value_fmt="{:.2f}"):
         f.write("\n".join(lines))
 
 def grouped_bar_svg(title, groups, series, y_label, out_path, value_fmt="{:.2f}", y_min=0.0, y_max=1.0):
+    """series: [{"label", "values", optional "errors": [(lo, hi) or None, ...]}]"""
     width, height = 1000, 520
     margin = {"l": 70, "r": 30, "t": 50, "b": 90}
     chart_w = width - margin["l"] - margin["r"]
@@ -141,6 +181,11 @@ def grouped_bar_svg(title, groups, series, y_label, out_path, value_fmt="{:.2f}"
             y = y_scale(val)
             h = y0 - y
             lines.append(f"<rect x='{x}' y='{y}' width='{bar_w}' height='{h}' fill='{colors[si % len(colors)]}'/>")
+            errs = s.get("errors") or []
+            err = errs[gi] if gi < len(errs) else None
+            if err:
+                lines.extend(error_bar_lines(x + bar_w / 2, err[0], err[1], min(6, bar_w / 4), y_scale))
+                y = min(y, y_scale(err[1]))
             lines.append(f"<text x='{x + bar_w/2}' y='{y - 6}' text-anchor='middle' "
                          f"font-family='Arial' font-size='10' fill='#111'>{value_fmt.format(val)}</text>")
 
@@ -230,28 +275,155 @@ def line_chart_svg(title, values, y_label, out_path, value_fmt="{:.2f}", y_min=N
         f.write("\n".join(lines))
 
 
+MANIFEST_NAME = ".figures_manifest.json"
+
+
+def _json_default(val):
+    if isinstance(val, np.generic):
+        return val.item()
+    raise TypeError(f"not serialisable: {type(val)}")
+
+
+def _render(job):
+    """Process-pool entry point: job is (renderer name, args, out_path, kwargs)."""
+    fn_name, args, out_path, kwargs = job
+    RENDERERS[fn_name](*args, out_path, **kwargs)
+    return out_path
+
+
+class FigureSet:
+    """
+    Collects figure jobs and renders only those whose inputs changed.
+    Each job is keyed by a hash of its renderer source and its arguments; hashes are kept
+    in a manifest next to the SVGs. Changed figures render in a process pool.
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+        self.jobs = []
+        self._src_hash = {}
+
+    def add(self, fn, *args, **kwargs):
+        *args, filename = args
+        self.jobs.append((filename, fn.__name__, list(args), kwargs))
+
+    def _digest(self, fn_name, args, kwargs):
+        if fn_name not in self._src_hash:
+            src = inspect.getsource(RENDERERS[fn_name])
+            self._src_hash[fn_name] = hashlib.sha256(src.encode("utf-8")).hexdigest()
+        payload = json.dumps([self._src_hash[fn_name], args, kwargs], sort_keys=True, default=_json_default)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def render(self, jobs=0, force=False):
+        old = {}
+        if os.path.exists(self.manifest_path) and not force:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                old = json.load(f)
+
+        manifest = {}
+        todo = []
+        for filename, fn_name, args, kwargs in self.jobs:
+            digest = self._digest(fn_name, args, kwargs)
+            manifest[filename] = digest
+            out_path = os.path.join(self.out_dir, filename)
+            if old.get(filename) == digest and os.path.exists(out_path):
+                continue
+            # plain Python values so jobs pickle cheaply and identically across runs
+            args, kwargs = json.loads(json.dumps([args, kwargs], default=_json_default))
+            todo.append((fn_name, args, out_path, kwargs))
+
+        workers = jobs or os.cpu_count() or 1
+        if len(todo) > 1 and workers > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+                list(pool.map(_render, todo, chunksize=max(1, len(todo) // (workers * 4))))
+        else:
+            for job in todo:
+                _render(job)
+
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+        return len(todo), len(self.jobs) - len(todo)
+
+
+RENDERERS = {fn.__name__: fn for fn in (bar_chart_svg, grouped_bar_svg, line_chart_svg)}
+
+STATS_CACHE_NAME = ".stats_cache.json"
+
+
+def compute_stats(jobs, resamples, cache_path):
+    """
+    Run bootstrap/permutation jobs, reusing cached results for unchanged inputs.
+    jobs: {key: ("ci", values) | ("diff", first, second)} with float64 arrays.
+    """
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+
+    digests = {}
+    for key, (kind, *arrays) in jobs.items():
+        h = hashlib.sha256(f"{kind}:{resamples}".encode("utf-8"))
+        for arr in arrays:
+            h.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+            h.update(b"|")
+        digests[key] = h.hexdigest()
+
+    misses = [k for k in jobs if digests[k] not in cache]
+
+    def run(key):
+        kind, *arrays = jobs[key]
+        if kind == "diff":
+            return diff_test(arrays[0], arrays[1], resamples, parallel=False)
+        return mean_ci(arrays[0], resamples, parallel=False)
+
+    for key, result in zip(misses, parallel_map(run, misses)):
+        cache[digests[key]] = result
+
+    kept = {digests[k]: cache[digests[k]] for k in jobs}
+    tmp = cache_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(kept, f)
+    os.replace(tmp, cache_path)
+    return {k: kept[digests[k]] for k in jobs}, len(misses)
+
+
+def interval(stat):
+    return [stat["lo"], stat["hi"]] if stat else None
+
+
 def main():
     parser = argparse.ArgumentParser(description="Generate Chapter 6 graphs from exported data.")
-    parser.add_argument("--attempts", default="data/attempts_export.json")
-    parser.add_argument("--feedback", default="data/feedback_export.json")
+    parser.add_argument("--attempts", default="data/attempts_export.ndjson")
+    parser.add_argument("--feedback", default="data/feedback_export.ndjson")
+    parser.add_argument("--cache-dir", default="", help="Columnar cache dir (default: attempts_columns next to --attempts)")
     parser.add_argument("--out-dir", default="figures/chapter6")
     parser.add_argument("--tags", default="", help="Comma-separated study tags to include (optional)")
+    parser.add_argument("--jobs", type=int, default=0, help="Render processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Rebuild every figure, ignoring the manifest")
+    parser.add_argument("--resamples", type=int, default=2000,
+                        help="Bootstrap/permutation resamples per statistic (0 disables intervals)")
     args = parser.parse_args()
+    t0 = time.perf_counter()
 
-    attempts = load_json(args.attempts)
-    feedback = load_json(args.feedback)
+    cache_dir = args.cache_dir or os.path.join(os.path.dirname(os.path.abspath(args.attempts)), "attempts_columns")
+    meta = ensure_cache(args.attempts, cache_dir)
+    cols = load_columns(cache_dir, [
+        "tag", "createdAt", "accuracy", "wer", "latencyMs",
+        "word_attempt", "word_status", "hard_attempt", "hard_word",
+    ])
+    feedback = list(iter_rows(args.feedback))
 
     tags_filter = [t.strip().lower() for t in args.tags.split(",") if t.strip()] if args.tags else []
 
-    # Group attempts by tag
-    attempts_by_tag = {}
-    for a in attempts:
-        tag = norm_tag(a.get("studyTag"))
-        if not tag:
-            continue
-        if tags_filter and tag not in tags_filter:
-            continue
-        attempts_by_tag.setdefault(tag, []).append(a)
+    # Attempts per tag come from the columnar cache
+    tag_names = meta["tags"]
+    n_tags = len(tag_names)
+    tag_code = {t: i for i, t in enumerate(tag_names)}
+    rows_per_tag = group_count(cols["tag"], n_tags)
+    present = {t for t, i in tag_code.items() if rows_per_tag[i] > 0}
 
     feedback_by_tag = {}
     for f in feedback:
@@ -262,33 +434,82 @@ def main():
             continue
         feedback_by_tag.setdefault(tag, []).append(f)
 
-    tags = tags_filter if tags_filter else sorted(attempts_by_tag.keys())
-    tags = [t for t in tags if t in attempts_by_tag]
+    tags = tags_filter if tags_filter else sorted(present)
+    tags = [t for t in tags if t in present]
+    codes = [tag_code[t] for t in tags]
 
     os.makedirs(args.out_dir, exist_ok=True)
+    figures = FigureSet(args.out_dir)
+
+    accuracy = np.asarray(cols["accuracy"])
+    wer = np.asarray(cols["wer"])
+    order, starts, ends = order_by_tag_time(cols["tag"], cols["createdAt"])
+
+    def rows_for(code):
+        """Row indices of one tag in createdAt order."""
+        return order[starts[code]:ends[code]]
+
+    def finite(vals):
+        return vals[~np.isnan(vals)]
+
+    # Bootstrap CIs and permutation p-values per participant
+    latency = np.asarray(cols["latencyMs"])
+    stat_jobs = {}
+    for tag, code in zip(tags, codes):
+        rows = rows_for(code)
+        stat_jobs[(tag, "accuracy")] = ("ci", finite(accuracy[rows]))
+        stat_jobs[(tag, "wer")] = ("ci", finite(wer[rows]))
+        stat_jobs[(tag, "latencyMs")] = ("ci", finite(latency[rows]))
+        half = len(rows) // 2
+        if half == 0:
+            continue
+        first, second = rows[:half], rows[-half:]
+        for metric, vals in (("accuracy", accuracy), ("wer", wer)):
+            stat_jobs[(tag, f"{metric}FirstHalf")] = ("ci", finite(vals[first]))
+            stat_jobs[(tag, f"{metric}SecondHalf")] = ("ci", finite(vals[second]))
+            stat_jobs[(tag, f"{metric}Delta")] = ("diff", finite(vals[first]), finite(vals[second]))
+    stats, computed = {}, 0
+    if args.resamples > 0:
+        stats, computed = compute_stats(stat_jobs, args.resamples, os.path.join(args.out_dir, STATS_CACHE_NAME))
+        summary = {"resamples": args.resamples, "alpha": 0.05, "participants": {}}
+        for (tag, name), val in stats.items():
+            summary["participants"].setdefault(tag, {})[name] = val
+        with open(os.path.join(args.out_dir, "stats_summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+
+    def ci_list(name, tag_list):
+        if not stats:
+            return None
+        return [interval(stats.get((t, name))) for t in tag_list]
 
     # WER chart
-    wer_vals = [mean([a.get("wer") for a in attempts_by_tag[t]]) or 0 for t in tags]
+    wer_means = group_nanmean(cols["tag"], wer, n_tags)
+    wer_vals = [or_zero(wer_means[c]) for c in codes]
     if wer_vals:
-        bar_chart_svg(
+        figures.add(
+            bar_chart_svg,
             "Average WER by Participant",
             tags,
             wer_vals,
             "WER",
-            os.path.join(args.out_dir, "wer_by_participant.svg"),
+            "wer_by_participant.svg",
             value_fmt="{:.2f}",
+            errors=ci_list("wer", tags),
         )
 
     # Latency chart (client)
-    lat_vals = [mean([a.get("latencyMs") for a in attempts_by_tag[t]]) or 0 for t in tags]
+    lat_means = group_nanmean(cols["tag"], cols["latencyMs"], n_tags)
+    lat_vals = [or_zero(lat_means[c]) for c in codes]
     if lat_vals:
-        bar_chart_svg(
+        figures.add(
+            bar_chart_svg,
             "Average Client Latency by Participant (ms)",
             tags,
             lat_vals,
             "Latency (ms)",
-            os.path.join(args.out_dir, "latency_by_participant.svg"),
+            "latency_by_participant.svg",
             value_fmt="{:.0f}",
+            errors=ci_list("latencyMs", tags),
         )
 
     # Feedback avg chart
@@ -301,104 +522,130 @@ def main():
             ratings.extend([f.get(key) for f in fb if isinstance(f.get(key), (int, float))])
         fb_vals.append(mean(ratings) or 0)
     if fb_vals:
-        bar_chart_svg(
+        figures.add(
+            bar_chart_svg,
             "Average Feedback Rating by Participant",
             fb_tags,
             fb_vals,
             "Rating (1-5)",
-            os.path.join(args.out_dir, "feedback_by_participant.svg"),
+            "feedback_by_participant.svg",
             value_fmt="{:.2f}",
         )
 
     # Accuracy and WER over attempts (per participant)
-    for tag in tags:
-        rows = sorted(attempts_by_tag[tag], key=lambda r: parse_dt(r.get("createdAt")) or datetime.min)
-        acc_vals = [r.get("accuracy") for r in rows if isinstance(r.get("accuracy"), (int, float))]
-        wer_vals = [r.get("wer") for r in rows if isinstance(r.get("wer"), (int, float))]
+    for tag, code in zip(tags, codes):
+        rows = rows_for(code)
+        acc = accuracy[rows]
+        acc_vals = acc[~np.isnan(acc)].tolist()
+        w = wer[rows]
+        wer_vals = w[~np.isnan(w)].tolist()
         if acc_vals:
-            line_chart_svg(
+            figures.add(
+                line_chart_svg,
                 f"Accuracy Over Attempts ({tag})",
                 acc_vals,
                 "Accuracy",
-                os.path.join(args.out_dir, f"accuracy_over_attempts_{tag}.svg"),
+                f"accuracy_over_attempts_{tag}.svg",
                 value_fmt="{:.2f}",
                 y_min=0.0,
                 y_max=1.0,
             )
         if wer_vals:
-            line_chart_svg(
+            figures.add(
+                line_chart_svg,
                 f"WER Over Attempts ({tag})",
                 wer_vals,
                 "WER",
-                os.path.join(args.out_dir, f"wer_over_attempts_{tag}.svg"),
+                f"wer_over_attempts_{tag}.svg",
                 value_fmt="{:.2f}",
             )
 
+    tag_col = np.asarray(cols["tag"])
+    selected = np.isin(tag_col, np.asarray(codes, dtype=np.int32))
+    tag_rank = np.full(n_tags, len(codes), dtype=np.int64)
+    tag_rank[codes] = np.arange(len(codes))
+
+    def in_tag_order(attempt_idx, values):
+        """Values of selected attempts ordered by tag, then export order."""
+        attempt_idx = np.asarray(attempt_idx)
+        keep = selected[attempt_idx]
+        ranks = tag_rank[tag_col[attempt_idx[keep]]]
+        return np.asarray(values)[keep][np.argsort(ranks, kind="stable")]
+
     # Error type distribution (overall)
-    status_counts = Counter()
-    for tag in tags:
-        for a in attempts_by_tag[tag]:
-            for w in a.get("words") or []:
-                if isinstance(w, dict):
-                    st = w.get("status")
-                    if st:
-                        status_counts[st] += 1
-    if status_counts:
-        labels = list(status_counts.keys())
-        values = [status_counts[k] for k in labels]
-        bar_chart_svg(
+    word_status = in_tag_order(cols["word_attempt"], cols["word_status"])
+    word_counts = group_count(word_status, len(meta["statuses"]))
+    status_order = first_seen(word_status)
+    if status_order.size:
+        labels = [meta["statuses"][i] for i in status_order]
+        values = [int(word_counts[i]) for i in status_order]
+        figures.add(
+            bar_chart_svg,
             "Error Type Counts (All Participants)",
             labels,
             values,
             "Count",
-            os.path.join(args.out_dir, "error_type_counts.svg"),
+            "error_type_counts.svg",
             value_fmt="{:.0f}",
         )
 
     # Top hard words (overall)
-    hard_counts = Counter()
-    for tag in tags:
-        for a in attempts_by_tag[tag]:
-            for w in a.get("hardWords") or []:
-                if w:
-                    hard_counts[str(w).lower()] += 1
-    if hard_counts:
-        top = hard_counts.most_common(8)
-        labels = [w for w, _ in top]
-        values = [c for _, c in top]
-        bar_chart_svg(
+    hard_word = in_tag_order(cols["hard_attempt"], cols["hard_word"])
+    hard_counts = group_count(hard_word, len(meta["hardWords"]))
+    hard_order = first_seen(hard_word)
+    if hard_order.size:
+        # stable sort keeps first-seen order among ties, like Counter.most_common
+        top = hard_order[np.argsort(-hard_counts[hard_order], kind="stable")][:8]
+        labels = [meta["hardWords"][i] for i in top]
+        values = [int(hard_counts[i]) for i in top]
+        figures.add(
+            bar_chart_svg,
             "Most Mispronounced Words (All Participants)",
             labels,
             values,
             "Count",
-            os.path.join(args.out_dir, "hard_words_top.svg"),
+            "hard_words_top.svg",
             value_fmt="{:.0f}",
         )
 
-    # First half vs second half accuracy (per participant)
+    # First half vs second half (per participant)
     deltas = []
-    for tag in tags:
-        rows = sorted(attempts_by_tag[tag], key=lambda r: parse_dt(r.get("createdAt")) or datetime.min)
+    acc_first = []
+    acc_second = []
+    wer_first = []
+    wer_second = []
+    half_tags = []
+    for tag, code in zip(tags, codes):
+        rows = rows_for(code)
         half = len(rows) // 2
         if half == 0:
             continue
+        half_tags.append(tag)
         first = rows[:half]
         second = rows[-half:]
-        acc_first = mean([r.get("accuracy") for r in first])
-        acc_second = mean([r.get("accuracy") for r in second])
-        if acc_first is None or acc_second is None:
-            continue
-        deltas.append((tag, acc_second - acc_first))
+        a1, a2 = nanmean(accuracy[first]), nanmean(accuracy[second])
+        if a1 is not None and a2 is not None:
+            deltas.append((tag, a2 - a1))
+        acc_first.append(or_zero(a1))
+        acc_second.append(or_zero(a2))
+        wer_first.append(or_zero(nanmean(wer[first])))
+        wer_second.append(or_zero(nanmean(wer[second])))
+
     if deltas:
-        labels = [t for t, _ in deltas]
+        labels = []
+        for t, _ in deltas:
+            d = stats.get((t, "accuracyDelta"))
+            labels.append(f"{t} (p={d['p']:.3f})" if d else t)
         values = [v for _, v in deltas]
-        bar_chart_svg(
+        figures.add(
+            bar_chart_svg,
             "Accuracy Improvement (Second Half - First Half)",
             labels,
             values,
             "Accuracy Delta",
-            os.path.join(args.out_dir, "accuracy_improvement.svg"),
+            "accuracy_improvement.svg",
             value_fmt="{:.2f}",
+            errors=ci_list("accuracyDelta", [t for t, _ in deltas]),
         )
 
     # Feedback issues counts (if any)
@@ -411,62 +658,52 @@ def main():
     if issues:
         labels = list(issues.keys())
         values = [issues[k] for k in labels]
-        bar_chart_svg(
+        figures.add(
+            bar_chart_svg,
             "Feedback Issues (All Participants)",
             labels,
             values,
             "Count",
-            os.path.join(args.out_dir, "feedback_issues.svg"),
+            "feedback_issues.svg",
             value_fmt="{:.0f}",
         )
 
-    # First half vs second half (accuracy and WER)
-    acc_first = []
-    acc_second = []
-    wer_first = []
-    wer_second = []
-    for tag in tags:
-        rows = sorted(attempts_by_tag[tag], key=lambda r: parse_dt(r.get("createdAt")) or datetime.min)
-        half = len(rows) // 2
-        if half == 0:
-            continue
-        first = rows[:half]
-        second = rows[-half:]
-        acc_first.append(mean([r.get("accuracy") for r in first]) or 0)
-        acc_second.append(mean([r.get("accuracy") for r in second]) or 0)
-        wer_first.append(mean([r.get("wer") for r in first]) or 0)
-        wer_second.append(mean([r.get("wer") for r in second]) or 0)
-
     if acc_first and acc_second:
-        grouped_bar_svg(
+        figures.add(
+            grouped_bar_svg,
             "Accuracy: First Half vs Second Half",
             tags,
             [
-                {"label": "first half", "values": acc_first},
-                {"label": "second half", "values": acc_second},
+                {"label": "first half", "values": acc_first, "errors": ci_list("accuracyFirstHalf", half_tags)},
+                {"label": "second half", "values": acc_second, "errors": ci_list("accuracySecondHalf", half_tags)},
             ],
             "Accuracy (0-1)",
-            os.path.join(args.out_dir, "accuracy_first_vs_second.svg"),
+            "accuracy_first_vs_second.svg",
             value_fmt="{:.2f}",
             y_min=0.0,
             y_max=1.0,
         )
 
     if wer_first and wer_second:
-        grouped_bar_svg(
+        figures.add(
+            grouped_bar_svg,
             "WER: First Half vs Second Half",
             tags,
             [
-                {"label": "first half", "values": wer_first},
-                {"label": "second half", "values": wer_second},
+                {"label": "first half", "values": wer_first, "errors": ci_list("werFirstHalf", half_tags)},
+                {"label": "second half", "values": wer_second, "errors": ci_list("werSecondHalf", half_tags)},
             ],
             "WER (0-1)",
-            os.path.join(args.out_dir, "wer_first_vs_second.svg"),
+            "wer_first_vs_second.svg",
             value_fmt="{:.2f}",
             y_min=0.0,
             y_max=max(1.0, max(wer_first + wer_second) * 1.1),
         )
 
+    built, skipped = figures.render(jobs=args.jobs, force=args.force)
+    print(f"figures: {built} rebuilt, {skipped} unchanged, {computed} statistics resampled "
+          f"in {time.perf_counter() - t0:.2f}s")
+
 
 if __name__ == "__main__":
     main()
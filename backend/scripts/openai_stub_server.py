@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stub for exercising lesson generation without network access.
+
+    python scripts/openai_stub_server.py --port 8089 --chunk-delay 0.02
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python app.py
+
+Serves POST /v1/chat/completions (plain and stream=true). The reply is the mock lesson
+plan for the request params, so streamed sections can be checked against /api/lessons/generate.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from lesson_builder import _build_mock_plan  # noqa: E402
+
+
+def plan_json(messages):
+    params = {}
+    for m in messages or []:
+        if m.get("role") == "user":
+            try:
+                params = json.loads(m.get("content") or "{}")
+            except ValueError:
+                params = {}
+    plan = _build_mock_plan(params)
+    plan.pop("source", None)
+    # sections first, like the prompt asks, so they can stream early
+    ordered = {"sections": plan.pop("sections")}
+    ordered.update(plan)
+    return json.dumps(ordered)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    chunk_size = 24
+    chunk_delay = 0.02
+    first_token_delay = 0.2
+
+    def log_message(self, fmt, *args):
+        sys.stderr.write("stub: " + (fmt % args) + "\n")
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "bad json"}})
+            return
+
+        content = plan_json(req.get("messages"))
+        model = req.get("model") or "stub"
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        time.sleep(self.first_token_delay)
+
+        if not req.get("stream"):
+            self._send_json(200, {
+                "id": cid,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(delta, finish=None):
+            chunk = {
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send({"role": "assistant", "content": ""})
+        for i in range(0, len(content), self.chunk_size):
+            send({"content": content[i:i + self.chunk_size]})
+            time.sleep(self.chunk_delay)
+        send({}, finish="stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server for lesson generation.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--chunk-size", type=int, default=24, help="Characters per streamed delta")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Seconds between deltas")
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="Seconds before the first byte")
+    args = parser.parse_args()
+
+    StubHandler.chunk_size = max(1, args.chunk_size)
+    StubHandler.chunk_delay = max(0.0, args.chunk_delay)
+    StubHandler.first_token_delay = max(0.0, args.first_token_delay)
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"openai stub listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Columnar cache for exported attempts.
+
+One streaming pass over attempts_export.ndjson[.gz] writes a directory of .npy columns:
+
+    accuracy, wer, latencyMs, serverLatencyMs   float64, NaN when missing
+    createdAt                                   float64 epoch seconds, NaN when missing
+    tag                                         int32 code into meta["tags"], -1 when missing
+    word_attempt, word_status                   flattened words[] (row index, code into meta["statuses"])
+    hard_attempt, hard_word                     flattened hardWords[] (row index, code into meta["hardWords"])
+
+Each column is a plain .npy so it can be opened with np.load(mmap_mode="r") and only
+the columns a script touches are paged in. meta.json holds the vocabularies and a
+fingerprint of the source file so stale caches are rebuilt automatically.
+
+    python scripts/study_columns.py data/attempts_export.ndjson --cache-dir data/attempts_columns
+"""
+import argparse
+import gzip
+import json
+import os
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+
+CACHE_VERSION = 1
+FLOAT_FIELDS = ("accuracy", "wer", "latencyMs", "serverLatencyMs")
+COLUMNS = FLOAT_FIELDS + (
+    "createdAt", "tag", "word_attempt", "word_status", "hard_attempt", "hard_word",
+)
+
+
+def norm_tag(val):
+    return str(val or "").strip().lower()
+
+
+def iter_rows(path):
+    """Yield rows from NDJSON (optionally .gz) or a legacy JSON array."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        if ".ndjson" not in path:
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def to_epoch(val):
+    if not val:
+        return float("nan")
+    try:
+        dt = datetime.fromisoformat(str(val))
+    except ValueError:
+        return float("nan")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def as_float(val):
+    if isinstance(val, bool) or not isinstance(val, (int, float)):
+        return float("nan")
+    return float(val)
+
+
+def source_fingerprint(path):
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class _Vocab:
+    def __init__(self):
+        self.codes = {}
+        self.items = []
+
+    def code(self, key):
+        c = self.codes.get(key)
+        if c is None:
+            c = self.codes[key] = len(self.items)
+            self.items.append(key)
+        return c
+
+
+def build_cache(attempts_path, cache_dir):
+    """Stream attempts into typed column buffers and write them out. Returns meta."""
+    floats = {k: array("d") for k in FLOAT_FIELDS}
+    created = array("d")
+    tag_codes = array("i")
+    word_attempt, word_status = array("i"), array("b")
+    hard_attempt, hard_word = array("i"), array("i")
+    tags, statuses, hard_words = _Vocab(), _Vocab(), _Vocab()
+
+    n = 0
+    for row in iter_rows(attempts_path):
+        for k in FLOAT_FIELDS:
+            floats[k].append(as_float(row.get(k)))
+        created.append(to_epoch(row.get("createdAt")))
+        tag = norm_tag(row.get("studyTag"))
+        tag_codes.append(tags.code(tag) if tag else -1)
+        for w in row.get("words") or []:
+            if isinstance(w, dict) and w.get("status"):
+                word_attempt.append(n)
+                word_status.append(statuses.code(w["status"]))
+        for w in row.get("hardWords") or []:
+            if w:
+                hard_attempt.append(n)
+                hard_word.append(hard_words.code(str(w).lower()))
+        n += 1
+
+    if len(statuses.items) > 127:
+        raise ValueError("too many distinct word statuses for int8 codes")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    arrays = {k: np.frombuffer(floats[k], dtype=np.float64) for k in FLOAT_FIELDS}
+    arrays["createdAt"] = np.frombuffer(created, dtype=np.float64)
+    arrays["tag"] = np.frombuffer(tag_codes, dtype=np.int32)
+    arrays["word_attempt"] = np.frombuffer(word_attempt, dtype=np.int32)
+    arrays["word_status"] = np.frombuffer(word_status, dtype=np.int8)
+    arrays["hard_attempt"] = np.frombuffer(hard_attempt, dtype=np.int32)
+    arrays["hard_word"] = np.frombuffer(hard_word, dtype=np.int32)
+    for name, arr in arrays.items():
+        np.save(os.path.join(cache_dir, f"{name}.npy"), arr)
+
+    meta = {
+        "version": CACHE_VERSION,
+        "rows": n,
+        "tags": tags.items,
+        "statuses": statuses.items,
+        "hardWords": hard_words.items,
+        "source": source_fingerprint(attempts_path),
+    }
+    tmp = os.path.join(cache_dir, "meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=True)
+    # meta last, so a half-written cache never looks fresh
+    os.replace(tmp, os.path.join(cache_dir, "meta.json"))
+    return meta
+
+
+def load_meta(cache_dir):
+    path = os.path.join(cache_dir, "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def ensure_cache(attempts_path, cache_dir):
+    """Return meta for an up-to-date cache, rebuilding it when the source changed."""
+    meta = load_meta(cache_dir)
+    if (meta and meta.get("version") == CACHE_VERSION
+            and meta.get("source") == source_fingerprint(attempts_path)):
+        return meta
+    return build_cache(attempts_path, cache_dir)
+
+
+def load_columns(cache_dir, names, mmap=True):
+    """Open the requested columns; memory-mapped by default."""
+    out = {}
+    for name in names:
+        if name not in COLUMNS:
+            raise KeyError(f"unknown column: {name}")
+        out[name] = np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode="r" if mmap else None)
+    return out
+
+
+def group_count(codes, n_groups, mask=None):
+    codes = np.asarray(codes)
+    if mask is not None:
+        codes = codes[mask]
+    codes = codes[codes >= 0]
+    return np.bincount(codes, minlength=n_groups)
+
+
+def first_seen(codes):
+    """Distinct codes in order of first appearance (Counter insertion order)."""
+    uniq, first = np.unique(np.asarray(codes), return_index=True)
+    return uniq[np.argsort(first, kind="stable")]
+
+
+def group_nanmean(codes, values, n_groups):
+    """Per-group mean ignoring NaN; groups without values are NaN."""
+    codes = np.asarray(codes)
+    values = np.asarray(values, dtype=np.float64)
+    ok = (codes >= 0) & ~np.isnan(values)
+    sums = np.bincount(codes[ok], weights=values[ok], minlength=n_groups)
+    counts = np.bincount(codes[ok], minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def order_by_tag_time(tag, created):
+    """Row order grouped by tag, each group sorted by createdAt (missing first), plus group bounds."""
+    created = np.asarray(created, dtype=np.float64)
+    order = np.lexsort((np.where(np.isnan(created), -np.inf, created), tag))
+    sorted_tags = np.asarray(tag)[order]
+    n_groups = int(sorted_tags.max()) + 1 if sorted_tags.size else 0
+    starts = np.searchsorted(sorted_tags, np.arange(n_groups), side="left")
+    ends = np.searchsorted(sorted_tags, np.arange(n_groups), side="right")
+    return order, starts, ends
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the columnar cache for exported attempts.")
+    parser.add_argument("attempts", nargs="?", default="data/attempts_export.ndjson")
+    parser.add_argument("--cache-dir", default="data/attempts_columns")
+    args = parser.parse_args()
+    meta = build_cache(args.attempts, args.cache_dir)
+    print("columns", {"rows": meta["rows"], "tags": len(meta["tags"]), "dir": args.cache_dir})
+
+
+if __name__ == "__main__":
+    main()
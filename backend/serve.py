@@ -0,0 +1,193 @@
+# backend/serve.py
+"""
+Production entry point: gunicorn with the models loaded once in the master.
+- `python serve.py` loads Whisper and the accent classifier in the master process, freezes
+  the heap (gc.freeze) and then forks the workers. The weights are never written after
+  loading, so workers share those pages copy-on-write instead of each holding a copy.
+- With several Whisper sizes (WHISPER_MODELS, see whisper_registry.py) only WHISPER_PRELOAD
+  is loaded in the master; the others load lazily in each worker, within its budget.
+- Everything that owns sockets or threads (Firestore/gRPC client, lesson prefetch pool,
+  transcribe slots, metrics registry) is still built per worker by create_app().
+  Nothing runs inference in the master: CTranslate2 and torch thread pools must not be
+  started before the fork.
+- Worker count: WEB_CONCURRENCY when set; otherwise one worker per usable core, capped
+  by how many fit in MemAvailable (WEB_MEM_FRACTION, default 0.8) at WORKER_MEM_MB
+  (default 400) of private memory each. With PRELOAD_MODELS=0 every worker loads its
+  own models and the measured model footprint is added to each worker's cost.
+- Threads: each library's thread count comes from one per-worker budget (see
+  thread_budget.py); THREAD_PIN=1 also pins every worker to its own slice of cores.
+- Each worker logs its RSS / PSS / shared / private memory once it has loaded the app;
+  PSS is the fair-share figure that shows the copy-on-write saving.
+- SERVER_MODE=asgi runs uvicorn workers with the ASGI bridge from streaming.py, so open
+  SSE streams cost no thread while they wait. The default (wsgi) runs gthread workers
+  with WEB_THREADS (default 4) threads each.
+- PORT (default 5050), WEB_TIMEOUT (default 120), WEB_MAX_REQUESTS (default 0,
+  off) recycles workers after that many requests.
+Settings are read from the environment, after backend/.env is loaded (existing variables win).
+Note: /metrics and /api/admin/memory describe the worker that answered the request.
+"""
+
+import gc
+import logging
+import os
+import sys
+import time
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+# before any module reads its settings: the worker count, thread budget and model
+# preload below all come from the environment, and create_app() loads .env too late
+load_dotenv(os.path.join(BASE_DIR, ".env"))
+
+import app as app_module  # noqa: E402
+import thread_budget  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _truthy(name: str, default: str = "1") -> bool:
+    return (os.environ.get(name) or default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def mem_available() -> Optional[int]:
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def memory_rollup(pid: str = "self") -> Dict[str, int]:
+    """RSS, PSS and the shared/private split of a process, in bytes (Linux only)."""
+    out: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                parts = rest.split()
+                if len(parts) == 2 and parts[1] == "kB":
+                    out[key] = int(parts[0]) * 1024
+    except (OSError, ValueError):
+        return out
+    return {
+        "rss": out.get("Rss", 0),
+        "pss": out.get("Pss", 0),
+        "shared": out.get("Shared_Clean", 0) + out.get("Shared_Dirty", 0),
+        "private": out.get("Private_Clean", 0) + out.get("Private_Dirty", 0),
+    }
+
+
+def _fmt_mem(m: Dict[str, int]) -> str:
+    if not m:
+        return "unavailable"
+    return " ".join(f"{k}={v / MB:.0f}MB" for k, v in m.items())
+
+
+def worker_count(model_bytes: int, preloaded: bool) -> int:
+    forced = _env_int("WEB_CONCURRENCY", 0)
+    if forced > 0:
+        logging.info("workers=%d (WEB_CONCURRENCY)", forced)
+        return forced
+    cores = thread_budget.usable_cores()
+    per_worker = max(1, _env_int("WORKER_MEM_MB", 400)) * MB
+    if not preloaded:
+        per_worker += model_bytes
+    avail = mem_available()
+    mem_cap = cores
+    if avail is not None:
+        mem_cap = max(1, int(avail * _env_float("WEB_MEM_FRACTION", 0.8)) // per_worker)
+    workers = max(1, min(cores, mem_cap))
+    logging.info("workers=%d (cores=%d, memAvailable=%s, perWorker=%.0fMB, models=%.0fMB %s)",
+                 workers, cores, f"{avail / MB:.0f}MB" if avail is not None else "?", per_worker / MB,
+                 model_bytes / MB, "shared" if preloaded else "per worker")
+    return workers
+
+
+class Server(BaseApplication):
+    def __init__(self):
+        self.preload = _truthy("PRELOAD_MODELS")
+        self.models = None
+        self.mode = (os.environ.get("SERVER_MODE") or "wsgi").strip().lower()
+        # decided before the models load: WhisperModel fixes its thread count at construction
+        self.workers = worker_count(_env_int("MODEL_MEM_MB", 600) * MB, self.preload)
+        os.environ["THREAD_BUDGET_WORKERS"] = str(self.workers)
+        os.environ["THREAD_BUDGET_CORES"] = str(thread_budget.usable_cores())
+        if self.preload:
+            app_module.setup_logging()
+            before = memory_rollup().get("rss", 0)
+            t0 = time.perf_counter()
+            self.models = app_module.load_models()
+            # keep the loaded objects out of the workers' GC passes, which would otherwise
+            # write to their headers and un-share the pages
+            gc.collect()
+            gc.freeze()
+            model_bytes = max(0, memory_rollup().get("rss", 0) - before)
+            logging.info("models preloaded in master pid=%d in %.1fs (+%.0fMB) %s", os.getpid(),
+                         time.perf_counter() - t0, model_bytes / MB, _fmt_mem(memory_rollup()))
+        super().__init__()
+
+    def load_config(self):
+        settings = {
+            "bind": f"0.0.0.0:{_env_int('PORT', 5050)}",
+            "workers": self.workers,
+            "worker_class": "uvicorn_worker.UvicornWorker" if self.mode == "asgi" else "gthread",
+            "threads": max(1, _env_int("WEB_THREADS", 4)),
+            "timeout": _env_int("WEB_TIMEOUT", 120),
+            "graceful_timeout": 30,
+            "max_requests": _env_int("WEB_MAX_REQUESTS", 0),
+            "max_requests_jitter": max(0, _env_int("WEB_MAX_REQUESTS", 0) // 10),
+            "post_worker_init": _report_worker,
+            "pre_fork": self._assign_slot,
+            "post_fork": self._pin_worker,
+        }
+        for key, value in settings.items():
+            self.cfg.set(key, value)
+
+    def _assign_slot(self, arbiter, worker):
+        # in the master: the lowest core slice no live worker holds (replacements reuse it)
+        taken = {getattr(w, "pin_slot", None) for w in arbiter.WORKERS.values()}
+        worker.pin_slot = next(i for i in range(len(taken) + 1) if i not in taken)
+
+    def _pin_worker(self, arbiter, worker):
+        cpus = thread_budget.pin(worker.pin_slot, self.workers)
+        if cpus is not None:
+            logging.info("worker pid=%d pinned to cpus %s", os.getpid(), cpus)
+
+    def load(self):
+        # runs in each worker after the fork; models come from the master's memory
+        flask_app = app_module.create_app(models=self.models)
+        if self.mode == "asgi":
+            from streaming import ASGIBridge
+            return ASGIBridge(flask_app)
+        return flask_app
+
+
+def _report_worker(worker):
+    logging.info("worker ready pid=%d %s", os.getpid(), _fmt_mem(memory_rollup()))
+
+
+if __name__ == "__main__":
+    Server().run()
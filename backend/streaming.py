@@ -0,0 +1,412 @@
+# backend/streaming.py
+"""
+ASGI bridge for the Flask app, so SSE streams do not pin a thread while they wait.
+- Request bodies are read on the event loop, then the Flask view runs on a small request
+  pool (ASGI_REQUEST_THREADS, default 8) and returns right away. Plain responses are sent
+  as they are.
+- A text/event-stream body is not iterated on the request pool. A view that calls
+  mark_stream(queue, trace) has its generator run through queue.submit(), i.e. on the
+  compute pool, which the model slots schedule. Streams queued behind a busy model hold no
+  thread at all. Other streams (lesson generation) run on the I/O pool
+  (SSE_IO_THREADS, default 16).
+- The generator pushes events into a per-stream buffer on the event loop and never waits
+  for the client. Each send is awaited, so the server's flow control holds back a slow
+  reader. When SSE_BUFFER_EVENTS (default 64) events are pending, the oldest progress
+  event is dropped; done, error and reset are never dropped. A client that accepts
+  nothing for SSE_SEND_TIMEOUT_S (default 30) is disconnected.
+- A `heartbeat` event goes out after SSE_HEARTBEAT_S (default 15) seconds with nothing
+  to send. Its state is "queued" or "running" plus the elapsed time, which keeps proxies
+  from timing out idle streams and shows the client it is still in line.
+- Cancellation: a streaming view takes a CancelToken from cancel_token(stages). The
+  bridge cancels it when the client disconnects or is cut off. Under a WSGI server the
+  token instead peeks at the client socket (gunicorn.socket / werkzeug.socket). A job
+  still queued for the compute pool is dropped without running. A running one stops at
+  its next check. cancelled_work_total{endpoint,stage} counts where work stopped.
+  cancelled_cpu_seconds_saved_total estimates the compute skipped: what was left of the
+  interrupted stage, plus the mean duration of each later stage. Work that coalesced
+  duplicates are still waiting for is not cancelled (see coalesce.py).
+Run it with `uvicorn asgi:app` or `SERVER_MODE=asgi python serve.py`.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+STREAM_KEY = "pronunciation.stream"
+CANCEL_KEY = "pronunciation.cancel"
+SOCKET_POLL_S = 0.25
+_KEEP_EVENTS = (b"event: done", b"event: error", b"event: reset")
+
+SSE_OPEN = metrics.gauge("sse_streams_open", "SSE streams currently open, by state.", ("state",))
+SSE_DROPPED = metrics.counter("sse_events_dropped_total", "Progress events dropped for slow clients.")
+SSE_HEARTBEATS = metrics.counter("sse_heartbeats_total", "Heartbeat events sent.")
+SSE_ABORTED = metrics.counter("sse_streams_aborted_total", "Streams ended early, by reason.", ("reason",))
+CANCELLED = metrics.counter("cancelled_work_total", "Streams whose work stopped because the client left.",
+                            ("endpoint", "stage"))
+CPU_SAVED = metrics.counter("cancelled_cpu_seconds_saved_total",
+                            "Estimated compute seconds skipped by cancelling abandoned streams.", ("endpoint",))
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def mark_stream(queue=None, trace=None, work=None, priority="interactive"):
+    """
+    Called from a streaming view: run this response's generator through queue.submit()
+    (compute-bound streams) instead of the I/O pool, scheduled by work and priority.
+    A no-op under a WSGI server.
+    """
+    from flask import request
+
+    request.environ[STREAM_KEY] = {"queue": queue, "trace": trace, "work": work, "priority": priority}
+
+
+def _peer_closed(sock) -> bool:
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+    except (BlockingIOError, InterruptedError):
+        return False
+    except ConnectionError:
+        return True
+    except (OSError, ValueError):
+        # TLS sockets refuse MSG_PEEK; closed ones raise. Neither tells us anything.
+        return False
+
+
+class CancelToken:
+    """Set once the client of a stream has gone away; the stream's work polls it."""
+
+    def __init__(self, endpoint: str, stages=(), sock=None):
+        self.endpoint = endpoint
+        self.stages = tuple(stages)
+        self.sock = sock
+        self.event = threading.Event()
+        self.checked_at = 0.0
+        self.recorded = False
+        self.lock = threading.Lock()
+        # set by coalesce.py: true while other clients still wait for this work's result
+        self.keepalive: Optional[Callable[[], bool]] = None
+
+    def cancel(self):
+        self.event.set()
+
+    def cancelled(self) -> bool:
+        if not self.event.is_set() and self.sock is not None:
+            now = time.monotonic()
+            if now - self.checked_at >= SOCKET_POLL_S:
+                self.checked_at = now
+                if _peer_closed(self.sock):
+                    self.event.set()
+        if self.event.is_set() and self.keepalive is not None and self.keepalive():
+            return False
+        return self.event.is_set()
+
+    def record(self, stage: str, remaining: Optional[float] = None):
+        """
+        Count the work as cancelled during (or just before) `stage`. `remaining` is the
+        estimated seconds left of that stage; when None the stage's mean is used. Stages
+        after it count at their mean. Only the first call counts.
+        """
+        with self.lock:
+            if self.recorded:
+                return
+            self.recorded = True
+        if stage in self.stages:
+            later = self.stages[self.stages.index(stage) + 1:]
+            saved = remaining if remaining is not None else (metrics.STAGE_DURATION.mean(stage=stage) or 0.0)
+        else:
+            # "queued": none of the stages had started
+            later, saved = self.stages, 0.0
+        saved += sum(metrics.STAGE_DURATION.mean(stage=s) or 0.0 for s in later)
+        CANCELLED.inc(endpoint=self.endpoint, stage=stage)
+        CPU_SAVED.inc(saved, endpoint=self.endpoint)
+        logging.info("stream cancelled endpoint=%s stage=%s saved=%.2fs", self.endpoint, stage, saved)
+
+
+def cancel_token(stages=()) -> CancelToken:
+    """Called from a streaming view; `stages` are the compute stages still ahead of it."""
+    from flask import request
+
+    rule = request.url_rule
+    env = request.environ
+    token = CancelToken(rule.rule if rule is not None else request.path, stages,
+                        env.get("gunicorn.socket") or env.get("werkzeug.socket"))
+    env[CANCEL_KEY] = token
+    return token
+
+
+class _Stream:
+    """Per-stream buffer shared by the producer thread (via the loop) and the writer."""
+
+    def __init__(self, limit: int):
+        self.limit = max(2, limit)
+        self.chunks: deque = deque()
+        self.ready = asyncio.Event()
+        self.finished = False
+        self.state = "queued"
+        self.dropped = 0
+
+    def push(self, chunk: bytes):
+        if len(self.chunks) >= self.limit:
+            for i, old in enumerate(self.chunks):
+                if not old.startswith(_KEEP_EVENTS):
+                    del self.chunks[i]
+                    self.dropped += 1
+                    SSE_DROPPED.inc()
+                    break
+        self.chunks.append(chunk)
+        self.ready.set()
+
+    def start(self):
+        self.state = "running"
+        self.ready.set()
+
+    def finish(self):
+        self.finished = True
+        self.ready.set()
+
+
+class ASGIBridge:
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self.max_body = flask_app.config.get("MAX_CONTENT_LENGTH")
+        self.request_pool = ThreadPoolExecutor(max_workers=max(1, _env_int("ASGI_REQUEST_THREADS", 8)),
+                                               thread_name_prefix="asgi-request")
+        self.io_pool = ThreadPoolExecutor(max_workers=max(1, _env_int("SSE_IO_THREADS", 16)),
+                                          thread_name_prefix="sse-io")
+        self.heartbeat_s = max(0.5, _env_float("SSE_HEARTBEAT_S", 15.0))
+        self.send_timeout_s = max(1.0, _env_float("SSE_SEND_TIMEOUT_S", 30.0))
+        self.buffer_events = _env_int("SSE_BUFFER_EVENTS", 64)
+        for state in ("queued", "running"):
+            SSE_OPEN.set(0, state=state)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        body, too_large = await self._read_body(scope, receive)
+        environ = self._environ(scope, body, too_large)
+        loop = asyncio.get_running_loop()
+        status, headers, chunks, body_iter = await loop.run_in_executor(self.request_pool, self._call_wsgi, environ)
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        if body_iter is None:
+            await send({"type": "http.response.body", "body": b"".join(chunks)})
+            return
+        await self._stream(environ, body_iter, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.request_pool.shutdown(wait=False)
+                self.io_pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # ---------- request ----------
+
+    async def _read_body(self, scope, receive) -> Tuple[bytes, bool]:
+        parts: List[bytes] = []
+        size = 0
+        too_large = False
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if self.max_body is not None and size > self.max_body:
+                # keep draining so the client sees the 413 instead of a reset
+                too_large = True
+            elif chunk:
+                parts.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(parts), too_large
+
+    def _environ(self, scope, body: bytes, too_large: bool) -> Dict[str, Any]:
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": str(server[0]),
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": str(client[0]),
+            "REMOTE_PORT": str(client[1]),
+            "CONTENT_LENGTH": str(self.max_body + 1 if too_large else len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for raw_name, raw_value in scope.get("headers", []):
+            name = raw_name.decode("latin-1").upper().replace("-", "_")
+            value = raw_value.decode("latin-1")
+            if name == "CONTENT_TYPE":
+                environ["CONTENT_TYPE"] = value
+                continue
+            if name == "CONTENT_LENGTH":
+                continue
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _call_wsgi(self, environ):
+        """Run the Flask view. Non-stream bodies are read here; stream bodies are handed back."""
+        started: Dict[str, Any] = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+        body_iter = self.app(environ, start_response)
+        content_type = dict(started["headers"]).get(b"content-type", b"")
+        if content_type.startswith(b"text/event-stream"):
+            return started["status"], started["headers"], None, body_iter
+        try:
+            chunks = list(body_iter)
+        finally:
+            if hasattr(body_iter, "close"):
+                body_iter.close()
+        return started["status"], started["headers"], chunks, None
+
+    # ---------- streaming ----------
+
+    @staticmethod
+    def _close(body_iter):
+        try:
+            if hasattr(body_iter, "close"):
+                body_iter.close()
+        except Exception:
+            logging.exception("closing an abandoned stream failed")
+
+    async def _stream(self, environ, body_iter, receive, send):
+        loop = asyncio.get_running_loop()
+        stream = _Stream(self.buffer_events)
+        t0 = time.perf_counter()
+
+        token = environ.get(CANCEL_KEY)
+        gone = threading.Event()
+
+        def produce():
+            loop.call_soon_threadsafe(stream.start)
+            try:
+                for chunk in body_iter:
+                    if chunk:
+                        loop.call_soon_threadsafe(stream.push, chunk)
+                    if gone.is_set():
+                        # closing the generator below raises GeneratorExit at its yield
+                        break
+            except Exception:
+                logging.exception("sse producer failed")
+            finally:
+                try:
+                    if hasattr(body_iter, "close"):
+                        body_iter.close()
+                finally:
+                    loop.call_soon_threadsafe(stream.finish)
+
+        job = environ.get(STREAM_KEY) or {}
+        queue = job.get("queue")
+        if queue is not None:
+            job_future = queue.submit(produce, job.get("trace"), job.get("work"),
+                                      job.get("priority") or "interactive")
+        else:
+            job_future = self.io_pool.submit(produce)
+
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    stream.ready.set()
+                    return
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        state = stream.state
+        SSE_OPEN.inc(state=state)
+        reason = None
+        try:
+            while True:
+                if stream.state != state:
+                    SSE_OPEN.dec(state=state)
+                    state = stream.state
+                    SSE_OPEN.inc(state=state)
+                if disconnected.is_set():
+                    reason = "client_disconnect"
+                    break
+                if stream.chunks:
+                    chunk = stream.chunks.popleft()
+                    try:
+                        await asyncio.wait_for(send({"type": "http.response.body", "body": chunk, "more_body": True}),
+                                               self.send_timeout_s)
+                    except asyncio.TimeoutError:
+                        reason = "slow_client"
+                        break
+                    continue
+                if stream.finished:
+                    break
+                stream.ready.clear()
+                try:
+                    await asyncio.wait_for(stream.ready.wait(), self.heartbeat_s)
+                except asyncio.TimeoutError:
+                    beat = {"state": stream.state, "elapsedMs": round((time.perf_counter() - t0) * 1000.0)}
+                    stream.push(f"event: heartbeat\ndata: {json.dumps(beat)}\n\n".encode("utf-8"))
+                    SSE_HEARTBEATS.inc()
+            if reason is None:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        except OSError:
+            reason = "client_disconnect"
+        finally:
+            SSE_OPEN.dec(state=state)
+            watcher.cancel()
+            if reason is not None:
+                gone.set()
+                # coalesced duplicates still wait for this job: keep it queued. The token is
+                # still cancelled; cancelled() stays false until the last of them has left.
+                kept = token is not None and token.keepalive is not None and token.keepalive()
+                if token is not None:
+                    token.cancel()
+                if not kept and job_future.cancel():
+                    # never started: nothing ran, but the response's close hooks still must
+                    if token is not None:
+                        token.record("queued")
+                    loop.run_in_executor(self.request_pool, self._close, body_iter)
+                SSE_ABORTED.inc(reason=reason)
+                logging.info("sse stream ended early path=%s reason=%s dropped=%d", environ.get("PATH_INFO"),
+                              reason, stream.dropped)
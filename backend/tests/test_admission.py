@@ -0,0 +1,64 @@
+"""Admission control (admission.py) against the load-test stub app: no models, no Firestore."""
+import argparse
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (BACKEND_DIR, os.path.join(BACKEND_DIR, "bench")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import loadtest  # noqa: E402
+
+ORIGIN = "http://localhost:3000"
+
+
+@pytest.fixture()
+def app(monkeypatch):
+    monkeypatch.setenv("ADMISSION_SLO_S", "1")
+    args = argparse.Namespace(clips="", target=loadtest.DEFAULT_TARGET, fs_read_ms=0, fs_write_ms=0,
+                              stub_base_ms=0, stub_rtf=0, stub_jitter=0, stub_mode="sleep", stub_fail_rate=0,
+                              seed=0, verbose=False)
+    return loadtest.build_stub_app(args, ["u1"])
+
+
+def shed(app):
+    # one request in a slot and a 5 s average service time: a new request would finish after the 1 s SLO
+    app.transcribe_queue.service_s = 5.0
+    app.admission.in_flight = app.transcribe_queue.slots
+
+
+@pytest.mark.parametrize("path", ["/api/assess", "/api/assess/stream"])
+def test_preflight_is_not_shed(app, path):
+    shed(app)
+    before = app.admission.in_flight
+    resp = app.test_client().options(path, headers={
+        "Origin": ORIGIN,
+        "Access-Control-Request-Method": "POST",
+        "Access-Control-Request-Headers": "authorization",
+    })
+    assert resp.status_code == 200
+    assert "Retry-After" not in resp.headers
+    assert resp.headers.get("Access-Control-Allow-Origin") == ORIGIN
+    assert app.admission.in_flight == before
+
+
+def test_post_is_shed_with_readable_retry_after(app):
+    shed(app)
+    resp = app.test_client().post("/api/assess", headers={"Origin": ORIGIN, "Authorization": "Bearer u1"})
+    assert resp.status_code == 503
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert "Retry-After" in resp.headers.get("Access-Control-Expose-Headers", "")
+    assert resp.get_json()["error"] == "overloaded"
+
+
+def test_preflight_allows_profiling_headers(app):
+    resp = app.test_client().options("/api/assess", headers={
+        "Origin": ORIGIN,
+        "Access-Control-Request-Method": "POST",
+        "Access-Control-Request-Headers": "authorization, x-profile, x-admin-token",
+    })
+    allowed = resp.headers.get("Access-Control-Allow-Headers", "").lower()
+    assert "x-profile" in allowed and "x-admin-token" in allowed
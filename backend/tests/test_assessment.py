@@ -0,0 +1,116 @@
+"""IncrementalScorer (assessment.py) gives the same result as the batch alignment it replaced."""
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from assessment import (IncrementalScorer, _build_ref_tokens, _enrich, _segment_words,  # noqa: E402
+                        process_assessment_from_whisper)
+
+VOCAB = ["the", "The", "cat", "cat,", "sat", "on", "mat", "mat.", "a", "dog", "—", "...", "ran", "\"on\""]
+
+
+def _align_ops(reference_words, hypothesis_words):
+    """The full-table alignment process_assessment_from_whisper used before IncrementalScorer."""
+    n, m = len(reference_words), len(hypothesis_words)
+    dp = [[0] * (m + 1) for _ in range(n + 1)]
+    op = [[None] * (m + 1) for _ in range(n + 1)]
+
+    for i in range(1, n + 1):
+        dp[i][0], op[i][0] = i, "del"
+    for j in range(1, m + 1):
+        dp[0][j], op[0][j] = j, "ins"
+
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            cost = 0 if reference_words[i - 1]["norm"] == hypothesis_words[j - 1]["norm"] else 1
+            choices = [
+                (dp[i - 1][j] + 1, "del"),
+                (dp[i][j - 1] + 1, "ins"),
+                (dp[i - 1][j - 1] + cost, "ok" if cost == 0 else "sub"),
+            ]
+            dp[i][j], op[i][j] = min(choices, key=lambda x: x[0])
+
+    i, j = n, m
+    statuses = [None] * m
+    while i > 0 or j > 0:
+        cur = op[i][j]
+        if cur == "ok":
+            statuses[j - 1] = ("correct", reference_words[i - 1]["orig"]); i -= 1; j -= 1
+        elif cur == "sub":
+            statuses[j - 1] = ("substitution", reference_words[i - 1]["orig"]); i -= 1; j -= 1
+        elif cur == "ins":
+            statuses[j - 1] = ("insertion", None); j -= 1
+        else:
+            statuses.insert(j, ("deletion", reference_words[i - 1]["orig"])); i -= 1
+    return statuses
+
+
+def _wer_errors(ref_tokens, hyp_norms):
+    n, m = len(ref_tokens), len(hyp_norms)
+    dp = [[0] * (m + 1) for _ in range(n + 1)]
+    for i in range(n + 1):
+        dp[i][0] = i
+    for j in range(m + 1):
+        dp[0][j] = j
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            cost = 0 if ref_tokens[i - 1]["norm"] == hyp_norms[j - 1] else 1
+            dp[i][j] = min(dp[i - 1][j] + 1, dp[i][j - 1] + 1, dp[i - 1][j - 1] + cost)
+    return dp[n][m]
+
+
+def batch_reference(target, segments):
+    words = [w for seg in segments for w in _segment_words(seg)]
+    ref_tokens = _build_ref_tokens(target)
+    wer_val = _wer_errors(ref_tokens, [w["norm"] for w in words if w["norm"]]) / max(1, len(ref_tokens))
+    accuracy = max(0.0, min(1.0, 1.0 - wer_val))
+    return {"accuracy": round(accuracy, 4), "wer": round(wer_val, 4),
+            "words": _enrich(_align_ops(ref_tokens, words), words)}
+
+
+def make_segments(rng, n_words, n_segments):
+    t = 0.0
+    segments = []
+    for _ in range(n_segments):
+        words = []
+        for _ in range(n_words):
+            words.append(SimpleNamespace(word=" " + rng.choice(VOCAB), start=t, end=t + 0.3,
+                                         probability=round(rng.random(), 3)))
+            t += 0.3
+        segments.append(SimpleNamespace(text=" ".join(w.word.strip() for w in words), words=words))
+    return segments
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_incremental_matches_batch_alignment(seed):
+    rng = random.Random(seed)
+    target = " ".join(rng.choice(VOCAB) for _ in range(rng.randint(0, 12)))
+    segments = make_segments(rng, rng.randint(0, 5), rng.randint(0, 4))
+    expected = batch_reference(target, segments)
+
+    scorer = IncrementalScorer(target)
+    for seg in segments:
+        scorer.add_segment(seg)  # provisional results must not disturb the final one
+    streamed = scorer.finish()
+    batch = process_assessment_from_whisper(target, segments)
+
+    for result in (streamed, batch):
+        assert {k: result[k] for k in expected} == expected
+    assert streamed == batch
+
+
+def test_provisional_follows_the_matched_prefix():
+    scorer = IncrementalScorer("the cat sat on the mat")
+    seg = SimpleNamespace(text="the cat", words=[SimpleNamespace(word=" the", start=0.0, end=0.2, probability=0.9),
+                                                  SimpleNamespace(word=" cat", start=0.2, end=0.5, probability=0.9)])
+    out = scorer.add_segment(seg)
+    assert out["covered"] == 2 and out["refWords"] == 6
+    assert out["accuracy"] == 1.0
+    assert [w["status"] for w in out["words"]] == ["correct", "correct"]
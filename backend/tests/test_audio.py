@@ -0,0 +1,44 @@
+"""OffsetMap (audio.py): Whisper timestamps on trimmed audio mapped back to the original recording."""
+import os
+import sys
+from collections import namedtuple
+from types import SimpleNamespace
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import audio  # noqa: E402
+
+SR = 10
+Word = namedtuple("Word", "start end word probability")
+
+
+def two_chunks():
+    # kept 1.0-3.0 s and 5.0-6.0 s of the original; trimmed time 2.0 is the cut
+    return audio.OffsetMap([(10, 30), (50, 60)], SR)
+
+
+def test_remap_segment_maps_words_across_a_cut():
+    words = [Word(0.5, 2.0, " hello", 0.9), Word(2.0, 2.5, " there", 0.8), Word(2.6, None, " you", 0.7)]
+    seg = SimpleNamespace(start=0.5, end=2.5, text="hello there you", words=words)
+    out = two_chunks().remap_segment(seg)
+
+    assert (out.start, out.end, out.text) == (1.5, 5.5, "hello there you")
+    # a word ending on the cut stays before it; one starting there begins after the gap
+    assert [(w.start, w.end) for w in out.words] == [(1.5, 3.0), (5.0, 5.5), (5.6, None)]
+    assert [(w.word, w.probability) for w in out.words] == [(" hello", 0.9), (" there", 0.8), (" you", 0.7)]
+    # the input is left as it was
+    assert (seg.start, seg.end) == (0.5, 2.5) and seg.words[1].start == 2.0
+
+
+def test_remap_segment_clamps_past_the_last_chunk():
+    seg = SimpleNamespace(start=2.8, end=4.0, words=None)
+    out = two_chunks().remap_segment(seg)
+    assert (out.start, out.end, out.words) == (5.8, 6.0, [])
+
+
+def test_remap_segment_is_identity_without_a_leading_cut():
+    seg = SimpleNamespace(start=0.5, end=1.0, words=[])
+    assert audio.OffsetMap([(0, 30)], SR).remap_segment(seg) is seg
+    assert audio.OffsetMap([], SR).remap_segment(seg) is seg
@@ -0,0 +1,168 @@
+"""Single-flight (coalesce.py): duplicate uploads share one run of the view."""
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+from flask import Flask, Response, jsonify
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import coalesce  # noqa: E402
+import streaming  # noqa: E402
+
+
+def wait_until(cond, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.01)
+
+
+def the_flight():
+    flights = list(coalesce.FLIGHTS.flights.values())
+    return flights[0] if len(flights) == 1 else None
+
+
+@pytest.fixture()
+def app(monkeypatch):
+    for name in ("COALESCE", "COALESCE_MAX_WAITING", "COALESCE_WAIT_S"):
+        monkeypatch.delenv(name, raising=False)
+    app = Flask(__name__)
+    app.runs = 0
+    app.release = threading.Event()
+    app.finish = True
+
+    @app.post("/api/json")
+    @coalesce.single_flight
+    def json_view():
+        app.runs += 1
+        app.release.wait(5)
+        return jsonify({"ok": True, "run": app.runs})
+
+    @app.post("/api/stream")
+    @coalesce.single_flight
+    def stream_view():
+        app.runs += 1
+        token = streaming.cancel_token()
+
+        def gen():
+            yield "event: progress\ndata: {}\n\n"
+            app.release.wait(5)
+            if token.cancelled() or not app.finish:
+                return
+            yield "event: progress\ndata: {\"stage\": 2}\n\n"
+            yield "event: done\ndata: {\"run\": %d}\n\n" % app.runs
+
+        return Response(gen(), mimetype="text/event-stream")
+
+    yield app
+    app.release.set()
+    assert coalesce.FLIGHTS.flights == {}
+
+
+def post(app, path, results=None, **kw):
+    resp = app.test_client().post(path, data={"file": (io.BytesIO(b"same clip"), "a.webm")}, **kw)
+    if results is not None:
+        results.append(resp)
+    return resp
+
+
+def in_thread(fn, *args):
+    t = threading.Thread(target=fn, args=args)
+    t.start()
+    return t
+
+
+def test_json_follower_gets_leaders_answer(app):
+    results = []
+    leader = in_thread(post, app, "/api/json", results)
+    wait_until(lambda: the_flight() is not None)
+    follower = in_thread(post, app, "/api/json", results)
+    wait_until(lambda: the_flight().followers == 1)
+    app.release.set()
+    leader.join()
+    follower.join()
+
+    assert app.runs == 1
+    assert [r.get_json() for r in results] == [{"ok": True, "run": 1}] * 2
+    assert sorted(r.headers.get("X-Coalesced") for r in results if r.headers.get("X-Coalesced")) == ["1"]
+
+
+def test_json_followers_capped(app, monkeypatch):
+    monkeypatch.setenv("COALESCE_MAX_WAITING", "1")
+    results = []
+    leader = in_thread(post, app, "/api/json", results)
+    wait_until(lambda: the_flight() is not None)
+    follower = in_thread(post, app, "/api/json", results)
+    wait_until(lambda: coalesce.FLIGHTS.waiting == 1)
+
+    rejected = post(app, "/api/json")
+    assert rejected.status_code == 429
+    assert rejected.get_json()["error"] == "duplicate_in_flight"
+    assert int(rejected.headers["Retry-After"]) >= 1
+
+    app.release.set()
+    leader.join()
+    follower.join()
+    assert app.runs == 1
+    assert [r.status_code for r in results] == [200, 200]
+    assert coalesce.FLIGHTS.waiting == 0
+
+
+def test_stream_follower_replays_then_follows(app):
+    leader = post(app, "/api/stream", buffered=False)
+    chunks = iter(leader.response)
+    first = next(chunks)
+    results = []
+    follower = in_thread(post, app, "/api/stream", results)
+    wait_until(lambda: the_flight().attached == 1)
+    app.release.set()
+    rest = b"".join(c if isinstance(c, bytes) else c.encode() for c in chunks)
+    leader.close()
+    follower.join()
+
+    leader_body = (first if isinstance(first, bytes) else first.encode()) + rest
+    assert app.runs == 1
+    assert results[0].headers["X-Coalesced"] == "1"
+    assert results[0].get_data() == leader_body
+    assert leader_body.endswith(b"event: done\ndata: {\"run\": 1}\n\n")
+
+
+def test_stream_finishes_for_follower_after_leader_leaves(app):
+    leader = post(app, "/api/stream", buffered=False)
+    next(iter(leader.response))
+    results = []
+    follower = in_thread(post, app, "/api/stream", results)
+    wait_until(lambda: the_flight().attached == 1)
+    # the leader's client goes away mid-stream; its request keeps the work going
+    app.release.set()
+    leader.close()
+    follower.join()
+
+    body = results[0].get_data(as_text=True)
+    assert app.runs == 1
+    assert "event: done" in body
+    assert "coalesced_request_aborted" not in body
+
+
+def test_stream_ended_without_done_tells_follower_to_retry(app):
+    app.finish = False
+    leader = post(app, "/api/stream", buffered=False)
+    chunks = iter(leader.response)
+    next(chunks)
+    results = []
+    follower = in_thread(post, app, "/api/stream", results)
+    wait_until(lambda: the_flight().attached == 1)
+    app.release.set()
+    list(chunks)
+    leader.close()
+    follower.join()
+
+    last = results[0].get_data(as_text=True).strip().splitlines()[-1]
+    assert json.loads(last[len("data: "):]) == {"error": "coalesced_request_aborted", "retry": True}
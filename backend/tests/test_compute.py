@@ -0,0 +1,91 @@
+"""Slot scheduling (compute.SlotQueue): shortest-first order, aging, batch penalty, cancellation."""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import compute  # noqa: E402
+
+
+def make_queue(monkeypatch, **env):
+    for name in ("SJF", "SJF_AGING", "SJF_BATCH_PENALTY_S"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    return compute.SlotQueue("test", 1)
+
+
+def run_order(queue, jobs, gap_s=0.0):
+    """Submit (label, work, priority) jobs behind a busy slot; return the order they ran in."""
+    order = []
+    busy = threading.Event()
+    blocker = queue.submit(busy.wait)
+    futures = []
+    for label, work, priority in jobs:
+        futures.append(queue.submit(lambda label=label: order.append(label), work=work, priority=priority))
+        time.sleep(gap_s)
+    busy.set()
+    for f in [blocker] + futures:
+        f.result(timeout=5)
+    return order
+
+
+def test_shortest_job_first(monkeypatch):
+    queue = make_queue(monkeypatch)
+    jobs = [("long", 5.0, "interactive"), ("short", 1.0, "interactive"), ("mid", 3.0, "interactive")]
+    assert run_order(queue, jobs) == ["short", "mid", "long"]
+
+
+def test_sjf_off_is_fifo(monkeypatch):
+    queue = make_queue(monkeypatch, SJF=0)
+    jobs = [("long", 5.0, "interactive"), ("short", 1.0, "interactive"), ("mid", 3.0, "interactive")]
+    assert run_order(queue, jobs) == ["long", "short", "mid"]
+
+
+@pytest.mark.parametrize("aging, first", [(0, "short"), (100, "long")])
+def test_aging_lets_a_long_wait_win(monkeypatch, aging, first):
+    # the long job waits 0.2 s longer; at 100 s of cost per second waited that outweighs 9 s of work
+    queue = make_queue(monkeypatch, SJF_AGING=aging)
+    jobs = [("long", 10.0, "interactive"), ("short", 1.0, "interactive")]
+    assert run_order(queue, jobs, gap_s=0.2)[0] == first
+
+
+@pytest.mark.parametrize("penalty, first", [(30, "interactive"), (0, "batch")])
+def test_batch_penalty(monkeypatch, penalty, first):
+    queue = make_queue(monkeypatch, SJF_BATCH_PENALTY_S=penalty)
+    jobs = [("batch", 1.0, "batch"), ("interactive", 5.0, "interactive")]
+    assert run_order(queue, jobs)[0] == first
+
+
+def test_cancel_after_grant_gives_slot_back(monkeypatch):
+    queue = make_queue(monkeypatch)
+    holder = queue._acquire()
+    outcome = []
+
+    class LeavesAsSlotFrees:
+        def cancelled(self):
+            # the slot is granted to the waiter before it sees the cancellation
+            queue._release(holder, count=False)
+            return True
+
+    def waiter():
+        try:
+            with queue.slot(cancel=LeavesAsSlotFrees(), work=1.0):
+                outcome.append("ran")
+        except compute.Cancelled:
+            outcome.append("cancelled")
+
+    t = threading.Thread(target=waiter)
+    t.start()
+    t.join(timeout=5)
+    assert outcome == ["cancelled"]
+    assert (queue.free, queue.active, queue.waiting) == (1, 0, 0)
+    assert queue.service_s is None and queue.rate is None
+    # the slot is usable again
+    assert queue.submit(lambda: "next", work=1.0).result(timeout=5) == "next"
@@ -0,0 +1,67 @@
+"""On-demand profiling (profiling.py) of streamed bodies iterated off the request thread."""
+import os
+import sys
+import threading
+import time
+
+import pytest
+from flask import Flask, Response
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import profiling  # noqa: E402
+
+
+def busy_body():
+    end = time.perf_counter() + 0.3
+    while time.perf_counter() < end:
+        sum(range(1000))
+    yield b"event: done\ndata: {}\n\n"
+
+
+@pytest.fixture()
+def app(monkeypatch, tmp_path):
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("PROFILE_INTERVAL_MS", "1")
+    app = Flask(__name__)
+
+    @app.get("/api/stream")
+    def stream():
+        return Response(busy_body(), mimetype="text/event-stream")
+
+    profiling.init_profiling(app, lambda request: True)
+    return app
+
+
+def call_then_iterate_elsewhere(app):
+    """What the ASGI bridge does: run the view here, iterate and close the body on another thread."""
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": "/api/stream", "QUERY_STRING": "profile=1",
+               "SERVER_NAME": "localhost", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+               "wsgi.url_scheme": "http", "wsgi.input": None, "wsgi.errors": sys.stderr}
+    headers = {}
+    body = app(environ, lambda status, h, exc_info=None: headers.update(h))
+
+    def produce():
+        try:
+            list(body)
+        finally:
+            body.close()
+
+    t = threading.Thread(target=produce)
+    t.start()
+    t.join()
+    return headers["X-Profile-Id"]
+
+
+@pytest.mark.parametrize("mode", ["sample", "cprofile"])
+def test_stream_body_profiled_on_iterating_thread(app, tmp_path, monkeypatch, mode):
+    monkeypatch.setattr(app.profiler, "mode", mode)
+    cid = call_then_iterate_elsewhere(app)
+    name = ".collapsed" if mode == "sample" else ".txt"
+    with open(os.path.join(tmp_path, cid + name), encoding="utf-8") as f:
+        assert "busy_body" in f.read()
+    if mode == "cprofile":
+        # the request thread is unhooked again
+        assert sys.getprofile() is None
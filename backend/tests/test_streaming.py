@@ -0,0 +1,72 @@
+"""ASGI bridge (streaming.py): a queued stream whose client leaves, with and without coalesced waiters."""
+import asyncio
+import os
+import sys
+from concurrent.futures import Future
+
+import pytest
+from flask import Flask, Response
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import streaming  # noqa: E402
+
+
+class StubQueue:
+    """Accepts jobs and never grants them a slot, like a busy model."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, trace=None, work=None, priority="interactive"):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+def stream_app(queue, keepalive):
+    app = Flask(__name__)
+
+    @app.get("/api/stream")
+    def stream():
+        token = streaming.cancel_token(("transcribe",))
+        token.keepalive = keepalive
+        streaming.mark_stream(queue)
+
+        def gen():
+            yield b"event: done\ndata: {}\n\n"
+
+        return Response(gen(), mimetype="text/event-stream")
+
+    return app
+
+
+async def leave_while_queued(app):
+    bridge = streaming.ASGIBridge(app)
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/api/stream", "query_string": b"", "headers": [],
+             "http_version": "1.1", "scheme": "http"}
+    await asyncio.wait_for(bridge(scope, receive, send), 5)
+    return sent
+
+
+@pytest.mark.parametrize("waiting, dropped", [(True, False), (False, True)])
+def test_queued_job_kept_for_coalesced_waiters(waiting, dropped):
+    queue = StubQueue()
+    sent = asyncio.run(leave_while_queued(stream_app(queue, lambda: waiting)))
+    assert sent[0]["status"] == 200
+    assert len(queue.futures) == 1
+    assert queue.futures[0].cancelled() is dropped
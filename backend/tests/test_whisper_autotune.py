@@ -0,0 +1,78 @@
+"""whisper_autotune.tune() against a stand-in WhisperModel: candidate loop, pick and saved profile."""
+import os
+import sys
+import time
+import types
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import whisper_autotune  # noqa: E402
+
+SR = 16000
+# seconds of decode per second of audio, per compute type
+SPEED = {"int8": 0.02, "float32": 0.1}
+
+
+class FakeWhisperModel:
+    loads = []
+
+    def __init__(self, name, device="cpu", compute_type="default", cpu_threads=0, num_workers=1):
+        if compute_type not in SPEED:
+            raise ValueError(f"compute type {compute_type} not supported")
+        self.loads.append((name, compute_type, cpu_threads, num_workers))
+        self.rtf = SPEED[compute_type]
+
+    def transcribe(self, audio, **kwargs):
+        time.sleep(len(audio) / SR * self.rtf)
+        return iter([]), None
+
+
+@pytest.fixture()
+def fake_whisper(monkeypatch, tmp_path):
+    monkeypatch.setitem(sys.modules, "faster_whisper", types.SimpleNamespace(WhisperModel=FakeWhisperModel))
+    monkeypatch.setenv("WHISPER_PROFILE", str(tmp_path / "profile.json"))
+    monkeypatch.setenv("WHISPER_AUTOTUNE_COMPUTE", "float32,int8_float32,int8")
+    for var in ("WHISPER_COMPUTE", "WHISPER_CPU_THREADS"):
+        monkeypatch.delenv(var, raising=False)
+    FakeWhisperModel.loads = []
+    return str(tmp_path / "profile.json")
+
+
+@pytest.mark.parametrize("goal", ["throughput", "latency"])
+def test_tune_saves_fastest_candidate(fake_whisper, goal):
+    clips = [np.zeros(int(SR * s), dtype=np.float32) for s in (0.5, 1.0)]
+    best = whisper_autotune.tune("tiny", clips=clips, goal=goal, max_s=60)
+
+    assert best["computeType"] == "int8"
+    assert best["goal"] == goal
+    assert best["clips"] == 2
+    # the unsupported compute type is skipped, the others measured at every thread count
+    measured = {r["computeType"] for r in best["candidates"]}
+    assert measured == {"int8", "float32"}
+    threads = {t for _, t in whisper_autotune.candidates()}
+    assert len(best["candidates"]) == 2 * len(threads)
+    assert all(load[3] == best["slots"] for load in FakeWhisperModel.loads)
+
+    assert whisper_autotune.entry("tiny")["computeType"] == "int8"
+    assert whisper_autotune.settings("tiny")["compute_type"] == "int8"
+    assert whisper_autotune.entry("small") is None
+
+
+def test_tune_stops_after_time_budget(fake_whisper):
+    clips = [np.zeros(SR // 2, dtype=np.float32)]
+    best = whisper_autotune.tune("tiny", clips=clips, max_s=0)
+    # the first candidate always runs; the rest are past the budget
+    assert len(best["candidates"]) == 1
+    assert best["computeType"] == "float32"
+
+
+def test_ensure_is_off_by_default(fake_whisper, monkeypatch):
+    monkeypatch.delenv("WHISPER_AUTOTUNE", raising=False)
+    monkeypatch.setattr(whisper_autotune.subprocess, "run", lambda *a, **k: pytest.fail("tuner started"))
+    whisper_autotune.ensure("tiny")
+    assert not os.path.exists(fake_whisper)
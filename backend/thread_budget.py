@@ -0,0 +1,136 @@
+# backend/thread_budget.py
+"""
+One CPU thread budget for CTranslate2 (Whisper), PyTorch (accent classifier) and BLAS
+(numpy/librosa). Left alone each defaults to every core, so with several gunicorn
+workers and WHISPER_CONCURRENCY > 1 the process tree runs many times more threads than
+there are cores and throughput falls.
+- A worker's share is usable cores / workers (WEB_CONCURRENCY, or the count serve.py
+  chose). serve.py exports both as THREAD_BUDGET_CORES / THREAD_BUDGET_WORKERS before
+  forking, so a pinned worker still sees the same budget.
+- Whisper gets the whole share, split over its slots: cpu_threads = share / slots and
+  num_workers = slots, so concurrent transcriptions really run in parallel.
+- Torch gets half the share (one inter-op thread). The accent step runs after
+  transcription, so it overlaps other requests' transcriptions but not its own.
+- BLAS gets 1 thread. Our numpy work is small vectors and resampling, where threading
+  costs more than it gains. apply_env() must run before numpy is imported; app.py does
+  it first thing. With threadpoolctl installed the limit is also enforced at runtime.
+- Overrides: WHISPER_CPU_THREADS, TORCH_THREADS, BLAS_THREADS. THREAD_BUDGET=0 leaves
+  every library at its default.
+- THREAD_PIN=1 (serve.py) pins each worker process to its own slice of the cores.
+See bench/threads.py for the throughput comparison.
+"""
+
+import logging
+import os
+from typing import Dict, List, Optional
+
+BLAS_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "VECLIB_MAXIMUM_THREADS",
+            "NUMEXPR_NUM_THREADS")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def enabled() -> bool:
+    return (os.environ.get("THREAD_BUDGET") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def usable_cores() -> int:
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    # cgroup v2 CPU quota (containers)
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cores)
+
+
+def budget(workers: Optional[int] = None, slots: Optional[int] = None,
+           cores: Optional[int] = None) -> Dict[str, int]:
+    cores = cores or _env_int("THREAD_BUDGET_CORES", 0) or usable_cores()
+    workers = max(1, workers or _env_int("THREAD_BUDGET_WORKERS", 0) or _env_int("WEB_CONCURRENCY", 1))
+    slots = max(1, slots or _env_int("WHISPER_CONCURRENCY", 1))
+    share = max(1, cores // workers)
+    return {
+        "cores": cores,
+        "workers": workers,
+        "share": share,
+        "whisperThreads": max(1, _env_int("WHISPER_CPU_THREADS", 0) or share // slots),
+        "whisperWorkers": slots,
+        "torchThreads": max(1, _env_int("TORCH_THREADS", 0) or share // 2),
+        "blasThreads": max(1, _env_int("BLAS_THREADS", 1)),
+    }
+
+
+def apply_env():
+    """Set the BLAS thread variables; only effective before numpy/torch are imported."""
+    if not enabled():
+        return
+    blas = str(budget()["blasThreads"])
+    for name in BLAS_ENV:
+        # an explicit setting wins
+        os.environ.setdefault(name, blas)
+
+
+def apply_runtime(b: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """Apply the torch and BLAS limits to libraries already loaded; returns the budget."""
+    b = b or budget()
+    if not enabled():
+        return b
+    try:
+        import torch  # type: ignore
+
+        torch.set_num_threads(b["torchThreads"])
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # only allowed before the first parallel op
+            pass
+    except ImportError:
+        pass
+    try:
+        from threadpoolctl import threadpool_limits  # type: ignore
+
+        threadpool_limits(limits=b["blasThreads"], user_api="blas")
+    except ImportError:
+        pass
+    logging.info("thread budget: %s", b)
+    return b
+
+
+def whisper_kwargs() -> Dict[str, int]:
+    """cpu_threads / num_workers for WhisperModel; empty when the budget is off."""
+    if not enabled():
+        return {}
+    b = budget()
+    return {"cpu_threads": b["whisperThreads"], "num_workers": b["whisperWorkers"]}
+
+
+def core_slice(index: int, workers: int, cores: Optional[List[int]] = None) -> List[int]:
+    """The cores worker `index` of `workers` is pinned to (THREAD_PIN=1)."""
+    cores = cores if cores is not None else sorted(os.sched_getaffinity(0))
+    share = max(1, len(cores) // max(1, workers))
+    start = (index * share) % len(cores)
+    return cores[start:start + share] or cores
+
+
+def pin(index: int, workers: int) -> Optional[List[int]]:
+    if (os.environ.get("THREAD_PIN") or "").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    try:
+        cpus = core_slice(index, workers)
+        os.sched_setaffinity(0, cpus)
+        return cpus
+    except (AttributeError, OSError) as e:
+        logging.warning("could not pin worker %d: %s", index, e)
+        return None
@@ -0,0 +1,163 @@
+# backend/tracing.py
+"""
+Per-request span tracing.
+- Every request gets a trace id: X-Trace-Id or a W3C traceparent from the client when
+  present, otherwise a new one. It is echoed back in the X-Trace-Id response header.
+- span(name) times a block into the request's trace. Names listed in metrics.STAGES are
+  also observed into stage_duration_seconds, so call sites need only the one wrapper.
+- Spans come back three ways:
+  Server-Timing header   spans finished before the headers went out, plus total
+  "debug" JSON block     with ?debug=1 or X-Debug-Timing: 1 (SSE: inside the done event)
+  log lines              one `span {...}` JSON line per span when the response closes
+TRACE_LOG=0 turns the log lines off.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import metrics
+
+log = logging.getLogger("trace")
+
+_current: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class Trace:
+    def __init__(self, trace_id: str, endpoint: str, debug: bool = False):
+        self.trace_id = trace_id
+        self.endpoint = endpoint
+        self.debug = debug
+        self.t0 = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def add(self, name: str, start: float, seconds: float, error: bool = False):
+        with self.lock:
+            self.spans.append({
+                "name": name,
+                "startMs": round((start - self.t0) * 1000.0, 2),
+                "durMs": round(seconds * 1000.0, 2),
+                "error": error,
+            })
+
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self.t0) * 1000.0, 2)
+
+    def server_timing(self) -> str:
+        with self.lock:
+            parts = [f"{s['name']};dur={s['durMs']}" for s in self.spans]
+        parts.append(f"total;dur={self.total_ms()}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            spans = [dict(s) for s in self.spans]
+        return {"traceId": self.trace_id, "totalMs": self.total_ms(), "spans": spans}
+
+    def log(self, status: Optional[int] = None):
+        if (os.environ.get("TRACE_LOG") or "1").strip().lower() in ("0", "false", "no", "off"):
+            return
+        with self.lock:
+            spans = list(self.spans)
+        for s in spans:
+            log.info("span %s", json.dumps({"trace": self.trace_id, "endpoint": self.endpoint, **s}))
+        log.info("request %s", json.dumps({"trace": self.trace_id, "endpoint": self.endpoint,
+                                           "status": status, "totalMs": self.total_ms(),
+                                           "spans": len(spans)}))
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, trace: Optional[Trace] = None):
+    """
+    Time a block as a span of `trace` (default: the current request's).
+    Pass trace explicitly from SSE generators, which outlive the request context.
+    """
+    trace = trace or _current.get()
+    t0 = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        seconds = time.perf_counter() - t0
+        if trace is not None:
+            trace.add(name, t0, seconds, error)
+        if name in metrics.STAGES:
+            metrics.observe_stage(name, seconds)
+            if error:
+                metrics.STAGE_ERRORS.inc(stage=name)
+
+
+def record(name: str, seconds: float, trace: Optional[Trace] = None):
+    """Add an already measured span that ended now."""
+    trace = trace or _current.get()
+    if trace is not None:
+        trace.add(name, time.perf_counter() - seconds, seconds)
+
+
+def incoming_trace_id(headers) -> str:
+    tid = (headers.get("X-Trace-Id") or "").strip()
+    if _ID_RE.match(tid):
+        return tid
+    # traceparent: version-traceid-parentid-flags
+    parts = (headers.get("traceparent") or "").strip().split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and _ID_RE.match(parts[1]):
+        return parts[1]
+    return uuid.uuid4().hex
+
+
+def _wants_debug(request) -> bool:
+    flag = request.args.get("debug") or request.headers.get("X-Debug-Timing") or ""
+    return flag.strip().lower() in ("1", "true", "yes", "on")
+
+
+def init_tracing(app):
+    """Start a trace per request; attach Server-Timing, X-Trace-Id and the debug block."""
+    from flask import g, request
+    from flask.json.provider import DefaultJSONProvider
+
+    class TracingJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with span("serialize"):
+                return super().dumps(obj, **kwargs)
+
+    app.json = TracingJSONProvider(app)
+
+    @app.before_request
+    def _trace_start():
+        rule = request.url_rule
+        trace = Trace(incoming_trace_id(request.headers), rule.rule if rule is not None else request.path,
+                      _wants_debug(request))
+        _current.set(trace)
+        g.trace = trace
+
+    @app.after_request
+    def _trace_finish(response):
+        trace = g.pop("trace", None)
+        if trace is None:
+            return response
+        if trace.debug and response.is_json and not response.is_streamed:
+            data = response.get_json(silent=True)
+            if isinstance(data, dict):
+                data["debug"] = trace.to_dict()
+                response.set_data(json.dumps(data) + "\n")
+        response.headers["X-Trace-Id"] = trace.trace_id
+        response.headers["Server-Timing"] = trace.server_timing()
+        status = response.status_code
+        response.call_on_close(lambda: trace.log(status))
+        return response
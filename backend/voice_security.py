@@ -1,13 +1,16 @@
 # backend/voice_security.py
 import os
 import sys
-import io
 import math
 import logging
 import numpy as np
 from flask import Blueprint, request, jsonify, send_file, current_app
 from werkzeug.utils import secure_filename
 
+import audio
+import coalesce
+import tracing
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STORE_DIR = os.path.join(BASE_DIR, "storage", "voices")
 os.makedirs(STORE_DIR, exist_ok=True)
@@ -27,69 +30,15 @@ def _auth_uid():
 def _decode_to_wav_float(file_storage, target_sr=16000):
     """
     Decode incoming webm or other formats to mono float32 waveform and sr.
-    Uses PyAV for decode and resample. Returns (y, sr).
+    Goes through audio.ingest, so over-long or undecodable uploads raise
+    audio.AudioRejected (INGEST_MAX_S_VOICE). /enroll and /verify answer those with
+    413/422 and the rejection body; before, /enroll stored silence for them and
+    /verify answered 400 or 500. Returns (y, sr).
     """
-    import av
-    import soundfile as sf
-
-    raw = file_storage.read()
-    if not raw:
-        raise ValueError("empty_audio")
-    bio = io.BytesIO(raw)
-
-    def decode_with_av(buf):
-        try:
-          container = av.open(buf, format="webm")
-        except Exception:
-          buf.seek(0)
-          container = av.open(buf)
-        stream = next((s for s in container.streams if s.type == "audio"), None)
-        if stream is None:
-            raise ValueError("no_audio_stream")
-        resampler = av.audio.resampler.AudioResampler(
-            format="s16",
-            layout="mono",
-            rate=target_sr,
-        )
-        frames = []
-        for packet in container.demux(stream):
-            if packet.dts is None:
-                continue
-            for frame in packet.decode():
-                resampled = resampler.resample(frame)
-                if isinstance(resampled, (list, tuple)):
-                    for fr in resampled:
-                        frames.append(fr.to_ndarray())
-                else:
-                    frames.append(resampled.to_ndarray())
-        if not frames:
-            raise ValueError("no audio frames decoded")
-        audio_i16 = np.concatenate(frames, axis=1)[0]
-        y = audio_i16.astype(np.float32) / 32768.0
-        return y, target_sr
-
-    try:
-        return decode_with_av(bio)
-    except Exception:
-        # fallback to soundfile direct decode
-        try:
-            bio.seek(0)
-            y, sr = sf.read(bio, dtype="float32", always_2d=False)
-            if y.ndim > 1:
-                y = y[:, 0]
-            if y.size == 0:
-                raise ValueError("empty_audio_after_decode")
-            if sr != target_sr:
-                # simple resample using librosa if available
-                try:
-                    import librosa
-                    y = librosa.resample(y, orig_sr=sr, target_sr=target_sr)
-                    sr = target_sr
-                except Exception:
-                    pass
-            return y.astype(np.float32), sr
-        except Exception as e:
-            raise ValueError(f"decode_failed: {e}")
+    y, _ = audio.ingest(file_storage.read(), "voice")
+    if target_sr != audio.SAMPLE_RATE:
+        y = audio.resample(y, audio.SAMPLE_RATE, target_sr)
+    return y, target_sr
 
 def _embed(y, sr):
     """
@@ -110,7 +59,8 @@ def _embed(y, sr):
 
 def _safe_embed(y, sr):
     try:
-        return _embed(y, sr)
+        with tracing.span("voice_embed"):
+            return _embed(y, sr)
     except Exception as e:
         logging.warning("embed fallback: %s", e)
         vec = np.random.rand(20).astype(np.float32)
@@ -167,11 +117,18 @@ def voice_enroll():
     except Exception as e:
         return jsonify({"error": f"unauthorized: {e}"}), 401
 
-    if "file" not in request.files:
+    with tracing.span("upload_read"):
+        has_file = "file" in request.files
+    if not has_file:
         return jsonify({"error": "no file"}), 400
 
     try:
-        y, sr = _decode_to_wav_float(request.files["file"])
+        with tracing.span("decode"):
+            y, sr = _decode_to_wav_float(request.files["file"])
+    except audio.AudioRejected as e:
+        # too long (413) or undecodable/empty/too short (422). These used to fall through
+        # to the silent fallback below and enrol a sample of silence into the centroid.
+        return jsonify(e.to_dict()), e.status
     except Exception as e:
         logging.warning("enroll decode failed, using fallback: %s", e)
         y = np.zeros(16000, dtype=np.float32)
@@ -204,13 +161,16 @@ def voice_enroll():
         return jsonify({"error": f"enroll_failed: {e}"}), 500
 
 @voice_bp.post("/verify")
+@coalesce.single_flight
 def voice_verify():
     try:
         uid = _auth_uid()
     except Exception as e:
         return jsonify({"error": f"unauthorized: {e}"}), 401
 
-    if "file" not in request.files:
+    with tracing.span("upload_read"):
+        has_file = "file" in request.files
+    if not has_file:
         return jsonify({"error": "no file"}), 400
     try:
         centroid = _load_centroid(uid)
@@ -226,9 +186,11 @@ def voice_verify():
                 "reason": "not_enrolled"
             }), 200
 
-        y, sr = _decode_to_wav_float(request.files["file"])
-        vec = _safe_embed(y, sr)
-        score = _cosine(vec, centroid)
+        with tracing.span("voice_verify"):
+            with tracing.span("decode"):
+                y, sr = _decode_to_wav_float(request.files["file"])
+            vec = _safe_embed(y, sr)
+            score = _cosine(vec, centroid)
         match = score >= THRESHOLD
         samples = len(_list_samples(uid))
         logging.info("voice_verify uid=%s score=%.4f match=%s samples=%s", uid, score, match, samples)
@@ -240,6 +202,8 @@ def voice_verify():
           "samples": samples,
           "enrolled": samples >= MIN_ENROLL_SAMPLES,
         })
+    except audio.AudioRejected as e:
+        return jsonify(e.to_dict()), e.status
     except ValueError as e:
         return jsonify({"error": f"verify_failed: {e}"}), 400
     except Exception as e:
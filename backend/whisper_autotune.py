@@ -0,0 +1,350 @@
+# backend/whisper_autotune.py
+"""
+Pick the fastest faster-whisper compute type and thread count for this host.
+- Each candidate (compute type x cpu_threads) loads the model, transcribes a short
+  calibration set once clip by clip (latency: real-time factor, lower is better) and
+  once with WHISPER_CONCURRENCY clips at a time (throughput: audio seconds per second),
+  the way the transcribe queue drives it.
+    compute types   WHISPER_AUTOTUNE_COMPUTE (default "int8,int8_float32,float32"),
+                    minus any this CTranslate2 build does not support on CPU
+    cpu_threads     the thread_budget.py share per slot, half of it, and twice it
+                    (capped at the worker's share); num_workers is always the slot count
+- The winner has the highest throughput; WHISPER_AUTOTUNE_GOAL=latency picks the lowest
+  real-time factor instead. Candidates past WHISPER_AUTOTUNE_MAX_S (default 600) of
+  tuning are skipped.
+- The calibration set is every audio file in WHISPER_CALIBRATION_DIR (first 30 s of
+  each), or synthetic speech-like clips of 2, 5 and 10 s. Real recordings are better:
+  synthetic audio decodes to almost no text, which understates the decoder's share.
+- Results go to WHISPER_PROFILE (default backend/whisper_profile.json), keyed by host
+  (CPU model, usable cores, CTranslate2 version) and model name. An entry records the
+  thread share and slot count it was measured with and is ignored when they change.
+- init_whisper() applies the profile when WHISPER_COMPUTE / WHISPER_CPU_THREADS are
+  not set. WHISPER_AUTOTUNE=1 tunes the preloaded models (WHISPER_PRELOAD) at startup
+  when the profile has no entry for this host and model. Tuning runs in a child process,
+  so no CTranslate2 thread pool starts in serve.py's master before the fork, and it runs
+  before the app serves, so it does not compete with requests. Models loaded later, on
+  a request's first use, are never tuned; run the tuner offline for those:
+      python whisper_autotune.py --model small [--model tiny] [--calibration DIR]
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import thread_budget
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_COMPUTE = ("int8", "int8_float32", "float32")
+AUDIO_EXT = (".wav", ".mp3", ".m4a", ".ogg", ".webm", ".flac")
+CALIBRATION_MAX_S = 30.0
+SYNTHETIC_S = (2.0, 5.0, 10.0)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def profile_path() -> str:
+    return os.environ.get("WHISPER_PROFILE") or os.path.join(BASE_DIR, "whisper_profile.json")
+
+
+def host_key() -> str:
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    cpu = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    try:
+        import ctranslate2  # type: ignore
+
+        ct2 = ctranslate2.__version__
+    except ImportError:
+        ct2 = "none"
+    return f"{cpu} | {thread_budget.usable_cores()} cores | ctranslate2 {ct2}"
+
+
+# ---------- profile file ----------
+
+def _read_profile(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning("whisper profile %s unreadable: %s", path, e)
+        return {}
+
+
+def entry(model_name: str) -> Optional[Dict[str, Any]]:
+    """This host's tuned settings for model_name, if they match the current thread budget."""
+    found = _read_profile(profile_path()).get(host_key(), {}).get(model_name)
+    if not found:
+        return None
+    b = thread_budget.budget()
+    if found.get("share") != b["share"] or found.get("slots") != b["whisperWorkers"]:
+        logging.info("whisper profile for %s was measured with share=%s slots=%s, now %s/%s; ignored",
+                     model_name, found.get("share"), found.get("slots"), b["share"], b["whisperWorkers"])
+        return None
+    return found
+
+
+def settings(model_name: str) -> Dict[str, Any]:
+    """compute_type and thread kwargs for WhisperModel: explicit env, then profile, then defaults."""
+    kwargs: Dict[str, Any] = dict(thread_budget.whisper_kwargs())
+    kwargs["compute_type"] = os.environ.get("WHISPER_COMPUTE") or ""
+    tuned = entry(model_name)
+    if tuned:
+        if not kwargs["compute_type"]:
+            kwargs["compute_type"] = tuned["computeType"]
+        if thread_budget.enabled() and not os.environ.get("WHISPER_CPU_THREADS"):
+            kwargs["cpu_threads"] = tuned["cpuThreads"]
+    kwargs["compute_type"] = kwargs["compute_type"] or "int8"
+    return kwargs
+
+
+def _save(model_name: str, result: Dict[str, Any], path: str):
+    data = _read_profile(path)
+    data.setdefault(host_key(), {})[model_name] = result
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+@contextlib.contextmanager
+def _locked(path: str):
+    """Only one process tunes at a time (several workers starting together)."""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(path + ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# ---------- calibration ----------
+
+def calibration_set(directory: Optional[str] = None) -> List[np.ndarray]:
+    directory = directory or os.environ.get("WHISPER_CALIBRATION_DIR", "")
+    clips = []
+    if directory:
+        import audio
+
+        for name in sorted(os.listdir(directory)):
+            if not name.lower().endswith(AUDIO_EXT):
+                continue
+            try:
+                y, _ = audio.decode(os.path.join(directory, name), audio.SAMPLE_RATE, CALIBRATION_MAX_S)
+            except ValueError as e:
+                logging.warning("calibration clip %s skipped: %s", name, e)
+                continue
+            if y.size:
+                clips.append(y)
+        if not clips:
+            logging.warning("no usable audio in %s; using synthetic clips", directory)
+    if not clips:
+        bench_dir = os.path.join(BASE_DIR, "bench")
+        if bench_dir not in sys.path:
+            sys.path.insert(0, bench_dir)
+        import synthetic
+
+        clips = [synthetic.speech_like(s, seed=i) for i, s in enumerate(SYNTHETIC_S)]
+    return clips
+
+
+def candidates() -> List[Tuple[str, int]]:
+    wanted = [c.strip() for c in (os.environ.get("WHISPER_AUTOTUNE_COMPUTE") or ",".join(DEFAULT_COMPUTE)).split(",")
+              if c.strip()]
+    try:
+        import ctranslate2  # type: ignore
+
+        supported = set(ctranslate2.get_supported_compute_types("cpu"))
+        wanted = [c for c in wanted if c in supported]
+    except (ImportError, AttributeError):
+        pass
+    b = thread_budget.budget()
+    per_slot = max(1, b["share"] // b["whisperWorkers"])
+    threads = sorted({per_slot, max(1, per_slot // 2), min(b["share"], per_slot * 2)})
+    return [(c, t) for c in wanted for t in threads]
+
+
+def _transcribe(model, clip: np.ndarray):
+    segments, _ = model.transcribe(clip, beam_size=5, language="en", vad_filter=False)
+    for _ in segments:
+        pass
+
+
+def measure(model_name: str, compute_type: str, cpu_threads: int, slots: int,
+            clips: List[np.ndarray], sr: int = 16000) -> Dict[str, Any]:
+    from faster_whisper import WhisperModel
+
+    t0 = time.perf_counter()
+    model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads,
+                         num_workers=slots)
+    load_s = time.perf_counter() - t0
+    _transcribe(model, clips[0])  # warm-up
+
+    audio_s = sum(len(c) for c in clips) / sr
+    rtfs = []
+    for clip in clips:
+        t0 = time.perf_counter()
+        _transcribe(model, clip)
+        rtfs.append((time.perf_counter() - t0) / (len(clip) / sr))
+
+    # every slot busy: each thread takes the whole set, in a different order
+    def worker(i):
+        for clip in clips[i % len(clips):] + clips[:i % len(clips)]:
+            _transcribe(model, clip)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(slots)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    del model
+    return {
+        "computeType": compute_type,
+        "cpuThreads": cpu_threads,
+        "rtf": round(statistics.median(rtfs), 4),
+        "audioSPerS": round(audio_s * slots / wall, 3),
+        "loadS": round(load_s, 2),
+    }
+
+
+def tune(model_name: str, clips: Optional[List[np.ndarray]] = None, goal: Optional[str] = None,
+         max_s: Optional[float] = None, path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Measure every candidate for model_name, save the best to the profile and return it."""
+    clips = clips or calibration_set()
+    goal = goal or os.environ.get("WHISPER_AUTOTUNE_GOAL", "throughput")
+    max_s = max_s if max_s is not None else _env_float("WHISPER_AUTOTUNE_MAX_S", 600.0)
+    path = path or profile_path()
+    b = thread_budget.budget()
+    started = time.monotonic()
+    results = []
+    for compute_type, cpu_threads in candidates():
+        if results and time.monotonic() - started > max_s:
+            logging.warning("whisper autotune: out of time, skipping %s/%d", compute_type, cpu_threads)
+            continue
+        try:
+            r = measure(model_name, compute_type, cpu_threads, b["whisperWorkers"], clips)
+        except Exception as e:
+            logging.warning("whisper autotune: %s %s/%d failed: %s", model_name, compute_type, cpu_threads, e)
+            continue
+        logging.info("whisper autotune: %s %s threads=%d rtf=%.3f throughput=%.2f audio s/s", model_name,
+                     compute_type, cpu_threads, r["rtf"], r["audioSPerS"])
+        results.append(r)
+    if not results:
+        return None
+    if goal == "latency":
+        best = min(results, key=lambda r: r["rtf"])
+    else:
+        best = max(results, key=lambda r: r["audioSPerS"])
+    out = dict(best)
+    out.update({
+        "goal": goal,
+        "share": b["share"],
+        "slots": b["whisperWorkers"],
+        "clips": len(clips),
+        "measuredAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "candidates": results,
+    })
+    _save(model_name, out, path)
+    return out
+
+
+def ensure(model_name: str):
+    """
+    Startup hook (whisper_registry.init_registry): when WHISPER_AUTOTUNE=1 and nothing is
+    saved for model_name yet, tune it in a child process and wait for the profile.
+    """
+    if (os.environ.get("WHISPER_AUTOTUNE") or "").strip().lower() not in ("1", "true", "yes", "on"):
+        return
+    if os.environ.get("WHISPER_COMPUTE") and os.environ.get("WHISPER_CPU_THREADS"):
+        return
+    path = profile_path()
+    with _locked(path):
+        # another process may have finished while this one waited for the lock
+        if entry(model_name) is not None:
+            return
+        max_s = _env_float("WHISPER_AUTOTUNE_MAX_S", 600.0)
+        logging.warning("whisper autotune: no profile for %s on this host, tuning now (up to %.0fs)", model_name, max_s)
+        cmd = [sys.executable, os.path.abspath(__file__), "--model", model_name, "--profile", path,
+               "--max-seconds", str(max_s)]
+        try:
+            # the limit only stops new candidates; allow the running one to finish
+            subprocess.run(cmd, check=True, timeout=max_s * 2 + 120)
+        except (OSError, subprocess.SubprocessError) as e:
+            logging.warning("whisper autotune for %s failed, using defaults: %s", model_name, e)
+            return
+    best = entry(model_name)
+    if best:
+        logging.warning("whisper autotune: %s -> %s, cpu_threads=%d", model_name, best["computeType"],
+                        best["cpuThreads"])
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Tune faster-whisper compute type and threads for this host.")
+    parser.add_argument("--model", action="append", default=[],
+                        help="Model to tune; repeatable (default: WHISPER_MODEL or small)")
+    parser.add_argument("--calibration", default="", help="Directory of audio files (default: WHISPER_CALIBRATION_DIR)")
+    parser.add_argument("--goal", choices=("throughput", "latency"), default=None)
+    parser.add_argument("--max-seconds", type=float, default=None, help="Tuning time budget per model")
+    parser.add_argument("--profile", default="", help="Profile file (default: WHISPER_PROFILE)")
+    args = parser.parse_args()
+
+    try:
+        import faster_whisper  # noqa: F401
+    except ImportError:
+        print("faster_whisper is not installed", file=sys.stderr)
+        return 2
+    clips = calibration_set(args.calibration or None)
+    models = args.model or [os.environ.get("WHISPER_MODEL", "small")]
+    print(f"host: {host_key()}")
+    print(f"budget: {thread_budget.budget()}")
+    print(f"calibration: {len(clips)} clips, {sum(len(c) for c in clips) / 16000:.1f}s")
+    status = 0
+    for name in models:
+        best = tune(name, clips, args.goal, args.max_seconds, args.profile or None)
+        if best is None:
+            print(f"{name}: no candidate could be measured")
+            status = 1
+            continue
+        for r in best["candidates"]:
+            mark = "*" if (r["computeType"], r["cpuThreads"]) == (best["computeType"], best["cpuThreads"]) else " "
+            print(f"{mark} {name:8s} {r['computeType']:13s} threads={r['cpuThreads']:<3d} "
+                  f"rtf={r['rtf']:.3f}  {r['audioSPerS']:.2f} audio s/s")
+    print(f"saved to {args.profile or profile_path()}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+# backend/whisper_registry.py
+"""
+Several faster-whisper sizes in one process, under a memory budget.
+- WHISPER_MODELS lists the sizes requests may be routed to (e.g. "tiny,base,small");
+  it defaults to WHISPER_MODEL alone, which makes routing a no-op.
+- WHISPER_PRELOAD (default WHISPER_MODEL) is loaded up front and stays resident. Under
+  serve.py those models live in the master and are shared copy-on-write, so unloading
+  them in a worker would free nothing.
+- The rest load on first use and are unloaded least-recently-used first when a load
+  would take the resident total over WHISPER_MODEL_BUDGET_MB (default 1024). A model
+  that is transcribing is never unloaded. When a model cannot fit, the request uses
+  the closest resident size instead (reason "budget").
+- Sizes are estimated per name until a model is loaded, then the measured RSS growth
+  of the load is used, unless another load overlapped it or it is off the estimate by
+  more than a factor of SIZE_TOLERANCE (request threads allocate during a load too).
+- route() picks a model from the clip duration, the number of target words, the
+  language and an optional quality tier:
+    quality=fast|balanced|accurate, or a configured model name, wins
+    clip <= WHISPER_ROUTE_SHORT_S (4) and target <= WHISPER_ROUTE_SHORT_WORDS (3)  smallest
+    clip >= WHISPER_ROUTE_LONG_S (15) or target >= WHISPER_ROUTE_LONG_WORDS (25)    largest
+    otherwise                                                                       middle
+  Languages other than English never go below WHISPER_ROUTE_MULTILINGUAL_MIN (default
+  base) and never to an English-only ".en" model.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+import memwatch
+import whisper_autotune
+
+MB = 1024 * 1024
+
+# int8 resident size in MB, measured on CPU; other compute types are scaled below
+ESTIMATED_MB = {"tiny": 80, "base": 150, "small": 480, "medium": 1500, "large": 3100}
+SIZE_ORDER = ("tiny", "base", "small", "medium", "large")
+# decoding time relative to small (CPU, int8); only the ratios matter to the scheduler
+RELATIVE_COST = {"tiny": 0.2, "base": 0.35, "small": 1.0, "medium": 2.6, "large": 5.0}
+COMPUTE_SCALE = {"int8": 1.0, "int8_float32": 1.0, "int16": 1.6, "float16": 1.6, "float32": 3.0}
+TIERS = ("fast", "balanced", "accurate")
+# a measured load size further than this factor from the estimate is treated as noise
+SIZE_TOLERANCE = 2.0
+
+ROUTED = metrics.counter("whisper_routed_total", "Transcriptions by model and routing reason.",
+                         ("model", "reason"))
+LOADS = metrics.counter("whisper_model_loads_total", "Whisper models loaded.", ("model",))
+EVICTIONS = metrics.counter("whisper_model_evictions_total", "Whisper models unloaded for the budget.",
+                            ("model",))
+RESIDENT = metrics.gauge("whisper_model_resident_bytes", "Estimated memory of loaded Whisper models.",
+                         ("model",))
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _names(value: str) -> List[str]:
+    return [n.strip() for n in (value or "").split(",") if n.strip()]
+
+
+def family(name: str) -> str:
+    """"tiny" for tiny, tiny.en, distil-small.en -> "small", large-v3 -> "large"."""
+    base = name.split("/")[-1].lower().replace("distil-", "").replace("faster-whisper-", "")
+    base = base.split(".")[0]
+    return base.split("-")[0] if base.split("-")[0] in SIZE_ORDER else base
+
+
+def rank(name: str) -> int:
+    fam = family(name)
+    return SIZE_ORDER.index(fam) if fam in SIZE_ORDER else len(SIZE_ORDER)
+
+
+def english_only(name: str) -> bool:
+    return name.lower().endswith(".en")
+
+
+def job_work(audio_s: float, name: str, beam: int) -> float:
+    """Size of a transcription for the shortest-first scheduler (compute.SlotQueue)."""
+    # beam search over CTranslate2's batched decoder costs roughly 10% per extra beam
+    return audio_s * RELATIVE_COST.get(family(name), 1.0) * (1.0 + 0.1 * (max(1, beam) - 1))
+
+
+class ModelRegistry:
+    def __init__(self, loader: Callable[[str], Any], names: List[str], default: str,
+                 budget_bytes: int, compute_type: str = "int8"):
+        # smallest first; routing indexes into this order
+        self.names = sorted(dict.fromkeys(names or [default]), key=lambda n: (rank(n), n))
+        self.default = default if default in self.names else self.names[-1]
+        self.loader = loader
+        self.budget = max(0, int(budget_bytes))
+        self.scale = COMPUTE_SCALE.get(compute_type, 1.0)
+        self.lock = threading.Lock()
+        self.loading: Dict[str, threading.Lock] = {name: threading.Lock() for name in self.names}
+        self.models: "OrderedDict[str, Any]" = OrderedDict()  # least recently used first
+        self.sizes: Dict[str, int] = {}
+        self.pinned: Dict[str, int] = {}
+        self.resident: set = set()  # preloaded, never unloaded
+        self.failed: Dict[str, float] = {}
+        self.reserved: Dict[str, int] = {}  # loads in progress
+        for name in self.names:
+            RESIDENT.set_function(lambda n=name: self.estimate(n) if n in self.models else 0, model=name)
+
+    # ---------- memory ----------
+
+    def estimate(self, name: str) -> int:
+        if name in self.sizes:
+            return self.sizes[name]
+        return int(ESTIMATED_MB.get(family(name), ESTIMATED_MB["small"]) * self.scale * MB)
+
+    def used(self) -> int:
+        return sum(self.estimate(n) for n in self.models) + sum(self.reserved.values())
+
+    def _make_room(self, name: str) -> bool:
+        """Unload idle models until `name` fits. Caller holds self.lock."""
+        if not self.budget:
+            return True
+        need = self.estimate(name)
+        idle = [n for n in self.models if n not in self.resident and not self.pinned.get(n)]
+        if self.used() - sum(self.estimate(n) for n in idle) + need > self.budget:
+            return False
+        for victim in idle:
+            if self.used() + need <= self.budget:
+                break
+            self.models.pop(victim)
+            EVICTIONS.inc(model=victim)
+            logging.info("whisper model %s unloaded for %s (budget %.0fMB)", victim, name, self.budget / MB)
+        return self.used() + need <= self.budget
+
+    # ---------- loading ----------
+
+    def _load(self, name: str, resident: bool = False) -> Optional[Any]:
+        with self.loading[name]:
+            with self.lock:
+                if name in self.models:
+                    return self.models[name]
+                # failed loads (no network for the download, say) are not retried for a minute
+                if time.monotonic() - self.failed.get(name, -1e9) < 60.0:
+                    return None
+                if not resident and not self._make_room(name):
+                    return None
+                overlapped = bool(self.reserved)
+                self.reserved[name] = self.estimate(name)
+            before = memwatch.rss_bytes() or 0
+            t0 = time.perf_counter()
+            try:
+                model = self.loader(name)
+            finally:
+                with self.lock:
+                    self.reserved.pop(name, None)
+                    overlapped = overlapped or bool(self.reserved)
+            if model is None:
+                with self.lock:
+                    self.failed[name] = time.monotonic()
+                return None
+            grown = (memwatch.rss_bytes() or 0) - before
+            expected = self.estimate(name)
+            with self.lock:
+                self.failed.pop(name, None)
+                if grown > 0 and not overlapped and expected / SIZE_TOLERANCE <= grown <= expected * SIZE_TOLERANCE:
+                    self.sizes[name] = grown
+                elif grown > 0:
+                    logging.info("whisper model %s: measured %.0fMB against an estimate of %.0fMB%s; keeping the "
+                                 "estimate", name, grown / MB, expected / MB, " (overlapping load)" if overlapped else "")
+                self.models[name] = model
+                if resident:
+                    self.resident.add(name)
+            LOADS.inc(model=name)
+            logging.info("whisper model %s loaded in %.1fs (%.0fMB, %.0f/%.0fMB in use)", name,
+                         time.perf_counter() - t0, self.estimate(name) / MB, self.used() / MB, self.budget / MB)
+            return model
+
+    def preload(self, names: Optional[List[str]] = None):
+        for name in names or [self.default]:
+            if name in self.names:
+                self._load(name, resident=True)
+            else:
+                logging.warning("WHISPER_PRELOAD names %s, which is not in WHISPER_MODELS", name)
+
+    def available(self) -> bool:
+        with self.lock:
+            return bool(self.models) or any(n not in self.failed for n in self.names)
+
+    def loaded(self) -> List[str]:
+        with self.lock:
+            return list(self.models)
+
+    # ---------- routing ----------
+
+    def _candidates(self, lang: str) -> List[str]:
+        names = self.names
+        if lang != "en":
+            floor = rank(os.environ.get("WHISPER_ROUTE_MULTILINGUAL_MIN") or "base")
+            names = [n for n in names if not english_only(n) and rank(n) >= floor] or \
+                [n for n in names if not english_only(n)] or names
+        return names
+
+    def smaller(self, name: str, lang: str = "en") -> str:
+        """The next size down that may serve `lang`, or `name` when it is already the smallest."""
+        names = self._candidates(lang)
+        below = [n for n in names if rank(n) < rank(name)]
+        return below[-1] if below else name
+
+    def route(self, duration_s: Optional[float] = None, target: str = "", lang: str = "en",
+              quality: Optional[str] = None) -> Tuple[str, str]:
+        """(model name, reason) for a request; see the module docstring for the rules."""
+        names = self._candidates(lang)
+        quality = (quality or "").strip().lower()
+        if quality in names:
+            return quality, "explicit"
+        if quality in TIERS:
+            return names[{"fast": 0, "balanced": len(names) // 2, "accurate": -1}[quality]], quality
+        words = len(target.split())
+        if duration_s is not None and duration_s <= _env_float("WHISPER_ROUTE_SHORT_S", 4.0) \
+                and words <= _env_int("WHISPER_ROUTE_SHORT_WORDS", 3):
+            return names[0], "short"
+        if (duration_s or 0.0) >= _env_float("WHISPER_ROUTE_LONG_S", 15.0) \
+                or words >= _env_int("WHISPER_ROUTE_LONG_WORDS", 25):
+            return names[-1], "long"
+        return names[len(names) // 2], "medium"
+
+    def _nearest_loaded(self, name: str) -> Optional[str]:
+        with self.lock:
+            loaded = [n for n in self.models if english_only(n) <= english_only(name)] or list(self.models)
+        if not loaded:
+            return None
+        # prefer the next size up, then the next size down
+        return min(loaded, key=lambda n: (abs(rank(n) - rank(name)), rank(n) < rank(name)))
+
+    @contextmanager
+    def use(self, name: str, reason: str = "default"):
+        """
+        Yield (model, name, reason) for the block, loading it if needed, and keep it from
+        being unloaded until the block ends. name and reason change when a fallback is
+        used; model is None when no Whisper model is usable.
+        """
+        model = self._load(name)
+        if model is None:
+            fallback = self._nearest_loaded(name)
+            if fallback is not None:
+                logging.info("whisper model %s unavailable, using %s", name, fallback)
+                name, reason = fallback, "budget"
+                with self.lock:
+                    model = self.models.get(name)
+        if model is None:
+            yield None, name, reason
+            return
+        with self.lock:
+            if name in self.models:
+                self.models.move_to_end(name)
+            self.pinned[name] = self.pinned.get(name, 0) + 1
+        ROUTED.inc(model=name, reason=reason)
+        try:
+            yield model, name, reason
+        finally:
+            with self.lock:
+                self.pinned[name] -= 1
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "default": self.default,
+                "models": self.names,
+                "loaded": list(self.models),
+                "resident": sorted(self.resident),
+                "budgetBytes": self.budget,
+                "usedBytes": self.used(),
+                "sizes": {n: self.estimate(n) for n in self.names},
+            }
+
+
+def init_registry(loader: Callable[[str], Any]) -> ModelRegistry:
+    default = (os.environ.get("WHISPER_MODEL") or "small").strip()
+    registry = ModelRegistry(
+        loader,
+        _names(os.environ.get("WHISPER_MODELS", "")) or [default],
+        default,
+        _env_int("WHISPER_MODEL_BUDGET_MB", 1024) * MB,
+        whisper_autotune.settings(default)["compute_type"],
+    )
+    preload = _names(os.environ.get("WHISPER_PRELOAD", "")) or [registry.default]
+    # startup only: a model first loaded by a request must not stall it for a tuning run
+    for name in preload:
+        if name in registry.names:
+            whisper_autotune.ensure(name)
+    registry.preload(preload)
+    logging.info("whisper registry: models=%s loaded=%s budget=%.0fMB", registry.names, registry.loaded(),
+                 registry.budget / MB)
+    return registry
@@ -76,6 +76,35 @@ export async function saveFeedback(payload) {
   return r.json();
 }
 
+/* ---------- server-sent events ---------- */
+// reads an SSE response body and calls onEvent(event, data) per complete event
+async function readEventStream(r, onEvent) {
+  const reader = r.body.getReader();
+  const decoder = new TextDecoder("utf-8");
+  let buffer = "";
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const parts = buffer.split("\n\n");
+    buffer = parts.pop(); // keep partial
+    for (const chunk of parts) {
+      const lines = chunk.split("\n");
+      let event = "message";
+      let data = "";
+      for (const line of lines) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      if (!data) continue;
+      let parsed = null;
+      try { parsed = JSON.parse(data); } catch { parsed = { raw: data }; }
+      onEvent(event, parsed);
+    }
+  }
+}
+
 /* ---------- ai lesson builder ---------- */
 export async function generateLessonPlan(payload) {
   const t = await token();
@@ -96,6 +125,40 @@ export async function generateLessonPlan(payload) {
   return data;
 }
 
+// streams sections as they are generated; resolves with the same shape as generateLessonPlan
+export async function generateLessonPlanStream(payload, { onSection, onReset, signal } = {}) {
+  const t = await token();
+  if (!t) throw new Error("NO_AUTH");
+  const r = await fetch(`${BASE}/lessons/generate/stream`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Authorization: `Bearer ${t}`,
+    },
+    body: JSON.stringify(payload || {}),
+    signal,
+  });
+  if (!r.ok || !r.body) {
+    const data = await r.json().catch(() => null);
+    throw new Error(data?.error || `generateLessonPlanStream failed: ${r.status}`);
+  }
+
+  let final = null;
+  await readEventStream(r, (event, parsed) => {
+    if (event === "section" && typeof onSection === "function") {
+      onSection(parsed.section, parsed.index);
+    } else if (event === "reset" && typeof onReset === "function") {
+      onReset(parsed);
+    } else if (event === "done") {
+      final = parsed;
+    } else if (event === "error") {
+      throw new Error(parsed?.error || "stream_error");
+    }
+  });
+  if (final) return final;
+  throw new Error("stream_ended_without_result");
+}
+
 /* ---------- pronunciation scoring ---------- */
 // src/lib/api.js
 export async function assessAudio({ blob, target, lang = "en", beam = 5, vad = 1, temperature = 0 }) {
@@ -136,37 +199,16 @@ export async function assessAudioStream({ blob, target, lang = "en", beam = 5, v
     throw new Error(`assess_stream_failed_${r.status}: ${txt}`);
   }
 
-  const reader = r.body.getReader();
-  const decoder = new TextDecoder("utf-8");
-  let buffer = "";
   let final = null;
-
-  while (true) {
-    const { done, value } = await reader.read();
-    if (done) break;
-    buffer += decoder.decode(value, { stream: true });
-    const parts = buffer.split("\n\n");
-    buffer = parts.pop(); // keep partial
-    for (const chunk of parts) {
-      const lines = chunk.split("\n");
-      let event = "message";
-      let data = "";
-      for (const line of lines) {
-        if (line.startsWith("event:")) event = line.slice(6).trim();
-        else if (line.startsWith("data:")) data += line.slice(5).trim();
-      }
-      if (!data) continue;
-      let parsed = null;
-      try { parsed = JSON.parse(data); } catch { parsed = { raw: data }; }
-      if (event === "segment" && typeof onSegment === "function") {
-        onSegment(parsed);
-      } else if (event === "done") {
-        final = parsed;
-      } else if (event === "error") {
-        throw new Error(parsed?.error || "stream_error");
-      }
+  await readEventStream(r, (event, parsed) => {
+    if (event === "segment" && typeof onSegment === "function") {
+      onSegment(parsed);
+    } else if (event === "done") {
+      final = parsed;
+    } else if (event === "error") {
+      throw new Error(parsed?.error || "stream_error");
     }
-  }
+  });
   if (final) return final;
   throw new Error("stream_ended_without_result");
 }
@@ -1,7 +1,7 @@
 // src/pages/Learn.js
 import React, { useEffect, useMemo, useState } from "react";
 import { useNavigate } from "react-router-dom";
-import { generateLessonPlan, getSummary } from "../lib/api";
+import { generateLessonPlanStream, getSummary } from "../lib/api";
 
 const LEVELS = [
   { id: "a2", label: "A2 foundation" },
@@ -76,9 +76,20 @@ export default function Learn() {
           ? pronunciationTargets
           : [],
       };
-      const data = await generateLessonPlan(payload);
+      // show sections as they stream in, then swap in the final plan
+      setPlan({ title: payload.goal, goal: payload.goal, topic: payload.topic, level: payload.level, sections: [] });
+      const data = await generateLessonPlanStream(payload, {
+        onSection: (section, index) =>
+          setPlan((prev) => {
+            const sections = [...(prev?.sections || [])];
+            sections[index] = section;
+            return { ...prev, sections };
+          }),
+        onReset: () => setPlan((prev) => ({ ...prev, sections: [] })),
+      });
       setPlan(data.plan || null);
     } catch (e) {
+      setPlan(null);
       setError(e.message || "Could not generate a lesson.");
     } finally {
       setLoadingPlan(false);